@@ -27,7 +27,7 @@ sys.path.append(main_dir_loc + 'capyle')
 sys.path.append(main_dir_loc + 'capyle/ca')
 sys.path.append(main_dir_loc + 'capyle/guicomponents')
 
-from capyle.ca import Grid2D, Neighbourhood, CAConfig, randomise2d
+from capyle.ca import Grid2D, Neighbourhood, CAConfig, RuleTable, randomise2d
 import capyle.utils as utils
 
 CHAPARRAL = 0 #Define the different states within the model
@@ -55,10 +55,54 @@ flammability_score = { #Defines flammability scores, these have been quantified
     6: 0  # does not burn easily cos it's already burning - FIRE
 }
 
+flammability_lut = np.array([flammability_score[state] for state in sorted(flammability_score)]) #Flammability indexed by state
+
+wind_neighbours = { #Offset of the neighbouring cell whose flammability and wind kernel value decide how far fire jumps
+    "N": (-1, 0),
+    "E": (0, 1),
+    "W": (0, -1),
+    "S": (1, 0)
+}
+
+wind_spread_targets = { #(x step, y step, ignition threshold, extra probability) of the cells checked at each distance
+    "N": [(-1, 0, 0.35, 0), (-1, -1, 0.45, 0), (-1, 1, 0.45, 0)], #Lower threshold for the north cell - encourage fire to spread to north
+    "E": [(-1, 1, 0.45, 0), (0, 1, 0.35, 0), (1, 1, 0.45, 0)],
+    "W": [(-1, -1, 0.45, 0), (0, -1, None, 0), (1, -1, 0.45, 0)], #West cell always ignites when it can burn, as in the original model
+    "S": [(1, 1, 0.45, 0), (1, 0, 0.35, 0.1), (1, -1, 0.45, 0)]  #South cell also gets a bonus probability
+}
+
+dist_factor = 0.075 #Distance factor subtracted from the ignition probability; the same at every distance
+
+ignition_thresholds = { #Minimum number of burning neighbours needed for each terrain type to ignite
+    CHAPARRAL: 2,
+    FOREST: 3,
+    SCRUBLAND: 1,
+    TOWN: 1
+}
+
+def ignition_state(state, counts):
+    """New state of a cell with counts[0] burning neighbours, before the wind is applied"""
+    threshold = ignition_thresholds.get(state)
+    if threshold is not None and counts[0] >= threshold:
+        return FIRE
+    return state
+
+#The ignition rule only depends on the number of burning neighbours, so is compiled to a lookup table
+IGNITION_RULE = RuleTable.from_function((CHAPARRAL, LAKE, FOREST, SCRUBLAND, BURNT, TOWN, FIRE),
+                                        ignition_state, count_states=(FIRE,))
+
+
+#Random number generator used by the stochastic parts of the model
+RNG = np.random.default_rng()
 
 #variable for time for town fire is set to -1 initially
 time_for_town_fire = -1
 
+#Defaults for the options that are not given on the command line; no wind, no water drop and no forest extension
+WIND_DIR = "None"
+WATER_TIME = None
+FOREST_EXTENSION_LAYOUT = 0
+
 
 def add_forest_extension(grid):
 
@@ -111,172 +155,105 @@ def define_initial_grid():
         sys.exit(-1)
     return start_grid
 
-def get_neighbourhood(grid, x_coord, y_coord):
+def apply_flamability_scores(states):
     """
-    Retrieves the Moore neighbourhood of a given cell.
+    Maps an array of cell states to the aforementioned flammability scores.
     
     Parameters
     ----------
-    `grid`: np.array
-        A 2D array containing the states of the grid at the current timestep.
-    `x_coord`: int
-        The x coordinate for the cell whose neighbourhood is being retrieved.
-    `y_coord`: int
-        The y coordinate for the cell whose neighbourhood is being retrieved.
+    `states`: np.array
+        An array of any shape containing cell states.
     
     Returns
     -------
-    `neighbourhood`: np.array
-        A 2D array containing the neighbourhood states of the passed in cell - uses Moore neighbourhood.
+    `scores`: np.array
+         An array of the same shape containing the flammability score of each cell.
     """
-    neighbourhood = np.array(
-        [
-         [grid[x_coord-1][y_coord-1], grid[x_coord-1][y_coord], grid[x_coord-1][y_coord+1]],
-         [grid[x_coord][y_coord-1], grid[x_coord][y_coord], grid[x_coord][y_coord+1]],
-         [grid[x_coord+1][y_coord-1], grid[x_coord+1][y_coord], grid[x_coord+1][y_coord+1]]
-        ]
-    )
-    return neighbourhood
+    return flammability_lut[np.asarray(states, dtype=int)]
 
-def apply_flamability_scores(neighbourhood):
+def wind_reach():
     """
-    Maps the states of a Moore neighbourhood to the aforementioned flammability scores.
-    
-    Parameters
-    ----------
-    `neighbourhood`: np.array
-        A 2D array containing the neighbourhood states of a cell within the grid - uses a Moore
-        neighbourhood.
+    Precomputes, once per run, how far fire can jump in each direction from a cell whose
+    neighbour in that direction is in each state. The wind kernel and flammability scores do
+    not change during a run, so this replaces combining them for every ignited cell.
     
     Returns
     -------
-    `neighbourhood`: np.array
-         A 2D array containing the neighbourhood flammability scores of a cell within the grid -
-        uses a Moore neighbourhood.
+    `reach`: dict
+        Direction -> array indexed by state of the number of cells (plus one) the fire can jump.
     """
-    for i in range(len(neighbourhood)):
-        for j in range(len(neighbourhood[i])):
-                cell = neighbourhood[i][j]
-                neighbourhood[i][j] = flammability_score.get(cell)
-    return neighbourhood
+    reach = {}
+    for direction, (dx, dy) in wind_neighbours.items():
+        wind_modified = flammability_lut + WIND_KERNEL[1+dx, 1+dy]
+        reach[direction] = np.where(wind_modified >= 4, wind_modified.astype(int), 1)
+    return reach
 
-def apply_wind_kernel(grid, cells_to_burn_this_iter):
+def in_bounds_layer():
+    """
+    Static layer of the cells far enough from the edge of the grid for the wind to carry fire
+    from them without overrunning the grid bounds.
+    """
+    rows, cols = np.indices((GRID_SIZE, GRID_SIZE))
+    return (rows > 5) & (rows < 96) & (cols > 5) & (cols < 96)
+
+def apply_wind_kernel(grid, cells_to_burn_this_iter, in_bounds_grid):
     """
     Applys the wind kernel to the cells that ignited in the current iter. Uses a probabilistic model
     that implements inverse proportionality between ignition probability and distance from a fire
     source. Also considers wind direction to encourage cells in the direction of the wind to ignite
     easier than other directions - see report for all details.
     
+    All ignited cells are handled together as arrays and every random number needed for the
+    iteration is drawn in a single call, so the cost grows with the length of the fire front
+    rather than with the number of Python loop iterations.
+    
     Parameters
     ----------
     `grid`: np.array
         A 2D array containing the states of the grid at the current timestep.
-    `cells_to_burn_this_iter`: List
-        A list of cells that ignited in the current iteration.
+    `cells_to_burn_this_iter`: np.array
+        An (N, 2) array of the (x, y) coordinates of cells that ignited in the current iteration.
+    `in_bounds_grid`: np.array
+        The in_bounds static layer, see in_bounds_layer.
     
     Returns
     -------
-    `additonal_cells_to_burn`: List
-        A list of additonal cells that will be ignited due to the implemented wind speed / direction
-        model.
+    `additonal_cells_to_burn`: np.array
+        An (M, 2) array of additonal cells that will be ignited due to the implemented wind speed /
+        direction model.
     """
+    cells = np.asarray(cells_to_burn_this_iter, dtype=int).reshape(-1, 2)
+    if len(cells) == 0:
+        return cells
+    x, y = cells[:, 0], cells[:, 1]
+    in_bounds = in_bounds_grid[x, y] #Ensure that the grid bounds won't be overran
+    reach = {} #Number of cells (plus one) the fire can jump in each direction from each ignited cell
+    for direction, (dx, dy) in wind_neighbours.items():
+        neighbour_states = grid[x+dx, y+dy].astype(int) #Only the states of the neighbours are needed as indices
+        reach[direction] = np.where(in_bounds, WIND_REACH[direction][neighbour_states], 1)
+    max_reach = max(r.max() for r in reach.values())
+    if max_reach <= 1:
+        return np.empty((0, 2), dtype=int)
+    distances = np.arange(1, max_reach)[:, np.newaxis] #Shape (distances, 1) to broadcast against the cells
+    draws = RNG.random((len(wind_neighbours), 3, max_reach-1, len(cells)))
     additonal_cells_to_burn = []
-    for cell in cells_to_burn_this_iter: #Loop through all cells that ignited in the iteration
-        x, y = cell[0], cell[1]
-        neighbourhood = get_neighbourhood(grid, x, y) #Gets 3x3 neighbourhood of the current cell
-        flamability_neighbourhood = apply_flamability_scores(neighbourhood) #Map neighbourhood states to flammability scores
-        wind_modified_neighbourhood = neighbourhood+WIND_KERNEL #Add flammability scores with wind kernel
-        count = 0 #Counter to keep track of which cell within 3x3 grid we are referring to
-        for row in wind_modified_neighbourhood:
-            for cell in row:
-                if cell >= 4:
-                    if count == 1: #If current cell is north of the fire
-                        if WIND_DIR == "N":
-                            add_prob = 0.15 #Give bonus probability if wind is in the same direction of the cell being assessed
-                        else:
-                            add_prob = 0.03
-                        if all(coord < 96 for coord in [x, y]) and all(coord > 5 for coord in [x, y]): #Ensure that the grid bounds won't be overran
-                            for z in range (1, int(cell)): #Loop through number of cells based on wind_modified_neighbourhood (between 1-3 cells)
-                                dist_factor = 0.075 #Distance factor - ignition probability should be reversely proportional to distance from fire
-                                if grid[x-z][y] not in [1, 4, 6]: #Ensure cell isn't fire, lake or burnt
-                                    prob = random.random() * (1+add_prob) - dist_factor #Random probability of ignition based on wind direction and distance
-                                    if prob > 0.35: #Set threshold for north cell lower than others - encourage fire to spread to north
-                                        additonal_cells_to_burn.append([x-z, y])
-                                if grid[x-z][y-z] not in [1, 4, 6]:
-                                    prob = random.random() * (1+add_prob) - dist_factor
-                                    if prob > 0.45:
-                                        additonal_cells_to_burn.append([x-z, y-z])
-                                if grid[x-z][y+z] not in [1, 4, 6]:
-                                    prob = random.random() * (1+add_prob) - dist_factor
-                                    if prob > 0.45:
-                                        additonal_cells_to_burn.append([x-z, y+z])
-                                dist_factor = dist_factor + 0.075 #Increase distance factor as we migrate away from fire source cell.
-                    elif count == 5: #If current cell is east of the fire
-                        if WIND_DIR == "E":
-                            add_prob = 0.15 #Give bonus probability if wind is in the same direction of the cell being assessed
-                        else:
-                            add_prob = 0.03
-                        if all(coord < 96 for coord in [x, y]) and all(coord > 5 for coord in [x, y]): #Ensure that the grid bounds won't be overran
-                            for z in range (1, int(cell)): #Loop through number of cells based on wind_modified_neighbourhood (between 1-3 cells)
-                                dist_factor = 0.075 #Distance factor - ignition probability should be reversely proportional to distance from fire
-                                if grid[x-z][y+z] not in [1, 4, 6]: #Ensure cell isn't fire, lake or burnt
-                                    prob = random.random() * (1+add_prob) - dist_factor #Random probability of ignition based on wind direction and distance
-                                    if prob > 0.45:
-                                        additonal_cells_to_burn.append([x-z, y+z])
-                                if grid[x][y+z] not in [1, 4, 6]:
-                                    prob = random.random() * (1+add_prob) - dist_factor
-                                    if prob > 0.35: #Set threshold for east cell lower than others - encourage fire to spread to east
-                                        additonal_cells_to_burn.append([x, y+z])
-                                if grid[x+z][y+z] not in [1, 4, 6]:
-                                    prob = random.random() * (1+add_prob) - dist_factor
-                                    if prob > 0.45:
-                                        additonal_cells_to_burn.append([x+z, y+z])
-                                dist_factor = dist_factor + 0.075 #Increase distance factor as we migrate away from fire source cell.
-                    elif count == 3: #If current cell is west of the fire
-                        if WIND_DIR == "W":
-                            add_prob = 0.15 #Give bonus probability if wind is in the same direction of the cell being assessed
-                        else:
-                            add_prob = 0.03
-                        if all(coord < 96 for coord in [x, y]) and all(coord > 5 for coord in [x, y]): #Ensure that the grid bounds won't be overran
-                            for z in range (1, int(cell)): #Loop through number of cells based on wind_modified_neighbourhood (between 1-3 cells)
-                                dist_factor = 0.075 #Distance factor - ignition probability should be reversely proportional to distance from fire
-                                if grid[x-z][y-z] not in [1, 4, 6]: #Ensure cell isn't fire, lake or burnt
-                                    prob = random.random() * (1+add_prob) - dist_factor #Random probability of ignition based on wind direction and distance
-                                    if prob > 0.45:
-                                        additonal_cells_to_burn.append([x-z, y-z])
-                                if grid[x][y-z] not in [1, 4, 6]:
-                                    prob = random.random() * (1+add_prob) - dist_factor
-                                    if prob > 0.35: #Set threshold for west cell lower than others - encourage fire to spread to west
-                                        additonal_cells_to_burn.append([x, y-z])
-                                    additonal_cells_to_burn.append([x, y-z])
-                                if grid[x+z][y-z] not in [1, 4, 6]:
-                                    prob = random.random() * (1+add_prob) - dist_factor
-                                    if prob > 0.45:
-                                        additonal_cells_to_burn.append([x+z, y-z])
-                                dist_factor = dist_factor + 0.075 #Increase distance factor as we migrate away from fire source cell.
-                    elif count == 7: #If current cell is south of the fire
-                        if WIND_DIR == "S":
-                            add_prob = 0.15 #Give bonus probability if wind is in the same direction of the cell being assessed
-                        else:
-                            add_prob = 0.03
-                        if all(coord < 96 for coord in [x, y]) and all(coord > 5 for coord in [x, y]): #Ensure that the grid bounds won't be overran
-                            for val in range (1, int(cell)): #Loop through number of cells based on wind_modified_neighbourhood (between 1-3 cells)
-                                dist_factor = 0.075 #Distance factor - ignition probability should be reversely proportional to distance from fire
-                                if grid[x+val][y+val] not in [1, 4, 6]: #Ensure cell isn't fire, lake or burnt
-                                    prob = random.random() * (1+add_prob) - dist_factor #Random probability of ignition based on wind direction and distance
-                                    if prob > 0.45:
-                                        additonal_cells_to_burn.append([x+val, y+val])
-                                if grid[x+val][y] not in [1, 4, 6]:
-                                    prob = random.random() * (1+add_prob+0.1) - dist_factor
-                                    if prob > 0.35: #Set threshold for south cell lower than others - encourage fire to spread to south
-                                        additonal_cells_to_burn.append([x+val, y])
-                                if grid[x+val][y-val] not in [1, 4, 6]:
-                                    prob = random.random() * (1+add_prob) - dist_factor
-                                    if prob > 0.45:
-                                        additonal_cells_to_burn.append([x+val, y-val])
-                                dist_factor = dist_factor + 0.075 #Increase distance factor as we migrate away from fire source cell.
-                count += 1
-    return additonal_cells_to_burn #Return list of cells to be ignited due to random probability due to wind
+    for i, direction in enumerate(wind_neighbours):
+        if WIND_DIR == direction:
+            add_prob = 0.15 #Give bonus probability if wind is in the same direction of the cell being assessed
+        else:
+            add_prob = 0.03
+        active = distances < reach[direction]
+        for j, (step_x, step_y, threshold, extra_prob) in enumerate(wind_spread_targets[direction]):
+            target_x = np.where(active, x + step_x*distances, x)
+            target_y = np.where(active, y + step_y*distances, y)
+            can_burn = active & ~np.isin(grid[target_x, target_y], [LAKE, BURNT, FIRE]) #Ensure cell isn't fire, lake or burnt
+            if threshold is None:
+                ignite = can_burn
+            else:
+                prob = draws[i, j] * (1+add_prob+extra_prob) - dist_factor #Random probability of ignition based on wind direction and distance
+                ignite = can_burn & (prob > threshold)
+            additonal_cells_to_burn.append(np.stack((target_x[ignite], target_y[ignite]), axis=1))
+    return np.concatenate(additonal_cells_to_burn) #Return cells to be ignited due to random probability due to wind
 
 def wind_kernel():
     """
@@ -299,7 +276,28 @@ def wind_kernel():
     directed_kernel = rotate(speed_kernel, angle=0+(90*rotate_scores.get(WIND_DIR))) #Rotate kernel to match direction - only works for N, E, S, W
     return directed_kernel
 
-def transition_func(grid, neighbourstates, neighbourcounts, iterations):
+def ignition_mask(grid, neighbourcounts):
+    """
+    Works out which cells catch fire from their burning neighbours this iteration. The whole grid
+    is handled at once using the neighbour counts calculated by the grid, rather than building a
+    neighbourhood for every cell.
+    
+    Parameters
+    ----------
+    `grid`: np.array
+        A 2D array containing the states of the grid at the current timestep.
+    `neighbourcounts`: np.array
+        The number of neighbours in each state for every cell, indexed by state.
+    
+    Returns
+    -------
+    `ignite`: np.array
+        A 2D boolean array that is True for every cell that ignites in this iteration.
+    """
+    fire_neighbours = neighbourcounts[FIRE] #States are numbered in order so the state is its index
+    return IGNITION_RULE.apply(grid, [fire_neighbours]) != grid
+
+def transition_func(grid, neighbourstates, neighbourcounts, layers):
     """
     The implemented transition function. Executed each iteration to update the grid based on a 
     series of state transition functions defined. Also includes mitigation strategies such as
@@ -314,46 +312,23 @@ def transition_func(grid, neighbourstates, neighbourcounts, iterations):
     `neighbourcounts`: np.array
         A multi-dimensional array that details the number of neighbours with each state for each
         cell within the grid.
-    `iterations`: int
-        In essence a counter used to count the number of iterations.
+    `layers`: dict
+        The layers registered in setup: the static in_bounds layer and the burn_age layer, the
+        number of iterations each cell has been on fire, which is updated in place.
     
     Returns
     -------
     `grid`: np.array
         A 2D array containing the states of the grid after the transition function has been applied.
-    `iterations`: int
-        An incremented iteration count.
     """
-    state_of_town_squares = grid[88:93, 38:43]
-    for x in state_of_town_squares:
-        for y in x:
-            if (x == BURNT).any():
-                time_for_town_fire = iterations
-    cells_to_burn_this_iter = []
-    for x_coord in range(1,102):
-        for y_coord in range(1,102):
-            current_cell = grid[x_coord][y_coord]
-            if current_cell not in [LAKE, BURNT]: #State transition functions - same as before; no change here
-                neighbourhood = get_neighbourhood(grid, x_coord, y_coord)
-                fire_neighbours = np.count_nonzero(neighbourhood == 6)
-                if current_cell == CHAPARRAL and fire_neighbours >= 2:
-                    cells_to_burn_this_iter.append((x_coord, y_coord))
-                if current_cell == FOREST and fire_neighbours >= 3:
-                    cells_to_burn_this_iter.append((x_coord, y_coord))
-                if current_cell == SCRUBLAND and fire_neighbours >= 1:
-                    cells_to_burn_this_iter.append((x_coord, y_coord))
-                if current_cell == TOWN and fire_neighbours >= 1:
-                    cells_to_burn_this_iter.append((x_coord, y_coord))
-    for cell in cells_to_burn_this_iter:
-        x, y = cell[0], cell[1]
-        grid[x][y] = FIRE
-    if WIND_DIR != "None": #If there is wind, we apply it here; at the end of the iteration
-        additonal_cells_to_burn = apply_wind_kernel(grid, cells_to_burn_this_iter)
-        for cell in additonal_cells_to_burn:
-            x, y = cell[0], cell[1]
-            grid[x][y] = FIRE
-    iterations += 1
-    return grid, iterations
+    ignite = ignition_mask(grid, neighbourcounts)
+    cells_to_burn_this_iter = np.argwhere(ignite) #Row-major (x, y) pairs, same order as a per-cell scan
+    grid[ignite] = FIRE
+    if WIND_DIR != "None" and len(cells_to_burn_this_iter): #If there is wind and a cell ignited, we apply it here; at the end of the iteration
+        additonal_cells_to_burn = apply_wind_kernel(grid, cells_to_burn_this_iter, layers["in_bounds"])
+        grid[additonal_cells_to_burn[:, 0], additonal_cells_to_burn[:, 1]] = FIRE
+    layers["burn_age"][grid == FIRE] += 1
+    return grid
 
   
 
@@ -455,11 +430,16 @@ def setup(args):
     global WIND_SPEED
 
     global WIND_KERNEL
+    global WIND_REACH
 
     global FOREST_EXTENSION_LAYOUT
 
+    global RNG
+
     config_path = args[0]
     config = utils.load(config_path)
+    RNG = np.random.default_rng(config.seed) #Seed both generators so that runs with the same config.seed are reproducible
+    random.seed(config.seed)
     config.title = "Forest fire simulation"
     config.dimensions = 2
     config.states = (CHAPARRAL, LAKE, FOREST, SCRUBLAND, BURNT, TOWN, FIRE)
@@ -484,6 +464,8 @@ def setup(args):
             coords = re.sub("[][,']", "", args[4]).split(" ")
             WATER_COORDS = (int(coords[0]), int(coords[1]))
             WATER_TIME = int(args[6])
+    WIND_DIR = "None" #No wind unless a direction is given
+    WIND_SPEED = 0 #A zero kernel never carries fire past the neighbouring cells
     if args[5] != "None":
         dir = args[5]
         if dir in ["N", "E", "S", "W"]:
@@ -493,7 +475,9 @@ def setup(args):
         speed = int(args[7])
         if speed <= 30: #Creates 3 bands of wind speeds, slow, medium and fast; if over 30 then no wind is applied
             WIND_SPEED = round(speed/10)
-            WIND_KERNEL = wind_kernel()
+    if WIND_DIR != "None":
+        WIND_KERNEL = wind_kernel()
+        WIND_REACH = wind_reach()
 
         
     if args[8] != "None":
@@ -501,6 +485,8 @@ def setup(args):
 
     init_grid = define_initial_grid()
     config.initial_grid = init_grid
+    config.static_layers = {"in_bounds": in_bounds_layer()}
+    config.layers = {"burn_age": {"dtype": int}}
     if int(args[1]) == 0:
         print("[Forest Fire Simulator]     Loaded")
         config.save()
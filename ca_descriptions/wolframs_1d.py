@@ -13,7 +13,7 @@ sys.path.append(main_dir_loc + 'capyle/guicomponents')
 # -------------------------------------------
 
 import numpy as np
-from capyle.ca import Grid1D
+from capyle.ca import Grid1D, Elementary1D
 import capyle.utils as utils
 
 
@@ -65,8 +65,11 @@ def transition_function(grid, neighbourstates, neighbourcounts, rulebool):
     return newrow
 
 
-def main():
-    config = setup(sys.argv[1:])
+def run(config):
+    # 2 state rules run on the bit-packed engine, which gives the same
+    # timeline as the transition function below
+    if Elementary1D.supports(config):
+        return Elementary1D(config).run()
 
     # Translate rule numer to boolean array:
     # 30 -> [0,0,0,1,1,1,1,0] -> [F,F,F,T,T,T,T,F]
@@ -76,8 +79,12 @@ def main():
     # passing transition function and rulebool as tuple to
     # keep track of rulebool
     grid = Grid1D(config, (transition_function, rulebool))
+    return grid.run()
+
 
-    timeline = grid.run()
+def main():
+    config = setup(sys.argv[1:])
+    timeline = run(config)
     utils.save(timeline, config.timeline_path)
     config.save()
 
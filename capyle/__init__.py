@@ -1,3 +1,25 @@
+# ---- Set up path to modules ----
+# (the submodules import each other by name, eg. 'from neighbourhood import'
+# in capyle/ca, which needs these directories on sys.path)
+import os as _os
+import sys as _sys
+_capyle_dir = _os.path.dirname(_os.path.abspath(__file__))
+for _path in [_os.path.dirname(_capyle_dir), _capyle_dir,
+              _os.path.join(_capyle_dir, 'ca'),
+              _os.path.join(_capyle_dir, 'guicomponents')]:
+    if _path not in _sys.path:
+        _sys.path.append(_path)
+
 import utils
-from playbackcontrols import _PlaybackControls
-from display import Display
+
+
+def __getattr__(name):
+    """Import the GUI on first use, so that headless runs never import
+    tkinter"""
+    if name == '_PlaybackControls':
+        from playbackcontrols import _PlaybackControls
+        return _PlaybackControls
+    if name == 'Display':
+        from display import Display
+        return Display
+    raise AttributeError("module 'capyle' has no attribute '{}'".format(name))
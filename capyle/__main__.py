@@ -0,0 +1,3 @@
+from capyle.cli import main
+
+main()
@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import itertools
+import tracemalloc
+import numpy as np
+from capyle.utils import gens_to_dims, int_to_binary
+from capyle.ca import CAConfig, Grid1D, Grid2D
+from capyle.runner import load_description, run_file
+from capyle.sweep import configuration_options
+
+MAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FF_2D = os.path.join(MAIN_DIR, 'ca_descriptions', 'ff_2d.py')
+WOLFRAMS_1D = os.path.join(MAIN_DIR, 'ca_descriptions', 'wolframs_1d.py')
+
+# the parameters a benchmark can be run for
+PARAMS = ['size', 'states', 'generations']
+
+# work faster than this is repeated until it takes this many seconds, so
+# timings of a single fast call are not lost in the timer's resolution
+MIN_TIME = 0.05
+
+
+def cyclic(grid, neighbourstates, neighbourcounts, numstates):
+    """Cyclic CA transition function: a cell moves on to the next state
+    if any neighbour is in it. Uses the counts of every state, so its cost
+    grows with the number of states"""
+    new = grid.copy()
+    for state in range(numstates):
+        following = (state + 1) % numstates
+        new[(grid == state) & (neighbourcounts[following] > 0)] = following
+    return new
+
+
+def grid2d(size, states):
+    """A size x size Grid2D of a cyclic CA with random initial states"""
+    config = CAConfig(FF_2D)
+    config.dimensions = 2
+    config.states = tuple(range(states))
+    config.grid_dims = (size, size)
+    config.nhood_arr = np.ones((3, 3))
+    config.progress = 'none'
+    rng = np.random.default_rng(0)
+    config.initial_grid = rng.integers(0, states, (size, size))
+    return Grid2D(config, (cyclic, states))
+
+
+def bench_neighbour_states(size, states, generations):
+    grid = grid2d(size, states)
+
+    def work():
+        grid.get_neighbour_states()
+        return grid.grid.size
+    return work
+
+
+def bench_count_neighbours(size, states, generations):
+    grid = grid2d(size, states)
+    ns = grid.get_neighbour_states()
+
+    def work():
+        grid.count_neighbours(ns)
+        return grid.grid.size
+    return work
+
+
+def bench_refresh_wrap(size, states, generations):
+    grid = grid2d(size, states)
+
+    def work():
+        grid.refresh_wrap()
+        return grid.grid.size
+    return work
+
+
+def bench_grid2d_step(size, states, generations):
+    grid = grid2d(size, states)
+
+    def work():
+        for i in range(generations):
+            grid.step()
+        return grid.grid.size * generations
+    return work
+
+
+def bench_grid1d_step(size, states, generations):
+    config = CAConfig(WOLFRAMS_1D)
+    config.dimensions = 1
+    config.states = (0, 1)
+    config.num_generations = generations
+    config.grid_dims = gens_to_dims(generations)
+    config.nhood_arr = np.array([1, 1, 1])
+    config.progress = 'none'
+    initial_grid = np.zeros(config.grid_dims)
+    initial_grid[0] = np.random.default_rng(0).integers(
+        0, 2, config.grid_dims[1])
+    config.initial_grid = initial_grid
+    transition_function = load_description(WOLFRAMS_1D).transition_function
+    rulebool = int_to_binary(30) * True
+
+    def work():
+        grid = Grid1D(config, (transition_function, rulebool))
+        for i in range(generations):
+            grid.step()
+        return config.grid_dims[1] * generations
+    return work
+
+
+def bench_ff_2d(size, states, generations):
+    options = configuration_options({'incin': True, 'f_ext': 1,
+                                     'wind_dir': 'N', 'wind_speed': 10})
+    overrides = {'num_generations': generations, 'progress': 'none',
+                 'seed': 0}
+
+    def work():
+        ca_config, timeline = run_file(FF_2D, options, overrides)
+        return int(np.prod(ca_config.grid_dims)) * (len(timeline) - 1)
+    return work
+
+
+def bench_wolframs_1d(size, states, generations):
+    overrides = {'num_generations': generations, 'rule_num': 30,
+                 'grid_dims': gens_to_dims(generations), 'progress': 'none'}
+
+    def work():
+        ca_config, timeline = run_file(WOLFRAMS_1D, None, overrides)
+        return ca_config.grid_dims[1] * (len(timeline) - 1)
+    return work
+
+
+# name -> (function(size, states, generations) returning the work to time,
+# the parameters the benchmark depends on)
+BENCHMARKS = {
+    'neighbour_states': (bench_neighbour_states, ['size', 'states']),
+    'count_neighbours': (bench_count_neighbours, ['size', 'states']),
+    'refresh_wrap': (bench_refresh_wrap, ['size']),
+    'grid2d_step': (bench_grid2d_step, ['size', 'states', 'generations']),
+    'grid1d_step': (bench_grid1d_step, ['generations']),
+    'ff_2d': (bench_ff_2d, ['generations']),
+    'wolframs_1d': (bench_wolframs_1d, ['generations']),
+}
+
+
+def benchmark_key(name, params):
+    """Identify a benchmark run in results and baselines, eg.
+    grid2d_step[size=100,states=2,generations=10]"""
+    return '{n}[{p}]'.format(n=name, p=','.join(
+        '{k}={v}'.format(k=k, v=params[k]) for k in PARAMS if k in params))
+
+
+def time_benchmark(work, repeat=3):
+    """Time a benchmark's work function.
+
+    Args:
+        work (function): does the work once, returning the number of cell
+            updates it made
+        repeat (int): the number of times to time it, the fastest is used.
+            Work taking less than MIN_TIME is run several times a timing
+
+    Returns:
+        dict: the fastest seconds, cell updates per second and peak bytes
+            allocated during a run
+    """
+    # warm up caches and any compilation before timing
+    start = time.perf_counter()
+    cells = work()
+    number = max(1, int(MIN_TIME / max(time.perf_counter() - start, 1e-9)))
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(number):
+            work()
+        seconds = (time.perf_counter() - start) / number
+        best = seconds if best is None else min(best, seconds)
+    # tracing slows the work down, so peak memory is measured separately
+    tracemalloc.start()
+    try:
+        work()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': best,
+            'cells_per_second': cells / best if best > 0 else float('inf'),
+            'peak_memory': peak}
+
+
+def run_benchmarks(names=None, sizes=(200,), states=(2,), generations=(20,),
+                   repeat=3, progress=None):
+    """Run benchmarks for every combination of the parameters they depend
+    on.
+
+    Args:
+        names (list): the benchmarks to run, see BENCHMARKS. None for all
+        sizes (list): the rows and columns of the 2D grids
+        states (list): the numbers of states of the 2D grids
+        generations (list): the generations stepped or run
+        repeat (int): the times each benchmark is timed
+        progress (function): called with the key and result of each
+            benchmark as it finishes
+
+    Returns:
+        dict: benchmark key (see benchmark_key) -> result, the parameters
+            and the timings of time_benchmark
+
+    Raises:
+        ValueError: if a benchmark name is unknown
+    """
+    names = list(BENCHMARKS) if names is None else names
+    values = {'size': sizes, 'states': states, 'generations': generations}
+    results = {}
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError("Unknown benchmark '{n}', expected one of "
+                             "{bs}".format(n=name, bs=list(BENCHMARKS)))
+        function, used = BENCHMARKS[name]
+        for combination in itertools.product(*(values[p] for p in used)):
+            params = dict(zip(used, combination))
+            arguments = {p: params.get(p, values[p][0]) for p in PARAMS}
+            result = dict(name=name, **params)
+            result.update(time_benchmark(function(**arguments), repeat))
+            key = benchmark_key(name, params)
+            results[key] = result
+            if progress is not None:
+                progress(key, result)
+    return results
+
+
+def save_results(results, path):
+    """Save benchmark results as a JSON baseline"""
+    with open(path, 'w') as f:
+        json.dump({'results': results}, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    """Load benchmark results saved by save_results"""
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Find the benchmarks that got slower or use more memory than the
+    baseline.
+
+    Note:
+        Timings vary from run to run and machine to machine, so compare
+        against a baseline made on the same machine, and allow for noise
+        with the tolerance.
+
+    Args:
+        results (dict): results of run_benchmarks
+        baseline (dict): earlier results, eg. from load_results
+        tolerance (float): the fraction cells per second may fall, or
+            peak memory rise, by before it is a regression
+
+    Returns:
+        list: (key, metric, baseline value, value) of each regression,
+            benchmarks not in the baseline are skipped
+    """
+    regressions = []
+    for key, result in sorted(results.items()):
+        if key not in baseline:
+            continue
+        before = baseline[key]
+        if result['cells_per_second'] < (
+                before['cells_per_second'] * (1 - tolerance)):
+            regressions.append((key, 'cells_per_second',
+                                before['cells_per_second'],
+                                result['cells_per_second']))
+        if result['peak_memory'] > before['peak_memory'] * (1 + tolerance):
+            regressions.append((key, 'peak_memory', before['peak_memory'],
+                                result['peak_memory']))
+    return regressions
+
+
+def format_result(key, result):
+    """One line of the benchmark table"""
+    return '{k:<50} {s:>10.4f}s {c:>14.0f} cells/s {m:>10.1f} MiB'.format(
+        k=key, s=result['seconds'], c=result['cells_per_second'],
+        m=result['peak_memory'] / 2**20)
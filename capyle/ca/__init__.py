@@ -1,5 +1,17 @@
 from neighbourhood import Neighbourhood
+from backends import (NeighbourViews, as_counts, convolution_counts,
+                      gather_counts, gather_neighbours, get_backend,
+                      register_backend, state_index)
+from timeline import (COMPRESSORS, DeltaTimeline, as_frames, new_timeline,
+                      open_timeline, timeline_dtype, truncate_timeline)
+from reporters import (REPORTERS, ProgressEvent, RunCancelled, drain_progress,
+                       get_reporter, register_reporter, set_progress_queue)
+from profiling import (PHASES, PROFILE_MODES, Profiler, format_report,
+                       profile_path, save_report)
+from rules import RuleTable
 from caconfig import CAConfig
 from grid import Grid
 from grid1d import Grid1D, randomise1d
+from elementary import (Elementary1D, ElementaryTimeline, pack_row,
+                        unpack_rows)
 from grid2d import Grid2D, randomise2d
@@ -0,0 +1,530 @@
+import os
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# neighbourhoods with more neighbours than this are counted using FFTs
+FFT_MIN_NEIGHBOURS = 48
+# dtype of the counts every backend passes to transition functions, the
+# reference backend's float grids, so arithmetic on counts never wraps
+COUNT_DTYPE = np.float64
+
+
+def neighbour_offsets(nhood_arr):
+    """Return the (row, col) of every neighbour in the neighbourhood
+    in row-major order, skipping the center cell. For a 3x3 neighbourhood
+    this is NW N NE, W E, SW S SE"""
+    rows, cols = np.shape(nhood_arr)
+    center = (rows // 2, cols // 2)
+    return [(i, j) for i in range(rows) for j in range(cols)
+            if (i, j) != center]
+
+
+def state_index(grid, states):
+    """Return the index of each cell's state in states, or -1 if the
+    cell is not in any of the states (eg. a dead wrap border)"""
+    states = np.asarray(states)
+    sorter = np.argsort(states)
+    sorted_states = states[sorter]
+    pos = np.searchsorted(sorted_states, grid)
+    pos = np.clip(pos, 0, len(states) - 1)
+    index = sorter[pos]
+    index[sorted_states[pos] != grid] = -1
+    return index
+
+
+def convolution_counts(wrapping_grid, states, nhood_arr):
+    """Count the neighbours in each state by correlating a one-hot plane
+    per state with the neighbourhood weights.
+
+    Neighbourhoods with up to FFT_MIN_NEIGHBOURS neighbours add up a
+    shifted plane per neighbour, larger ones multiply in Fourier space.
+
+    Args:
+        wrapping_grid (numpy.ndarray): the grid including a wrapping
+            border as wide as the neighbourhood radius
+        states (tuple): the states of the CA
+        nhood_arr (numpy.ndarray): the (odd sized) neighbourhood weights,
+            the center cell is never counted
+
+    Returns:
+        numpy.ndarray: (states, rows, cols) counts. The smallest unsigned
+            integer type that fits for whole number weights, otherwise
+            floats holding the sum of the weights of the neighbours in
+            each state
+    """
+    kernel = np.array(nhood_arr, dtype=np.float64)
+    krows, kcols = kernel.shape
+    kernel[krows // 2, kcols // 2] = 0
+    numrows = wrapping_grid.shape[0] - (krows - 1)
+    numcols = wrapping_grid.shape[1] - (kcols - 1)
+    whole = bool(np.all(kernel == np.round(kernel)) and kernel.min() >= 0)
+    if whole:
+        dtype = np.min_scalar_type(int(kernel.sum()))
+    else:
+        dtype = np.dtype(np.float64)
+    onehot = state_index(wrapping_grid, states) == (
+        np.arange(len(states))[:, None, None])
+    taps = list(zip(*np.nonzero(kernel)))
+    if len(taps) <= FFT_MIN_NEIGHBOURS:
+        counts = np.zeros((len(states), numrows, numcols), dtype=dtype)
+        for i, j in taps:
+            counts += onehot[:, i:i+numrows, j:j+numcols] * dtype.type(
+                kernel[i, j])
+        return counts
+    # correlating is convolving with the flipped kernel, the valid part
+    # of the circular convolution starts one kernel width in
+    shape = wrapping_grid.shape
+    kernel_fft = np.fft.rfft2(kernel[::-1, ::-1], s=shape)
+    full = np.fft.irfft2(np.fft.rfft2(onehot, s=shape) * kernel_fft, s=shape)
+    counts = full[:, krows-1:, kcols-1:]
+    if whole:
+        counts = np.rint(counts).astype(dtype)
+    return counts
+
+
+def gather_neighbours(wrapping_grid, rows, cols, nhood_arr):
+    """The weighted neighbour states of only the cells at rows, cols, as
+    NumpyBackend.neighbour_states gives for every cell
+
+    Args:
+        wrapping_grid (numpy.ndarray): the grid including a wrapping
+            border as wide as the neighbourhood radius
+        rows, cols (numpy.ndarray): the cells, indexed from the top left
+            of the neighbourhood window in the wrapping grid
+        nhood_arr (numpy.ndarray): the neighbourhood weights
+
+    Returns:
+        numpy.ndarray: (neighbours,) + rows.shape neighbour states
+    """
+    return np.array([nhood_arr[i, j] * wrapping_grid[rows + i, cols + j]
+                     for i, j in neighbour_offsets(nhood_arr)])
+
+
+def gather_counts(wrapping_grid, rows, cols, states, nhood_arr):
+    """The counts of convolution_counts for only the cells at rows, cols,
+    see gather_neighbours"""
+    kernel = np.array(nhood_arr, dtype=np.float64)
+    krows, kcols = kernel.shape
+    kernel[krows // 2, kcols // 2] = 0
+    whole = bool(np.all(kernel == np.round(kernel)) and kernel.min() >= 0)
+    if whole:
+        dtype = np.min_scalar_type(int(kernel.sum()))
+    else:
+        dtype = np.dtype(np.float64)
+    counts = np.zeros((len(states),) + np.shape(rows), dtype=dtype)
+    for i, j in zip(*np.nonzero(kernel)):
+        index = state_index(wrapping_grid[rows + i, cols + j], states)
+        for s in range(len(states)):
+            counts[s] += (index == s) * dtype.type(kernel[i, j])
+    return counts
+
+
+class NeighbourViews(object):
+    """Read-only (n, rows, cols) neighbour states made of strided views of
+    the wrapping grid rather than copies, n being the number of neighbours
+    (8 for a 3x3 neighbourhood).
+
+    Behaves like the array from NumpyBackend.neighbour_states when
+    indexed, iterated or unpacked (nw, n, ne, w, e, sw, s, se = ...).
+    Neighbours with a weight of 1 are views of the grid, masked out
+    neighbours are a broadcast 0 and any other weight is only multiplied
+    out when that neighbour is accessed. np.asarray gives a full copy.
+
+    Note:
+        The views follow the grid, so read them before changing the grid
+        in place in the transition function.
+    """
+    def __init__(self, wrapping_grid, nhood_arr):
+        self.nhood_arr = np.asarray(nhood_arr)
+        # (rows, cols, k, k) view, window [i, j] is the neighbourhood of
+        # grid cell i, j
+        self.windows = sliding_window_view(wrapping_grid,
+                                           self.nhood_arr.shape)
+        self.offsets = neighbour_offsets(self.nhood_arr)
+        self.shape = (len(self.offsets),) + self.windows.shape[:2]
+        self.ndim = len(self.shape)
+        self.dtype = np.result_type(wrapping_grid, self.nhood_arr)
+        # indices of the neighbours that are not masked out
+        self.active = [k for k, (i, j) in enumerate(self.offsets)
+                       if self.nhood_arr[i, j] != 0]
+        self._zeros = np.broadcast_to(np.zeros((), dtype=self.dtype),
+                                      self.shape[1:])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, k):
+        if not isinstance(k, (int, np.integer)):
+            return np.asarray(self)[k]
+        i, j = self.offsets[k]
+        weight = self.nhood_arr[i, j]
+        if weight == 0:
+            return self._zeros
+        view = self.windows[:, :, i, j]
+        if weight == 1:
+            return view
+        return weight * view
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array([self[k] for k in range(len(self))], dtype=dtype)
+
+    def selected(self):
+        """Return the neighbours that are not masked out"""
+        return [self[k] for k in self.active]
+
+
+def as_counts(counts):
+    """Counts widened to COUNT_DTYPE, for counts from convolution_counts
+    or gather_counts that are passed to a transition function"""
+    return counts.astype(COUNT_DTYPE, copy=False)
+
+
+class NumpyBackend(object):
+    """Reference backend, calculates the neighbour states and counts for
+    the whole grid at once using NumPy"""
+    name = 'numpy'
+
+    def neighbour_states(self, wrapping_grid, nhood_arr):
+        """Return an array of each neighbours current state.
+
+        Args:
+            wrapping_grid (numpy.ndarray): the grid including a wrapping
+                border as wide as the neighbourhood radius
+            nhood_arr (numpy.ndarray): the neighbourhood weights
+
+        Returns:
+            numpy.ndarray: the weighted neighbour grids in row-major
+                order, for a 3x3 neighbourhood NW N NE, W E, SW S SE
+        """
+        krows, kcols = np.shape(nhood_arr)
+        numrows = wrapping_grid.shape[0] - (krows - 1)
+        numcols = wrapping_grid.shape[1] - (kcols - 1)
+        return np.array([
+            nhood_arr[i, j] * wrapping_grid[i:i+numrows, j:j+numcols]
+            for i, j in neighbour_offsets(nhood_arr)])
+
+    def _count_by_convolution(self, wrapping_grid, nhood_arr):
+        """Whether to count with convolution_counts, comparing every
+        neighbour array against every state only scales to 3x3 and only
+        counts 0/1 neighbourhoods, weighted neighbours are compared after
+        being multiplied by their weight"""
+        if wrapping_grid is None or nhood_arr is None:
+            return False
+        nhood = np.asarray(nhood_arr)
+        return (nhood.shape != (3, 3) or
+                not np.all((nhood == 0) | (nhood == 1)))
+
+    def count_neighbours(self, neighbour_states, states, wrapping_grid=None,
+                         nhood_arr=None):
+        """Taking the 8 neighbour arrays, return n arrays of how many
+        neighbours of each state each cell has, where n is the number
+        of states
+
+        Note:
+            Neighbourhoods larger than 3x3 or with weights other than 0
+            and 1 are counted with convolution_counts, giving the sum of
+            the weights of the neighbours in each state as a COUNT_DTYPE
+            tensor.
+
+        Args:
+            neighbour_states (numpy.ndarray): the neighbour arrays
+            states (tuple): the states of the CA
+            wrapping_grid (numpy.ndarray): the grid the neighbour states
+                were taken from, for backends that count from the grid
+            nhood_arr (numpy.ndarray): the neighbourhood weights
+
+        Returns:
+            numpy.ndarray: object array holding one count grid per state
+        """
+        if self._count_by_convolution(wrapping_grid, nhood_arr):
+            return as_counts(convolution_counts(wrapping_grid, states,
+                                                nhood_arr))
+        num_masked = 0
+        if isinstance(neighbour_states, NeighbourViews):
+            # only compare the neighbours in use, the masked out
+            # neighbours are all 0
+            num_masked = len(neighbour_states) - len(neighbour_states.active)
+            shape = neighbour_states.shape[1:]
+            neighbour_states = neighbour_states.selected()
+        else:
+            shape = neighbour_states[0].shape
+        state_counts = np.zeros(len(states), dtype=np.ndarray)
+        for i, state in enumerate(states):
+            # for each state in the CA
+            countg = np.zeros(shape)
+            for g in neighbour_states:
+                countg += (g == state) + 0
+            if state == 0:
+                countg += num_masked
+            state_counts[i] = countg
+        return state_counts
+
+
+# thread pools shared by every ThreadedBackend, by number of workers
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def shared_pool(max_workers):
+    """The thread pool of max_workers threads shared by every
+    ThreadedBackend with as many workers, started the first time it is
+    needed. Each grid having its own pool would leave threads behind for
+    every grid created, as grids are never closed"""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(max_workers)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=max_workers)
+            _POOLS[max_workers] = pool
+        return pool
+
+
+class ThreadedBackend(NumpyBackend):
+    """Splits the grid into bands of rows and runs the reference code on
+    each band in a thread pool. NumPy releases the GIL for the whole-array
+    operations so the bands are calculated in parallel on large grids."""
+    name = 'threaded'
+    # bands smaller than this are not worth handing to another thread
+    MIN_BAND_ROWS = 64
+
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self.max_workers = max_workers
+
+    @property
+    def pool(self):
+        """The thread pool the bands run in, shared with every other
+        ThreadedBackend with as many workers (see shared_pool)"""
+        return shared_pool(self.max_workers)
+
+    def _bands(self, numrows):
+        """Split numrows into (start, end) row bands, one per worker"""
+        numbands = max(1, min(self.max_workers,
+                              numrows // self.MIN_BAND_ROWS))
+        edges = np.linspace(0, numrows, numbands + 1).astype(int)
+        return list(zip(edges[:-1], edges[1:]))
+
+    def _run_bands(self, func, bands):
+        """Run func(start, end) for every band, waiting for them all"""
+        if len(bands) == 1:
+            func(*bands[0])
+            return
+        futures = [self.pool.submit(func, start, end) for start, end in bands]
+        for f in futures:
+            # re-raises any exception from the band
+            f.result()
+
+    def neighbour_states(self, wrapping_grid, nhood_arr):
+        # a band of rows needs the neighbourhood radius of extra rows
+        # above and below
+        halo = np.shape(nhood_arr)[0] - 1
+        numrows = wrapping_grid.shape[0] - halo
+        numcols = wrapping_grid.shape[1] - (np.shape(nhood_arr)[1] - 1)
+        out = np.empty((len(neighbour_offsets(nhood_arr)), numrows, numcols),
+                       dtype=np.result_type(wrapping_grid, nhood_arr))
+
+        def band(start, end):
+            out[:, start:end] = NumpyBackend.neighbour_states(
+                self, wrapping_grid[start:end+halo], nhood_arr)
+
+        self._run_bands(band, self._bands(numrows))
+        return out
+
+    def count_neighbours(self, neighbour_states, states, wrapping_grid=None,
+                         nhood_arr=None):
+        if self._count_by_convolution(wrapping_grid, nhood_arr):
+            return as_counts(convolution_counts(wrapping_grid, states,
+                                                nhood_arr))
+        numrows, numcols = neighbour_states[0].shape
+        counts = np.zeros((len(states), numrows, numcols))
+
+        def band(start, end):
+            for i, state in enumerate(states):
+                for g in neighbour_states:
+                    counts[i, start:end] += g[start:end] == state
+
+        self._run_bands(band, self._bands(numrows))
+        state_counts = np.zeros(len(states), dtype=np.ndarray)
+        for i in range(len(states)):
+            state_counts[i] = counts[i]
+        return state_counts
+
+
+def numba_available():
+    """Whether Numba is installed, without importing it"""
+    return importlib.util.find_spec('numba') is not None
+
+
+_count_neighbours_jit = None
+
+
+def count_neighbours_jit():
+    """The Numba compiled stencil loop of NumbaBackend.
+
+    Note:
+        Numba is only imported and the loop compiled (or loaded from
+        Numba's cache) the first time this is called, importing Numba
+        takes longer than the rest of capyle.ca
+    """
+    global _count_neighbours_jit
+    if _count_neighbours_jit is None:
+        import numba
+
+        @numba.njit(parallel=True, cache=True)
+        def count_neighbours(wrapping_grid, offsets, states, counts):
+            """Stencil loop counting the neighbours at offsets of each
+            cell of the wrapping grid in each state"""
+            numrows, numcols = counts.shape[1:]
+            for i in numba.prange(numrows):
+                for k in range(offsets.shape[0]):
+                    # a row of neighbours at a time, read in order
+                    row = wrapping_grid[i + offsets[k, 0]]
+                    col = offsets[k, 1]
+                    for j in range(numcols):
+                        v = row[j + col]
+                        for s in range(states.shape[0]):
+                            if v == states[s]:
+                                counts[s, i, j] += 1.0
+        _count_neighbours_jit = count_neighbours
+    return _count_neighbours_jit
+
+
+class NumbaBackend(NumpyBackend):
+    """Counts neighbours with a Numba JIT compiled stencil loop over the
+    wrapping grid, in the grid's own dtype, the rows of the grid are
+    shared between Numba's threads.
+
+    Note:
+        Only the counting is compiled, the neighbour states passed to the
+        transition function are still built by NumpyBackend. The loop
+        reads the grid rather than the neighbour states, so they are not
+        copied again to be counted.
+    """
+    name = 'numba'
+
+    def count_neighbours(self, neighbour_states, states, wrapping_grid=None,
+                         nhood_arr=None):
+        if wrapping_grid is None or nhood_arr is None:
+            return NumpyBackend.count_neighbours(self, neighbour_states,
+                                                 states)
+        if self._count_by_convolution(wrapping_grid, nhood_arr):
+            return as_counts(convolution_counts(wrapping_grid, states,
+                                                nhood_arr))
+        nhood = np.asarray(nhood_arr)
+        offsets = np.array([(i, j) for i, j in neighbour_offsets(nhood)
+                            if nhood[i, j] != 0], dtype=np.intp)
+        offsets = offsets.reshape(-1, 2)
+        numrows = wrapping_grid.shape[0] - (nhood.shape[0] - 1)
+        numcols = wrapping_grid.shape[1] - (nhood.shape[1] - 1)
+        counts = np.zeros((len(states), numrows, numcols))
+        count_neighbours_jit()(np.ascontiguousarray(wrapping_grid), offsets,
+                               np.asarray(states), counts)
+        # the reference multiplies masked out neighbours by 0, so they
+        # are counted as being in state 0
+        num_masked = len(neighbour_offsets(nhood)) - len(offsets)
+        if num_masked and 0 in states:
+            counts[list(states).index(0)] += num_masked
+        state_counts = np.zeros(len(states), dtype=np.ndarray)
+        for i in range(len(states)):
+            state_counts[i] = counts[i]
+        return state_counts
+
+
+class ConvolveBackend(NumpyBackend):
+    """Counts the neighbours of every state in one pass over the grid.
+
+    The grid is encoded as an index into the states once, one-hot encoded
+    and summed over the neighbourhood for all states together in uint8,
+    giving a (states, rows, cols) tensor instead of an object array of
+    float grids. The 3x3 Moore neighbourhood uses a separable box sum,
+    other neighbourhoods use convolution_counts. The tensor is widened to
+    COUNT_DTYPE once counted, like the counts of the other backends, so
+    eg. subtracting the counts of two states cannot wrap around.
+
+    Note:
+        For 3x3 neighbourhoods of 0s and 1s the counts match the
+        reference backend, including the neighbours masked out by the
+        neighbourhood being counted as state 0. Other weights are never
+        counted by the reference comparison, they give the sum of the
+        weights of the neighbours in each state with convolution_counts,
+        as on every backend.
+    """
+    name = 'convolve'
+
+    def count_neighbours(self, neighbour_states, states, wrapping_grid=None,
+                         nhood_arr=None):
+        if wrapping_grid is None or nhood_arr is None:
+            return NumpyBackend.count_neighbours(self, neighbour_states,
+                                                 states)
+        nhood = np.asarray(nhood_arr)
+        binary = np.all((nhood == 0) | (nhood == 1))
+        if nhood.shape != (3, 3) or not binary:
+            return as_counts(convolution_counts(wrapping_grid, states, nhood))
+        mask = nhood.astype(bool)
+        mask[1, 1] = False
+        if not mask.all():
+            counts = convolution_counts(wrapping_grid, states, mask)
+            # the reference multiplies masked out neighbours by 0, so
+            # they are counted as being in state 0
+            num_masked = np.uint8(8 - np.count_nonzero(mask))
+            if num_masked and 0 in states:
+                counts[list(states).index(0)] += num_masked
+            return as_counts(counts)
+        index = state_index(wrapping_grid, states)
+        # one uint8 plane per state, 1 where the cell is in that state
+        onehot = (index == np.arange(len(states))[:, None, None]).view(
+            np.uint8)
+        # separable 3x3 box sum, then remove the cell itself
+        rowsum = onehot[:, :, :-2] + onehot[:, :, 1:-1] + onehot[:, :, 2:]
+        counts = rowsum[:, :-2] + rowsum[:, 1:-1] + rowsum[:, 2:]
+        counts -= onehot[:, 1:-1, 1:-1]
+        return as_counts(counts)
+
+
+BACKENDS = {}
+
+
+def register_backend(backend_class):
+    """Make a backend class selectable by name with CAConfig.backend
+
+    Args:
+        backend_class (class): class with neighbour_states and
+            count_neighbours methods and a unique name attribute
+    """
+    BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+def get_backend(name):
+    """Create the backend registered under the given name
+
+    Note:
+        If the numba backend is requested but Numba is not installed
+        the numpy backend is used instead.
+
+    Args:
+        name (str): the name of the backend eg. 'numpy'
+
+    Returns:
+        NumpyBackend: an instance of the requested backend
+    """
+    if name not in BACKENDS:
+        raise ValueError("Unknown backend '{b}', must be one of {names}".format(
+            b=name, names=sorted(BACKENDS)))
+    if name == NumbaBackend.name and not numba_available():
+        print("[WARNING] Numba is not installed, using the numpy backend...")
+        name = NumpyBackend.name
+    return BACKENDS[name]()
+
+
+register_backend(NumpyBackend)
+register_backend(ThreadedBackend)
+register_backend(NumbaBackend)
+register_backend(ConvolveBackend)
@@ -20,6 +20,42 @@ class CAConfig(object):
         self.initial_grid = None
         # default wrapping behaviour is True
         self.wrap = True
+        # name of the compute backend used by Grid2D (see backends.py)
+        self.backend = 'numpy'
+        # pass the neighbour states as read-only views instead of copies
+        self.neighbour_views = False
+        # only update the cells around those that changed last step (see
+        # Grid2D._step_sparse), for transition functions of neighbours only
+        self.sparse = False
+        # name of the progress reporter used by Grid.run (see reporters.py)
+        self.progress = 'window'
+        # record the time of each phase of every generation, None, 'time'
+        # or 'memory' (see profiling.py). Grid.run sets profile_report
+        self.profile = None
+        self.profile_report = None
+        # stop Grid.run once a step changes nothing
+        self.stop_on_steady = False
+        # stop Grid.run once the grid repeats a state from at most this
+        # many generations before, None to not look for cycles
+        self.cycle_window = None
+        # continue a run that stopped early to num_generations by repeating
+        # its steady state or cycle instead of truncating the timeline
+        self.pad_timeline = False
+        # name -> per-cell array passed to the transition function as
+        # layers, computed once in setup (see Grid2D.add_static_layer)
+        self.static_layers = {}
+        # name -> Grid2D.add_layer keyword arguments of the cell state kept
+        # alongside the grid, eg. {'burn_age': {'dtype': int}}
+        self.layers = {}
+        # seed for stochastic descriptions, None for a different run each time
+        self.seed = None
+        # .npy file Grid.run streams the timeline to, None to keep it in memory
+        self.timeline_file = None
+        # store keyframes every this many generations and the changed cells
+        # in between (see timeline.DeltaTimeline), None for full frames
+        self.keyframe_interval = None
+        # compression of the keyframes and deltas, None, 'zlib' or 'lzma'
+        self.timeline_compression = None
         self.default_paths()
 
     def fill_in_defaults(self):
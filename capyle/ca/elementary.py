@@ -0,0 +1,253 @@
+import hashlib
+import numpy as np
+from capyle.ca import Profiler, get_reporter
+from capyle.utils import clip_numeric, gens_to_dims, verify_gens
+
+# cells are packed little-endian, 64 to a word
+WORD_BITS = 64
+WORD = np.dtype('<u8')
+
+
+def pack_row(row):
+    """Pack a row of 0/1 cells into words, cell i being bit i % 64 of
+    word i // 64. The padding bits of the last word are 0"""
+    bits = np.packbits(np.asarray(row) != 0, bitorder='little')
+    numwords = -(-len(row) // WORD_BITS)
+    padded = np.zeros(numwords * WORD.itemsize, dtype=np.uint8)
+    padded[:len(bits)] = bits
+    return padded.view(WORD)
+
+
+def unpack_rows(words, width):
+    """Unpack rows of words (see pack_row) into (rows, width) uint8 cells"""
+    words = np.atleast_2d(words)
+    bits = np.unpackbits(np.ascontiguousarray(words, dtype=WORD).view(
+        np.uint8), axis=-1, bitorder='little')
+    return bits[:, :width]
+
+
+class Elementary1D(object):
+    """Bit-packed engine for 2 state, radius 1 (elementary) 1D CAs.
+
+    Rows are packed 64 cells to a word and the next row is made from the
+    words of the left, center and right neighbours with bit shifts, the
+    rule applied as a sum of products over the 8 neighbourhood patterns.
+    The history is kept packed too, see ElementaryTimeline.
+
+    Note:
+        Runs the same CA as Grid1D with wolframs_1d's transition function,
+        for configs with states (0, 1) and a 3 cell neighbourhood (see
+        supports). The grid is as wide as ca_config.grid_dims, so rows can
+        be far wider than the 2 * generations + 1 Grid1D uses.
+    """
+
+    def __init__(self, ca_config, rule_num=None):
+        """
+        Args:
+            ca_config (CAConfig): the config of the CA
+            rule_num (int): the Wolfram rule number, defaults to
+                ca_config.rule_num
+
+        Raises:
+            ValueError: if the config is not of an elementary CA
+        """
+        if not self.supports(ca_config):
+            raise ValueError('Elementary1D only runs 1D CAs with states '
+                             '(0, 1) and a 3 cell neighbourhood')
+        self.ca_config = ca_config
+        rule_num = ca_config.rule_num if rule_num is None else rule_num
+        self.rule_num = clip_numeric(int(rule_num), 0, 255)
+        num_generations = verify_gens(ca_config.num_generations)
+        if ca_config.grid_dims is not None:
+            self.width = ca_config.grid_dims[1]
+        else:
+            self.width = gens_to_dims(num_generations)[1]
+        self.numwords = -(-self.width // WORD_BITS)
+        # the valid bits of the last word
+        self.lastmask = WORD.type(
+            (1 << (self.width - (self.numwords - 1) * WORD_BITS)) - 1)
+        nhood = np.ravel(ca_config.nhood_arr) if (
+            ca_config.nhood_arr is not None) else np.ones(3)
+        self.use_left, self.use_right = nhood[0] != 0, nhood[2] != 0
+        row = np.zeros(self.width, dtype=np.uint8)
+        if ca_config.initial_grid is not None:
+            initial = np.atleast_2d(ca_config.initial_grid)[0]
+            copycols = min(len(initial), self.width)
+            row[:copycols] = initial[:copycols] == 1
+        self.row = pack_row(row)
+        self.current_gen = 0
+        self.stopped_at = None
+        self.period = None
+
+    @staticmethod
+    def supports(ca_config):
+        """Whether the config is of a CA Elementary1D can run"""
+        states = ca_config.states
+        nhood = ca_config.nhood_arr
+        return (ca_config.dimensions == 1 and states is not None and
+                tuple(states) == (0, 1) and
+                (nhood is None or np.size(nhood) == 3))
+
+    def neighbour_words(self, row):
+        """The words of every cell's left and right neighbours"""
+        wrap = bool(self.ca_config.wrap)
+        one = WORD.type(1)
+        # the left neighbour of bit 0 is bit 63 of the word before
+        carry = np.roll(row, 1) >> WORD.type(WORD_BITS - 1)
+        carry[0] = (row[-1] >> WORD.type((self.width - 1) % WORD_BITS)
+                    ) & one if wrap else 0
+        left = (row << one) | carry
+        # the right neighbour of bit 63 is bit 0 of the word after
+        carry = np.roll(row, -1) << WORD.type(WORD_BITS - 1)
+        carry[-1] = 0
+        right = (row >> one) | carry
+        if wrap:
+            right[-1] |= (row[0] & one) << WORD.type(
+                (self.width - 1) % WORD_BITS)
+        if not self.use_left:
+            left[:] = 0
+        if not self.use_right:
+            right[:] = 0
+        return left, right
+
+    def next_row(self, row):
+        """Apply the rule to a packed row, returning the next row"""
+        left, right = self.neighbour_words(row)
+        words = {(1, 0): left, (0, 0): ~left, (1, 1): row, (0, 1): ~row,
+                 (1, 2): right, (0, 2): ~right}
+        new = np.zeros_like(row)
+        for pattern in range(8):
+            if self.rule_num >> pattern & 1:
+                l, c, r = pattern >> 2 & 1, pattern >> 1 & 1, pattern & 1
+                new |= words[l, 0] & words[c, 1] & words[r, 2]
+        new[-1] &= self.lastmask
+        return new
+
+    def step(self):
+        """Calculate the next generation"""
+        self.row = self.next_row(self.row)
+        self.current_gen += 1
+
+    def run(self):
+        """Run the CA for ca_config.num_generations generations.
+
+        Note:
+            The early termination policies of Grid.run (stop_on_steady,
+            cycle_window and pad_timeline) are applied to the rows. With
+            ca_config.profile set, each step is timed as the transition
+            phase (see profiling.py).
+
+        Returns:
+            ElementaryTimeline: the grid state for each timestep
+        """
+        num_generations = verify_gens(self.ca_config.num_generations)
+        history = np.zeros((num_generations + 1, self.numwords), dtype=WORD)
+        history[0] = self.row
+        progress = get_reporter(self.ca_config.progress, num_generations,
+                                self.width)
+        window = self.ca_config.cycle_window
+        detect = self.ca_config.stop_on_steady or window
+        seen = {self._digest(): 0} if detect else {}
+        self.stopped_at = self.period = None
+        profiler = None
+        step = self.step
+        if self.ca_config.profile:
+            profiler = Profiler(num_generations, self.width,
+                                self.ca_config.profile)
+            step = profiler.wrap('transition', self.step)
+            profiler.start()
+        for i in range(num_generations):
+            if profiler is not None:
+                profiler.start_generation()
+            step()
+            history[i+1] = self.row
+            if (i+1) % 10 == 9:
+                progress.set(i+1)
+            if detect:
+                digest = self._digest()
+                if digest in seen:
+                    period = i + 1 - seen[digest]
+                    if period == 1 or (window and period <= window):
+                        self.stopped_at, self.period = i + 1, period
+                if self.stopped_at is None:
+                    seen[digest] = i + 1
+            if profiler is not None:
+                profiler.end_generation()
+            if self.stopped_at is not None:
+                break
+        progress.set(num_generations)
+        if profiler is not None:
+            profiler.stop()
+            self.ca_config.profile_report = profiler.report()
+        if self.stopped_at is not None:
+            if self.ca_config.pad_timeline:
+                for i in range(self.stopped_at + 1, num_generations + 1):
+                    history[i] = history[i - self.period]
+            else:
+                history = history[:self.stopped_at + 1]
+        return ElementaryTimeline(history, self.width, num_generations + 1)
+
+    def _digest(self):
+        return hashlib.blake2b(self.row.tobytes(), digest_size=16).digest()
+
+
+class ElementaryTimeline(object):
+    """The timeline of an Elementary1D run, kept as packed rows.
+
+    As with Grid1D, frame t is the (generations + 1, width) grid with the
+    rows of generations 0 to t filled in and the later rows 0. Frames are
+    unpacked when indexed.
+    """
+
+    def __init__(self, history, width, numrows=None):
+        """
+        Args:
+            history (numpy.ndarray): (frames, words) packed rows
+            width (int): the number of cells in a row
+            numrows (int): the rows of a frame, generations + 1 of the
+                config even if the run stopped early. Defaults to frames
+        """
+        self.history = history
+        self.width = width
+        self.numrows = len(history) if numrows is None else numrows
+        self.dtype = np.dtype(np.uint8)
+
+    @property
+    def shape(self):
+        return (len(self.history), self.numrows, self.width)
+
+    @property
+    def ndim(self):
+        return 3
+
+    @property
+    def nbytes(self):
+        return self.history.nbytes
+
+    def __len__(self):
+        return len(self.history)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return np.stack([self[j] for j in range(*i.indices(len(self)))])
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Frame {i} out of range for {n} frames".format(
+                i=i, n=len(self)))
+        frame = np.zeros((self.numrows, self.width), dtype=self.dtype)
+        frame[:i+1] = unpack_rows(self.history[:i+1], self.width)
+        return frame
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None, copy=None):
+        frames = np.stack(list(self))
+        return frames if dtype is None else frames.astype(dtype)
+
+    def rows(self):
+        """The unpacked (frames, width) row of each generation run"""
+        return unpack_rows(self.history, self.width)
@@ -1,14 +1,20 @@
+import hashlib
 import numpy as np
-from capyle.ca import Neighbourhood
+from capyle.ca import (Neighbourhood, Profiler, get_reporter, new_timeline,
+                       truncate_timeline)
 from capyle.utils import scale_array, verify_gens
-import tkinter as tk
 
 
 class Grid(object):
     """Superclass to the Grid1D and Grid2D classes"""
 
     def __init__(self):
-        pass
+        # the generation run stopped at early and the period of the cycle
+        # it stopped in (1 for a steady state), None if not stopped early
+        self.stopped_at = None
+        self.period = None
+        # the Profiler of the run when ca_config.profile is set
+        self.profiler = None
 
     def __str__(self):
         """toString function"""
@@ -18,6 +24,49 @@ class Grid(object):
         """Enforce a step funciton in subclasses"""
         pass
 
+    def current_state(self):
+        """The cells a step changes, compared to find steady states and
+        cycles"""
+        return self.grid
+
+    def repeat_step(self, period, timeline, generation):
+        """Advance the grid to generation by repeating the state of the
+        grid period generations before, without stepping it
+
+        Args:
+            period (int): the period of the cycle the grid is in
+            timeline: the timeline saved so far
+            generation (int): the generation to advance to
+        """
+        self.grid[...] = timeline[generation - period]
+        self.refresh_wrap()
+
+    def repeat_cycle(self, timeline, num_generations):
+        """Fill in the generations after the run stopped by repeating the
+        steady state or cycle it stopped in, leaving the grid in the state
+        of the last generation
+
+        Note:
+            The frames are copied a cycle at a time, in one block for a
+            steady state, rather than the grid being advanced through every
+            generation. A DeltaTimeline is appended to a frame at a time
+
+        Args:
+            timeline: the timeline saved so far, up to self.stopped_at
+            num_generations (int): the generations the run was for
+        """
+        start, period = self.stopped_at + 1, self.period
+        if start > num_generations:
+            return
+        if isinstance(timeline, np.ndarray):
+            for i in range(start, num_generations + 1, period):
+                end = min(i + period, num_generations + 1)
+                timeline[i:end] = timeline[i-period:end-period]
+        else:
+            for i in range(start, num_generations + 1):
+                timeline[i] = timeline[i - period]
+        self.repeat_step(period, timeline, num_generations)
+
     def set_grid(self, g):
         """Set self.grid to supplied grid, scaling the supplied grid
         if nessacary"""
@@ -47,93 +96,127 @@ class Grid(object):
             self.neighbourhood = Neighbourhood(self.neighbourhood,
                                                dims=ca_config.dimensions)
 
-    def run(self):
+    def run(self, stop_condition=None):
         """Set up running the CA for given generations,
         saving each timestep to an array 'timeline'
 
         Note:
-            The actual running of the CA is done by the self.runca
-            which is passed to the progress bar so that it can be
-            updated
+            The timeline is one preallocated (generations + 1, rows, cols)
+            array of the smallest dtype that holds the states, see
+            timeline.py. If ca_config.timeline_file is set, the timeline
+            is memory-mapped to that .npy file and written out as it runs.
+            If ca_config.keyframe_interval is set, the timeline is a
+            DeltaTimeline of keyframes and changed cells instead
+
+            Progress is reported by the reporter named by
+            ca_config.progress, see reporters.py
+
+            The run stops early once a step changes nothing (if
+            ca_config.stop_on_steady), the grid repeats a state from at
+            most ca_config.cycle_window generations before, or
+            stop_condition returns True. The timeline is then truncated
+            after the last generation run, unless ca_config.pad_timeline
+            is set (always for timelines streamed to a file) in which case
+            the remaining generations repeat the steady state or cycle
+            without being stepped. A stop_condition stop is padded with
+            the final state.
+
+            If ca_config.profile is set the time of each phase of every
+            generation is recorded, see profiling.py, and the report
+            stored in ca_config.profile_report.
+
+        Args:
+            stop_condition (function): optional stop_condition(grid,
+                generation) returning True to stop after that generation
 
         Returns:
             numpy.ndarray: contains the grid state for each timestep
         """
         num_generations = verify_gens(self.ca_config.num_generations)
-        timeline = np.empty(num_generations + 1, dtype=np.ndarray)
-        # Progress window
-        # pass in the run function and timeline to the progress bar
-        # progress bar executes these
-        gui = _ProgressWindow(num_generations, self._runca, timeline)
+        timeline = new_timeline(num_generations + 1, self.grid.shape,
+                                self.ca_config.states,
+                                self.ca_config.timeline_file,
+                                self.ca_config.keyframe_interval,
+                                self.ca_config.timeline_compression)
+        progress = get_reporter(self.ca_config.progress, num_generations,
+                                self.current_state().size)
+        self.profiler = None
+        if self.ca_config.profile:
+            self.profiler = Profiler(num_generations,
+                                     self.current_state().size,
+                                     self.ca_config.profile)
+            self.profiler.instrument(self)
+        try:
+            self._runca(num_generations, progress, timeline, stop_condition)
+        finally:
+            if self.profiler is not None:
+                self.profiler.uninstrument()
+                self.ca_config.profile_report = self.profiler.report()
+        if self.stopped_at is not None:
+            if self.ca_config.pad_timeline or isinstance(timeline, np.memmap):
+                self.repeat_cycle(timeline, num_generations)
+            else:
+                timeline = truncate_timeline(timeline, self.stopped_at + 1)
+        if isinstance(timeline, np.memmap):
+            timeline.flush()
         return timeline
 
-    def _runca(self, num_generations, progressbar, timeline):
+    def _runca(self, num_generations, progressbar, timeline,
+               stop_condition=None):
         """Running the CA for given generations,
         saving each timestep to an array 'timeline'
 
-        Note:
-            This function is passed to the progress bar for it to execute
+        Args:
+            num_generations (int): the number of generations to run
+            progressbar: the progress reporter to update
+            timeline (numpy.ndarray): the array to save each timestep to
+            stop_condition (function): see run
         """
+        self.stopped_at = self.period = None
+        window = self.ca_config.cycle_window
+        detect = self.ca_config.stop_on_steady or window
+        # digest of each state -> the last generation it was seen
+        seen = {}
+        if detect:
+            seen[self._digest()] = 0
+        profiler = self.profiler
         # save initial state
-        timeline[0] = np.copy(self.grid)
+        timeline[0] = self.grid
         for i in range(num_generations):
             # calculate the next timestep and save it
-            self.step()
-            timeline[i+1] = np.copy(self.grid)
+            if profiler is None:
+                self.step()
+                timeline[i+1] = self.grid
+            else:
+                profiler.start_generation()
+                self.step()
+                with profiler.phase('timeline'):
+                    timeline[i+1] = self.grid
             # update the progress bar every 10 generations
             if (i+1) % 10 == 9:
+                # write back generations streamed to a file so far, before
+                # reporting them so they can be read once reported
+                if isinstance(timeline, np.memmap):
+                    timeline.flush()
                 progressbar.set(i+1)
-
-
-class _ProgressWindow(object):
-    WINDOW_TITLE = 'Running...'
-    MAX_WIDTH = 200
-    HEIGHT = 20
-
-    def __init__(self, maxval, run, timeline):
-        """Create a progress bar window, and use the function 'run' to
-        run the CA, update the variable timeline, and the progress gui
-
-        Args:
-            maxval (int): The number of generation to be run by the CA
-            run (function): The run function that actuall executes the CA
-            timeline (numpy.ndarray): the array object to save the grid state
-                for each timestep
-        """
-        self.maxval = maxval
-        self.root = tk.Tk()
-        # set title
-        self.root.wm_title(self.WINDOW_TITLE)
-        # lift to top layer
-        self.root.lift()
-        self.root.attributes('-topmost', True)
-        self.root.after_idle(self.root.attributes, '-topmost', False)
-        #disable close
-        self.root.protocol('WM_DELETE_WINDOW', self.noclose)
-
-        self.progress_canvas = tk.Canvas(self.root,
-                                         height=self.HEIGHT,
-                                         width=self.MAX_WIDTH)
-        bar = self.progress_canvas.create_rectangle(0, 0, 0,
-                                                    self.HEIGHT, fill="blue")
-        self.progress_canvas.pack()
-        self.root.after(1, run(maxval, self, timeline))
-
-    def noclose(self):
-        pass
-
-    def set(self, val):
-        """Set the progress bar to the given generation number
-
-        Args:
-            val (int): The generation number (translated to a progress bar
-                length)
-        """
-        if val >= self.maxval:
-            self.root.destroy()
-            return
-        p = val/self.maxval
-        w = int(p * self.MAX_WIDTH)
-        self.progress_canvas.create_rectangle(0, 0, w, self.HEIGHT,
-                                              fill="blue")
-        self.root.update()
+            if detect:
+                digest = self._digest()
+                if digest in seen:
+                    period = i + 1 - seen[digest]
+                    if period == 1 or (window and period <= window):
+                        self.stopped_at, self.period = i + 1, period
+                if self.stopped_at is None:
+                    seen[digest] = i + 1
+            if (self.stopped_at is None and stop_condition is not None and
+                    stop_condition(self.grid, i+1)):
+                self.stopped_at, self.period = i + 1, 1
+            if profiler is not None:
+                profiler.end_generation()
+            if self.stopped_at is not None:
+                break
+        progressbar.set(num_generations)
+
+    def _digest(self):
+        """Hash of the current state, equal states have equal digests"""
+        state = np.ascontiguousarray(self.current_state())
+        return hashlib.blake2b(state.tobytes(), digest_size=16).digest()
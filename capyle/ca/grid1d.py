@@ -82,6 +82,25 @@ class Grid1D(Grid):
             counts[i] = (l == s) + (r == s)
         return counts
 
+    def current_state(self):
+        """The row of the current generation, see Grid.current_state"""
+        return self.grid[self.current_gen]
+
+    def repeat_step(self, period, timeline, generation):
+        """Fill in the next row by repeating the row period generations
+        before, see Grid.repeat_step"""
+        self.current_gen += 1
+        self.grid[self.current_gen] = self.grid[self.current_gen - period]
+        self.refresh_wrap()
+
+    def repeat_cycle(self, timeline, num_generations):
+        """Each frame of a 1D timeline is the frame before with one more
+        row, so the rows are repeated a generation at a time, see
+        Grid.repeat_cycle"""
+        for i in range(self.stopped_at + 1, num_generations + 1):
+            self.repeat_step(self.period, timeline, i)
+            timeline[i] = self.grid
+
     def step(self):
         """ Calculate the next timestep by applying the transistion function
         and save the new state to grid """
@@ -1,5 +1,7 @@
 import numpy as np
-from capyle.ca import Grid, Neighbourhood
+from capyle.ca import (Grid, Neighbourhood, NeighbourViews, RuleTable,
+                       as_counts, convolution_counts, gather_counts,
+                       gather_neighbours, get_backend)
 from capyle.utils import clip_numeric
 
 class Grid2D(Grid):
@@ -15,8 +17,16 @@ class Grid2D(Grid):
                 'Invalid grid size {g}'.format(g=ca_config.grid_dims))
         # store a handle on config object
         self.ca_config = ca_config
-        # wrap size is 1 col & row all the way round the grid
-        wrapsize = 1
+        # set neighbourhood
+        self.set_neighbourhood(ca_config)
+        # wrap size is as many cols & rows all the way round the grid as
+        # the neighbourhood reaches out from the center cell
+        wrapsize = max(1, self.neighbourhood.radius)
+        self.wrapsize = wrapsize
+        if not (numrows >= wrapsize and numcols >= wrapsize):
+            raise ValueError(
+                'Grid size {g} is smaller than the neighbourhood radius {r}'
+                .format(g=ca_config.grid_dims, r=wrapsize))
         # wrap size doubled for the row/colum on each side of the grid
         # ie. a wrap size of 1 requires 2 extra rows and 2 extra columns
         self.wrapping_grid = np.empty((numrows + wrapsize*2,
@@ -28,12 +38,19 @@ class Grid2D(Grid):
         # Generate the indices only once per grid
         self.wrapindicies, self.gridindicies = self._gen_wrap_indicies(
             wrapsize)
+        # name -> cell state kept alongside the grid, each layer its own
+        # contiguous array with a wrapping border (see add_layer)
+        self.layers = {}
+        self._wrapping_layers = {}
+        self._layer_wraps = {}
+        # flat indices of the cells that may change next step when
+        # ca_config.sparse is set, None for every cell
+        self.active = None
         # if at t = 0 grid has been supplied, set the states
-        print(ca_config.initial_grid)
         if ca_config.initial_grid is not None:
             self.set_grid(ca_config.initial_grid)
-        # set neighbourhood
-        self.set_neighbourhood(ca_config)
+        # compute backend used to calculate the neighbour states and counts
+        self.backend = get_backend(ca_config.backend)
         # Handle any additional variables the user wishes to keep track of
         # for use in the transition function
         self.additional_args = None
@@ -42,8 +59,111 @@ class Grid2D(Grid):
             self.additional_args = transition_func[1:]
         else:
             self.transition_func = transition_func
+        # rule tables are looked up directly rather than called
+        self.rule = None
+        if isinstance(self.transition_func, RuleTable):
+            self.rule = self.transition_func
+            self.rule.compile(self.neighbourhood.neighbourhood)
+        # read-only per-cell arrays computed once, passed to the transition
+        # function as layers (see add_static_layer)
+        self.static_layers = {}
+        for name, values in ca_config.static_layers.items():
+            self.add_static_layer(name, values)
+        for name, options in ca_config.layers.items():
+            self.add_layer(name, **options)
         self.iterations = 0
-        self.burning_grid = np.full((102, 102), -1, dtype = int)
+
+    def add_layer(self, name, dtype=float, initial=0, wrap=None):
+        """Add a named layer of per-cell state kept alongside the grid,
+        eg. how long each cell has been burning or its fuel load.
+
+        Note:
+            The transition function is passed the layers, with the static
+            layers, as the keyword argument layers, a dict of name to the
+            writable layer. Update the layers in place, the grid keeps
+            them between steps. In sparse mode a cell whose layers change
+            stays active, like a cell whose state changes.
+
+        Args:
+            name (str): the name of the layer in layers
+            dtype (numpy.dtype): the dtype of the layer
+            initial: the initial value of every cell, an array the shape
+                of the grid, or a function of the initial grid returning
+                one
+            wrap: the wrap of the layer as CAConfig.wrap, True to wrap
+                around or a value to pad the grid with. None for the wrap
+                of the grid
+
+        Returns:
+            numpy.ndarray: the layer, a view of the grid cells of its
+                wrapping array
+
+        Raises:
+            ValueError: if there is already a layer called name
+        """
+        if name in self.layers or name in self.static_layers:
+            raise ValueError("Grid already has a layer '{n}'".format(n=name))
+        if callable(initial):
+            initial = initial(self.grid)
+        w = self.wrapsize
+        wrapping = np.zeros(self.wrapping_grid.shape, dtype=dtype)
+        layer = wrapping[w:-w, w:-w]
+        layer[:, :] = initial
+        self.layers[name] = layer
+        self._wrapping_layers[name] = wrapping
+        self._layer_wraps[name] = wrap
+        self._refresh_wrap(wrapping, layer, self._layer_wrap(name))
+        return layer
+
+    def layer_neighbours(self, name):
+        """The neighbours' values of a layer, as read-only views of the
+        layer (see NeighbourViews)"""
+        return NeighbourViews(self._wrapping_layers[name],
+                              self.neighbourhood.neighbourhood)
+
+    def _layer_wrap(self, name):
+        wrap = self._layer_wraps[name]
+        return self.ca_config.wrap if wrap is None else wrap
+
+    def _transition_layers(self):
+        """The layers passed to the transition function"""
+        layers = dict(self.static_layers)
+        layers.update(self.layers)
+        return layers
+
+    def add_static_layer(self, name, values):
+        """Register a per-cell array that does not change during the run,
+        eg. terrain flammability or slope, computed once here rather than
+        every step.
+
+        Note:
+            Once a grid has static layers its transition function is
+            passed them as the keyword argument layers, a dict of name to
+            array. In sparse mode the arrays hold just the active cells,
+            in the same (1, n) row as the grid.
+
+        Args:
+            name (str): the name of the layer in layers
+            values: an array the shape of the grid (or broadcastable to
+                it), or a function of the initial grid returning one
+
+        Returns:
+            numpy.ndarray: the read-only layer
+        """
+        if callable(values):
+            values = values(self.grid)
+        if name in self.layers:
+            raise ValueError("Grid already has a layer '{n}'".format(n=name))
+        layer = np.array(np.broadcast_to(values, self.grid.shape))
+        layer.flags.writeable = False
+        self.static_layers[name] = layer
+        return layer
+
+    def set_grid(self, g):
+        """Set self.grid to supplied grid, see Grid.set_grid"""
+        Grid.set_grid(self, g)
+        # any cell may change after the grid is set
+        self.active = None
 
     def _gen_wrap_indicies(self, wrapsize):
         """Create the indecies used when refreshing the wrap"""
@@ -87,73 +207,177 @@ class Grid2D(Grid):
 
     def refresh_wrap(self):
         """ Update the wrapping border of the grid to reflect any changes """
+        self._refresh_wrap(self.wrapping_grid, self.grid, self.ca_config.wrap)
+        for name, layer in self.layers.items():
+            self._refresh_wrap(self._wrapping_layers[name], layer,
+                               self._layer_wrap(name))
+
+    def _refresh_wrap(self, wrapping_grid, grid, wrap):
         # if wrap false set to default non wrap state (-100)
-        wrap = self.ca_config.wrap
         if type(wrap) is bool and wrap is False:
             wrap = -100
         # Normal wrapping behaviour
         if type(wrap) is bool and wrap is True:
             # set the wrap to the oppostite cell bank of the grid
             for w, g in zip(self.wrapindicies, self.gridindicies):
-                gridsection = self.grid[g[0]:g[1], g[2]:g[3]]
-                self.wrapping_grid[w[0]:w[1], w[2]:w[3]] = gridsection
+                gridsection = grid[g[0]:g[1], g[2]:g[3]]
+                wrapping_grid[w[0]:w[1], w[2]:w[3]] = gridsection
         elif type(wrap) is int or type(wrap) is float:
             # User specified dead state to surround the grid
             for w in self.wrapindicies:
-                self.wrapping_grid[w[0]:w[1], w[2]:w[3]] = wrap
+                wrapping_grid[w[0]:w[1], w[2]:w[3]] = wrap
         else:
             sys.exit("Invalid wrap {} of type {}".format(wrap, type(wrap)))
 
-    def get_neighbour_states(self, applyneighbourhood=True):
-        """Return the 8 arrays of each neighbours current state."""
-        grid = self.wrapping_grid
+    def get_neighbour_states(self, applyneighbourhood=True, views=None):
+        """Return the arrays of each neighbours current state, 8 for a
+        3x3 neighbourhood.
+
+        Args:
+            applyneighbourhood (bool): weight the neighbours by the
+                neighbourhood, otherwise all neighbours are used as they are
+            views (bool): return read-only views of the grid
+                (NeighbourViews) instead of copies, defaults to
+                ca_config.neighbour_views
+        """
         if applyneighbourhood:
             nhood_arr = self.neighbourhood.neighbourhood
         else:
-            nhood_arr = np.ones((3, 3))
+            nhood_arr = np.ones(self.neighbourhood.neighbourhood.shape)
+        if views is None:
+            views = self.ca_config.neighbour_views
+        if views:
+            return NeighbourViews(self.wrapping_grid, nhood_arr)
         # Return the NW N NE, W self E, SW S SE neighbourgrids
-        nw = nhood_arr[0, 0] * grid[0:-2, 0:-2]
-        n = nhood_arr[0, 1] * grid[0:-2, 1:-1]
-        ne = nhood_arr[0, 2] * grid[0:-2, 2:]
-        w = nhood_arr[1, 0] * grid[1:-1, 0:-2]
-        e = nhood_arr[1, 2] * grid[1:-1, 2:]
-        sw = nhood_arr[2, 0] * grid[2:, 0:-2]
-        s = nhood_arr[2, 1] * grid[2:, 1:-1]
-        se = nhood_arr[2, 2] * grid[2:, 2:]
-        return np.array([nw, n, ne, w, e, sw, s, se])
+        return self.backend.neighbour_states(self.wrapping_grid, nhood_arr)
 
     def count_neighbours(self, neighbour_states):
         """
-        Taking the 8 neighbour arrays, return n arrays of how many
+        Taking the neighbour arrays, return n arrays of how many
         neighbours of each state each cell are in each state,
         where n is the number of states
         """
-        states = self.ca_config.states
-        state_counts = np.zeros(len(states), dtype=np.ndarray)
-        for i, state in enumerate(states):
-            # for each state in the CA
-            countg = np.zeros(self.grid.shape)
-            for g in neighbour_states:
-                countg += (g == state) + 0
-            state_counts[i] = countg
-        return state_counts
+        return self.backend.count_neighbours(
+            neighbour_states, self.ca_config.states,
+            wrapping_grid=self.wrapping_grid,
+            nhood_arr=self.neighbourhood.neighbourhood)
 
     def step(self):
         """ 
         Calculate the next timestep by applying the transistion function
         and save the new state to grid.
         """
+        if self.ca_config.sparse:
+            self._step_sparse()
+            return
+        if self.rule is not None:
+            # count just the states the rule depends on and look up the
+            # new states
+            counts = convolution_counts(self.wrapping_grid,
+                                        self.rule.count_states,
+                                        self.neighbourhood.neighbourhood)
+            self.grid[:, :] = self.rule.apply(self.grid, counts)
+            self.iterations += 1
+            self.refresh_wrap()
+            return
         ns = self.get_neighbour_states()
         nc = self.count_neighbours(ns)
+        kwargs = {}
+        if self.layers or self.static_layers:
+            kwargs['layers'] = self._transition_layers()
         if self.additional_args is None:
-            self.grid, iterations, burning_grid = self.transition_func(self.grid, ns, nc, self.iterations, self.burning_grid)
+            self.grid[:, :] = self.transition_func(self.grid, ns, nc,
+                                                   **kwargs)
         else:
-            self.grid, iterations, burning_grid = self.transition_func(self.grid, ns, nc, self.iterations, self.burning_grid
-                                             *self.additional_args)
-        self.iterations = iterations
-        self.burning_grid = burning_grid
+            self.grid[:, :] = self.transition_func(self.grid, ns, nc,
+                                                   *self.additional_args,
+                                                   **kwargs)
+        self.iterations += 1
         self.refresh_wrap()
 
+    def _step_sparse(self):
+        """
+        Calculate the next timestep for only the active cells, the cells
+        that changed last step and the cells they are neighbours of.
+
+        Note:
+            A cell whose state and neighbour states are the same as last
+            step is assumed to keep its state, so this only gives the
+            same result as step for transition functions where a cell's
+            next state depends on nothing but its state and neighbours.
+
+            The active cells are passed to the transition function as a
+            single (1, n) row, with (neighbours, 1, n) neighbour states
+            and (states, 1, n) counts. Transition functions must not
+            index cells by their position in the grid.
+        """
+        numcols = self.grid.shape[1]
+        if self.active is None:
+            self.active = np.arange(self.grid.size)
+        rows, cols = np.divmod(self.active[np.newaxis, :], numcols)
+        nhood_arr = self.neighbourhood.neighbourhood
+        # the top left of each cell's neighbourhood in the wrapping grid
+        top = self.wrapsize - self.neighbourhood.radius
+        cells = self.grid[rows, cols]
+        if self.rule is not None:
+            counts = gather_counts(self.wrapping_grid, rows + top, cols + top,
+                                   self.rule.count_states, nhood_arr)
+            newcells = self.rule.apply(cells, counts)
+            layers = {}
+        else:
+            ns = gather_neighbours(self.wrapping_grid, rows + top,
+                                   cols + top, nhood_arr)
+            binary = np.all((nhood_arr == 0) | (nhood_arr == 1))
+            if np.shape(nhood_arr) == (3, 3) and binary:
+                nc = self.backend.count_neighbours(ns, self.ca_config.states)
+            else:
+                nc = as_counts(gather_counts(
+                    self.wrapping_grid, rows + top, cols + top,
+                    self.ca_config.states, nhood_arr))
+            args = () if self.additional_args is None else (
+                self.additional_args)
+            # the layers of just the active cells, copied back after
+            layers = {name: layer[rows, cols]
+                      for name, layer in self.layers.items()}
+            kwargs = {}
+            if self.layers or self.static_layers:
+                kwargs['layers'] = {name: layer[rows, cols] for name, layer
+                                    in self.static_layers.items()}
+                kwargs['layers'].update(
+                    {name: values.copy() for name, values in layers.items()})
+            newcells = self.transition_func(cells.copy(), ns, nc, *args,
+                                            **kwargs)
+        newcells = np.asarray(newcells).reshape(cells.shape)
+        changed = newcells != cells
+        for name, values in layers.items():
+            newvalues = kwargs['layers'][name]
+            self.layers[name][rows, cols] = newvalues
+            changed |= newvalues != values
+        self.grid[rows[changed], cols[changed]] = newcells[changed]
+        self.iterations += 1
+        self.refresh_wrap()
+        self.active = self._affected_cells(rows[changed], cols[changed])
+
+    def _affected_cells(self, rows, cols):
+        """Flat indices of the given cells and every cell they are
+        neighbours of, in sorted order"""
+        numrows, numcols = self.grid.shape
+        radius = self.neighbourhood.radius
+        offsets = {(i - radius, j - radius) for i, j
+                   in zip(*np.nonzero(self.neighbourhood.neighbourhood))}
+        offsets.add((0, 0))
+        indices = []
+        for di, dj in offsets:
+            # cell x has y as a neighbour at offset d if y = x + d
+            r, c = rows - di, cols - dj
+            if self.ca_config.wrap is True:
+                r, c = r % numrows, c % numcols
+            else:
+                inside = (r >= 0) & (r < numrows) & (c >= 0) & (c < numcols)
+                r, c = r[inside], c[inside]
+            indices.append(r * numcols + c)
+        return np.unique(np.concatenate(indices))
+
 def randomise2d(grid, background_state, proportions):
     """ 
     Takes a grid, the background state, and proportions for each state in a 
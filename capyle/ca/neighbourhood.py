@@ -47,14 +47,15 @@ class Neighbourhood(object):
             raise ValueError(
                 "Neighbourhood must have a center to represent the cell")
 
-        # scale the neighbourhood to the correct size of 3x3
-        # [1,1,1] -> [[0,0,0],[1,1,1],[0,0,0]]      #increase
-        # nhood.shape = 5,5 -> nhood.shape = 3,3    #decrease
-        if nhood.shape > (3, 3):
-            print("[WARNING] Neighbourhood too large, scaling to 3x3...")
-            nhood = self._reduce_to_3x3(nhood)
-        elif nhood.shape < (3, 3):
-            nhood = self._increase_to_3x3(nhood)
+        # pad the neighbourhood to a square of at least 3x3
+        # [1,1,1] -> [[0,0,0],[1,1,1],[0,0,0]]
+        # [[1,1,1,1,1]] -> 5x5 with the given row in the center
+        # larger neighbourhoods are kept at their full size
+        if nhood.ndim == 1:
+            nhood = nhood.reshape(1, nhood.shape[0])
+        size = max(3, *nhood.shape)
+        if nhood.shape != (size, size):
+            nhood = self._pad_to_square(nhood, size)
         return nhood
 
     def _prepare1D(self, nhood):
@@ -95,47 +96,27 @@ class Neighbourhood(object):
             return True
         return False
 
-    def _reduce_to_3x3(self, nhood, fullmatrix=True):
-        """
-        With the fullmatrix == True, the array will be reduced to 3x3,
-        otherwise the appropriate dimensions will be reduced
-        eg. [[1,1,1,1,1]] -> [[1,1,1]]
-        """
-        rows, cols = nhood.shape
-        if fullmatrix and (rows == cols == 3):
-            return nhood
-        elif not fullmatrix and cols <= 3 and rows <= 3:
-            return nhood
-        if rows > 3:
-            nhood = nhood[1:-1]
-        if cols > 3:
-            nhood = nhood[:, 1:-1]
-        return self._reduce_to_3x3(nhood, fullmatrix)
-
-    def _increase_to_3x3(self, nhood):
-        # Only valid shapes at this point either have a 3 or 1
-        # If one dimension greater than 3 then reduce to 3
-        if any(s > 3 for s in nhood.shape):
-            nhood = self._reduce_to_3x3(nhood, fullmatrix=False)
+    @property
+    def radius(self):
+        """The number of cells the neighbourhood reaches out from the
+        center cell, eg. 1 for a 3x3 neighbourhood"""
+        return self.neighbourhood.shape[-1] // 2
 
-        new_col = np.zeros((3, 1))
-        new_row = np.zeros((3))
+    def _pad_to_square(self, nhood, size):
+        """Pad a 2D neighbourhood with 0s so that it is size x size
+        with the original neighbourhood in the center
 
-        if nhood.shape == (1, 3):
-            nhood = nhood[0]
-            shape = nhood.shape
-        if nhood.shape == (3,):
-            nhood = np.vstack((nhood, new_row))
-            nhood = np.vstack((new_row, nhood))
-            return nhood
-
-        if nhood.shape == (3, 1):
-            nhood = np.hstack((nhood, new_col))
-            nhood = np.hstack((new_col, nhood))
-            return nhood
-
-        if nhood.shape == (1,) or nhood.shape == (1, 1):
-            return np.zeros((3, 3))
+        Note:
+            A single cell neighbourhood becomes the empty neighbourhood
+        """
+        if nhood.shape == (1, 1):
+            return np.zeros((size, size))
+        rows, cols = nhood.shape
+        padded = np.zeros((size, size), dtype=nhood.dtype)
+        top = (size - rows) // 2
+        left = (size - cols) // 2
+        padded[top:top+rows, left:left+cols] = nhood
+        return padded
 
     def _type_neighbourhood(self, nhood):
         """Checks the type of the neighbourhood provided
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import tracemalloc
+import numpy as np
+
+# the profiling modes of CAConfig.profile
+PROFILE_MODES = (None, 'time', 'memory')
+
+# the grid methods timed as phases of a step, phase -> method name.
+# Grid1D gets its neighbours with get_neighbour_arrays
+PHASE_METHODS = [('neighbour_states', 'get_neighbour_states'),
+                 ('neighbour_states', 'get_neighbour_arrays'),
+                 ('count_neighbours', 'count_neighbours'),
+                 ('refresh_wrap', 'refresh_wrap')]
+
+# every phase of a generation. The time of a generation not spent in the
+# other phases (eg. rule table lookups and cycle detection) is 'other'
+PHASES = ['neighbour_states', 'count_neighbours', 'transition',
+          'refresh_wrap', 'timeline', 'other']
+
+
+def profile_path(timeline_path):
+    """The path of the profile report saved next to a timeline file, eg.
+    run.profile.json for run.npy"""
+    return os.path.splitext(timeline_path)[0] + '.profile.json'
+
+
+class Profiler(object):
+    """Records the wall time (and optionally the memory allocated) of each
+    phase of every generation of a run.
+
+    Grid.run creates one when ca_config.profile is set and instruments the
+    grid with it, replacing the grid's phase methods and transition
+    function with timed wrappers for the run. Nothing is wrapped when
+    profiling is off, so unprofiled runs are unaffected.
+
+    Note:
+        Profiling 'memory' traces allocations with tracemalloc, which
+        slows every allocation down, so the times of a 'memory' profile
+        are inflated. Profile 'time' for the timings.
+    """
+
+    def __init__(self, num_generations, cells, mode='time'):
+        """
+        Args:
+            num_generations (int): the generations that will be run
+            cells (int): the cells updated each generation
+            mode (str): 'time', or 'memory' to also record the peak bytes
+                allocated in each phase
+
+        Raises:
+            ValueError: if the mode is not 'time' or 'memory'
+        """
+        if mode not in PROFILE_MODES[1:]:
+            raise ValueError("Unknown profile mode '{m}', expected one of "
+                             "{ms}".format(m=mode, ms=PROFILE_MODES[1:]))
+        self.mode = mode
+        self.cells = cells
+        # seconds and peak bytes allocated in each phase of each generation
+        self.seconds = np.zeros((num_generations, len(PHASES)))
+        self.allocated = np.zeros((num_generations, len(PHASES)),
+                                  dtype=np.int64)
+        self.generations = 0
+        self._start = None
+        self._wrapped = []
+        self._tracing = False
+
+    def instrument(self, grid):
+        """Time the phases of a grid's steps, until uninstrument"""
+        for phase, name in PHASE_METHODS:
+            if hasattr(grid, name):
+                setattr(grid, name, self.wrap(phase, getattr(grid, name)))
+                self._wrapped.append((grid, name))
+        grid.transition_func = self.wrap('transition', grid.transition_func)
+        self._wrapped.append((grid, 'transition_func'))
+        self.start()
+
+    def start(self):
+        """Start tracing allocations for a 'memory' profile, called by
+        instrument"""
+        if self.mode == 'memory' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def stop(self):
+        """Stop tracing allocations, called by uninstrument"""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def uninstrument(self):
+        """Restore the methods replaced by instrument"""
+        for grid, name in self._wrapped:
+            if name == 'transition_func':
+                grid.transition_func = grid.transition_func.function
+            else:
+                # the wrapper shadows the method of the class
+                delattr(grid, name)
+        self._wrapped = []
+        self.stop()
+
+    def wrap(self, phase, function):
+        """A timed wrapper of function, adding its time to phase"""
+        column = PHASES.index(phase)
+        profiler = self
+
+        def timed(*args, **kwargs):
+            with profiler.phase(column):
+                return function(*args, **kwargs)
+        timed.function = function
+        return timed
+
+    def phase(self, phase):
+        """Context manager timing a phase, by name or index in PHASES"""
+        column = phase if isinstance(phase, int) else PHASES.index(phase)
+        return _Phase(self, column)
+
+    def start_generation(self):
+        self._start = time.perf_counter()
+
+    def end_generation(self):
+        """Finish the generation, the time not in a phase is 'other'"""
+        i = self.generations
+        total = time.perf_counter() - self._start
+        other = PHASES.index('other')
+        self.seconds[i, other] = max(0, total - self.seconds[i].sum())
+        self.generations += 1
+
+    def report(self):
+        """Summarise the phases of the generations run.
+
+        Returns:
+            dict: JSON serialisable report with the total and per phase
+                seconds, fraction of the time, mean and max seconds per
+                generation (and the peak bytes allocated in a call for a
+                'memory' profile, except in 'other'),
+                and the seconds of each phase of each generation
+        """
+        seconds = self.seconds[:self.generations]
+        allocated = self.allocated[:self.generations]
+        total = float(seconds.sum())
+        phases = {}
+        for j, phase in enumerate(PHASES):
+            column = seconds[:, j]
+            phases[phase] = {
+                'seconds': float(column.sum()),
+                'fraction': float(column.sum() / total) if total else 0.0,
+                'mean_seconds': float(column.mean()) if len(column) else 0.0,
+                'max_seconds': float(column.max()) if len(column) else 0.0}
+            if self.mode == 'memory' and phase != 'other':
+                phases[phase]['peak_allocated_bytes'] = int(
+                    allocated[:, j].max()) if len(column) else 0
+        per_generation = seconds.sum(axis=1)
+        return {'mode': self.mode,
+                'generations': self.generations,
+                'cells': self.cells,
+                'seconds': total,
+                'cells_per_second': (self.cells * self.generations / total
+                                     if total else 0.0),
+                'slowest_phase': max(phases,
+                                     key=lambda p: phases[p]['seconds']),
+                'phases': phases,
+                'per_generation': {
+                    'seconds': per_generation.tolist(),
+                    'cells_per_second': [self.cells / s if s else 0.0
+                                         for s in per_generation],
+                    'phases': {phase: seconds[:, j].tolist()
+                               for j, phase in enumerate(PHASES)}}}
+
+
+class _Phase(object):
+    """Adds the time (and peak allocation) of a with block to a phase of
+    the current generation"""
+
+    def __init__(self, profiler, column):
+        self.profiler = profiler
+        self.column = column
+
+    def __enter__(self):
+        if self.profiler.mode == 'memory':
+            tracemalloc.reset_peak()
+            self.before = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        profiler = self.profiler
+        i = min(profiler.generations, len(profiler.seconds) - 1)
+        profiler.seconds[i, self.column] += seconds
+        if profiler.mode == 'memory':
+            peak = tracemalloc.get_traced_memory()[1] - self.before
+            profiler.allocated[i, self.column] = max(
+                profiler.allocated[i, self.column], peak)
+        return False
+
+
+def format_report(report):
+    """The phases of a profile report as a text table, slowest first"""
+    lines = ['{g} generations of {c} cells in {s:.4f}s, {r:.0f} '
+             'cells/s'.format(g=report['generations'], c=report['cells'],
+                              s=report['seconds'],
+                              r=report['cells_per_second'])]
+    memory = report['mode'] == 'memory'
+    header = '{p:<18} {s:>10} {f:>7} {m:>12} {x:>12}'.format(
+        p='phase', s='seconds', f='%', m='mean/gen', x='max/gen')
+    lines.append(header + (' {a:>12}'.format(a='peak alloc')
+                           if memory else ''))
+    phases = report['phases']
+    for phase in sorted(phases, key=lambda p: -phases[p]['seconds']):
+        stats = phases[phase]
+        line = '{p:<18} {s:>10.4f} {f:>6.1f}% {m:>12.6f} {x:>12.6f}'.format(
+            p=phase, s=stats['seconds'], f=stats['fraction'] * 100,
+            m=stats['mean_seconds'], x=stats['max_seconds'])
+        if memory and 'peak_allocated_bytes' in stats:
+            line += ' {a:>8.2f} MiB'.format(
+                a=stats['peak_allocated_bytes'] / 2**20)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def save_report(report, path):
+    """Save a profile report as JSON"""
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,255 @@
+import sys
+import time
+import queue
+import logging
+from collections import namedtuple
+
+# progress of a run: the generation reached of the total, the seconds
+# since the run started, the cells updated per second and the estimated
+# seconds left (None until a generation has been run)
+ProgressEvent = namedtuple('ProgressEvent', ['generation', 'total', 'elapsed',
+                                             'cells_per_second', 'eta'])
+
+
+class RunCancelled(Exception):
+    """Raised by the 'queue' reporter to stop a run that was cancelled,
+    see set_progress_queue"""
+    pass
+
+
+class NullProgress(object):
+    """Progress reporter that reports nothing.
+
+    Grid.run creates the reporter named by ca_config.progress with the
+    number of generations and cells and calls set with the generation
+    reached. Reporters are registered by name with register_reporter.
+    """
+    name = 'none'
+
+    def __init__(self, maxval, cells=None):
+        """
+        Args:
+            maxval (int): The number of generations to be run by the CA
+            cells (int): The number of cells updated each generation
+        """
+        self.maxval = maxval
+        self.cells = cells
+        self.start = time.perf_counter()
+
+    def set(self, val):
+        """Report that the CA has reached the given generation, the run
+        is finished once val reaches maxval"""
+        pass
+
+    def event(self, val):
+        """The ProgressEvent of reaching the given generation"""
+        val = min(val, self.maxval)
+        elapsed = time.perf_counter() - self.start
+        rate = cells_per_second = eta = None
+        if val > 0 and elapsed > 0:
+            rate = val / elapsed
+            eta = (self.maxval - val) / rate
+            if self.cells is not None:
+                cells_per_second = rate * self.cells
+        return ProgressEvent(val, self.maxval, elapsed, cells_per_second, eta)
+
+
+class StderrProgress(NullProgress):
+    """Draws a text progress bar on stderr"""
+    name = 'stderr'
+    WIDTH = 40
+
+    def set(self, val):
+        val = min(val, self.maxval)
+        filled = int(val / self.maxval * self.WIDTH)
+        sys.stderr.write("\r[{bar}] {val}/{maxval}".format(
+            bar='#' * filled + '-' * (self.WIDTH - filled),
+            val=val, maxval=self.maxval))
+        if val == self.maxval:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+
+
+class LogProgress(NullProgress):
+    """Logs the generation reached to the 'capyle' logger"""
+    name = 'log'
+    logger = logging.getLogger('capyle')
+
+    def set(self, val):
+        self.logger.info("Generation %d/%d", min(val, self.maxval),
+                         self.maxval)
+
+
+class ProgressWindow(NullProgress):
+    """Tk window showing a progress bar, the default in the GUI"""
+    name = 'window'
+    WINDOW_TITLE = 'Running...'
+    MAX_WIDTH = 200
+    HEIGHT = 20
+    # seconds between redraws, each redraw blocks the run
+    MIN_INTERVAL = 0.1
+
+    def __init__(self, maxval, cells=None):
+        """Create a progress bar window
+
+        Note:
+            The window is drawn by the process running the CA, which
+            waits for each redraw. The GUI runs CAs in a worker process
+            with the queue reporter instead, drawing the progress itself.
+
+        Args:
+            maxval (int): The number of generation to be run by the CA
+            cells (int): The number of cells updated each generation
+        """
+        # only imported when the window is used so that headless runs
+        # never import tkinter
+        import tkinter as tk
+        NullProgress.__init__(self, maxval, cells)
+        self.last_draw = 0
+        self.root = tk.Tk()
+        # set title
+        self.root.wm_title(self.WINDOW_TITLE)
+        # lift to top layer
+        self.root.lift()
+        self.root.attributes('-topmost', True)
+        self.root.after_idle(self.root.attributes, '-topmost', False)
+        #disable close
+        self.root.protocol('WM_DELETE_WINDOW', self.noclose)
+
+        self.progress_canvas = tk.Canvas(self.root,
+                                         height=self.HEIGHT,
+                                         width=self.MAX_WIDTH)
+        self.bar = self.progress_canvas.create_rectangle(0, 0, 0, self.HEIGHT,
+                                                         fill="blue")
+        self.progress_canvas.pack()
+
+    def noclose(self):
+        pass
+
+    def set(self, val):
+        """Set the progress bar to the given generation number
+
+        Args:
+            val (int): The generation number (translated to a progress bar
+                length)
+        """
+        if self.root is None:
+            return
+        if val >= self.maxval:
+            self.root.destroy()
+            self.root = None
+            return
+        now = time.perf_counter()
+        if now - self.last_draw < self.MIN_INTERVAL:
+            return
+        self.last_draw = now
+        p = val/self.maxval
+        w = int(p * self.MAX_WIDTH)
+        # resize the one bar rather than drawing a new one each time
+        self.progress_canvas.coords(self.bar, 0, 0, w, self.HEIGHT)
+        self.root.update()
+
+
+class QueueProgress(NullProgress):
+    """Puts ProgressEvents on a queue for another process or thread to
+    show, so the run never waits for progress to be drawn.
+
+    The queue is set for the process with set_progress_queue, eg. by the
+    worker process the GUI runs a CA in (see runner.run_in_worker) while
+    the GUI polls the queue on its own event loop. Events are sent at most
+    every MIN_INTERVAL seconds, and dropped rather than waited for if the
+    queue is full.
+
+    A run in the same process as the GUI is cancelled through its
+    reporter: once the cancel event given to set_progress_queue is set,
+    the next report raises RunCancelled.
+    """
+    name = 'queue'
+    MIN_INTERVAL = 0.05
+    queue = None
+    cancel_event = None
+
+    def __init__(self, maxval, cells=None):
+        NullProgress.__init__(self, maxval, cells)
+        self.last_put = None
+
+    def set(self, val):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise RunCancelled()
+        if self.queue is None:
+            return
+        now = time.perf_counter()
+        if (val < self.maxval and self.last_put is not None and
+                now - self.last_put < self.MIN_INTERVAL):
+            return
+        self.last_put = now
+        try:
+            self.queue.put_nowait(self.event(val))
+        except queue.Full:
+            pass
+
+
+def set_progress_queue(progress_queue, cancel_event=None):
+    """Set the queue the 'queue' reporter puts ProgressEvents on, for runs
+    in this process
+
+    Args:
+        progress_queue: a queue.Queue or multiprocessing queue, None to
+            stop reporting
+        cancel_event (threading.Event): stops the run with RunCancelled
+            once set, None if the run cannot be cancelled
+    """
+    QueueProgress.queue = progress_queue
+    QueueProgress.cancel_event = cancel_event
+
+
+def drain_progress(progress_queue, callback):
+    """Pass every ProgressEvent waiting on a queue to callback, without
+    waiting for more
+
+    Returns:
+        ProgressEvent: the last event, None if there were none
+    """
+    last = None
+    while True:
+        try:
+            last = progress_queue.get_nowait()
+        except queue.Empty:
+            return last
+        callback(last)
+
+
+REPORTERS = {}
+
+
+def register_reporter(reporter_class):
+    """Make a progress reporter class selectable by name with
+    CAConfig.progress
+
+    Args:
+        reporter_class (class): class taking the number of generations
+            and cells, with a set method and a unique name attribute
+    """
+    REPORTERS[reporter_class.name] = reporter_class
+    return reporter_class
+
+
+def get_reporter(name, maxval, cells=None):
+    """Create the progress reporter registered under the given name
+
+    Args:
+        name (str): the name of the reporter, eg. 'window' or 'stderr'
+        maxval (int): The number of generations to be run by the CA
+        cells (int): The number of cells updated each generation
+    """
+    if name not in REPORTERS:
+        raise ValueError("Unknown progress reporter '{n}', choose from {r}"
+                         .format(n=name, r=sorted(REPORTERS)))
+    return REPORTERS[name](maxval, cells)
+
+
+register_reporter(NullProgress)
+register_reporter(StderrProgress)
+register_reporter(LogProgress)
+register_reporter(ProgressWindow)
+register_reporter(QueueProgress)
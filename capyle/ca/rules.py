@@ -0,0 +1,198 @@
+import re
+import itertools
+import numpy as np
+from capyle.ca import state_index
+
+# largest lookup table compile will build
+MAX_TABLE_SIZE = 2**24
+
+LIFE_RULE = re.compile(r'^B([0-9]*)/?S([0-9]*)$', re.IGNORECASE)
+
+
+class RuleTable(object):
+    """A transition rule that depends only on a cell's state and the
+    counts of its neighbours in some of the states (a totalistic or
+    outer-totalistic rule), compiled to a lookup table.
+
+    The table is indexed by the cell's state and its counts encoded as a
+    mixed radix number, so applying the rule to a grid is one gather.
+    Passed to Grid2D in place of a transition function, the grid counts
+    just the neighbours in count_states and indexes the table, without
+    building the neighbour states or calling back into Python per cell.
+
+    Note:
+        Counts are the sum of the neighbourhood weights of the neighbours
+        in each state, as convolution_counts, so the neighbourhood
+        weights must be whole numbers.
+
+    Example:
+        Conway's life, either from its rule string or written out:
+
+        RuleTable.from_string("B3/S23")
+        RuleTable((0, 1), {(0, (3,)): 1, (1, (2,)): 1, (1, (3,)): 1},
+                  count_states=(1,), default=0)
+    """
+
+    def __init__(self, states, rules=None, count_states=None, default=None,
+                 function=None):
+        """
+        Args:
+            states (tuple): the states of the CA
+            rules (dict): (state, counts) -> new state, counts being a
+                tuple of the number of neighbours in each of count_states
+            count_states (tuple): the states whose counts the rule depends
+                on, defaults to all the states
+            default: the new state of cells not in rules, None to keep
+                their state
+            function (function): function(state, counts) returning the
+                new state, called for every entry of the table when it is
+                compiled, in place of rules
+
+        Raises:
+            ValueError: if a state is not one of the CA's states or
+                counts are the wrong length
+        """
+        self.states = tuple(states)
+        self.count_states = (self.states if count_states is None
+                             else tuple(count_states))
+        for state in self.count_states:
+            if state not in self.states:
+                raise ValueError("Count state {s} is not one of the states "
+                                 "{ss}".format(s=state, ss=self.states))
+        self.rules = dict(rules or {})
+        for state, counts in self.rules:
+            if state not in self.states or (
+                    len(counts) != len(self.count_states)):
+                raise ValueError("Invalid rule for state {s} with counts "
+                                 "{c}".format(s=state, c=counts))
+        self.default = default
+        self.function = function
+        # the index of each count state in the states, to pick the counts
+        # out of those a transition function is passed
+        self.count_index = [self.states.index(s) for s in self.count_states]
+        self.table = None
+        self.max_count = None
+
+    @classmethod
+    def from_string(cls, rule, states=(0, 1)):
+        """A Life-like rule from its "B3/S23" string, the numbers of live
+        neighbours for a dead cell to be born and a live cell to survive.
+
+        Args:
+            rule (str): the rule string, eg. "B3/S23" for Conway's life
+            states (tuple): the states of the CA, the first dead and the
+                second alive. Cells in any other state keep their state
+
+        Raises:
+            ValueError: if the rule string is invalid
+        """
+        match = LIFE_RULE.match(rule.strip())
+        if match is None:
+            raise ValueError("Invalid rule string '{r}', expected eg. "
+                             "B3/S23".format(r=rule))
+        born = {int(n) for n in match.group(1)}
+        survive = {int(n) for n in match.group(2)}
+        dead, alive = states[0], states[1]
+
+        def life(state, counts):
+            if state == dead:
+                return alive if counts[0] in born else dead
+            if state == alive:
+                return alive if counts[0] in survive else dead
+            return state
+        return cls(states, count_states=(alive,), function=life)
+
+    @classmethod
+    def from_function(cls, states, function, count_states=None):
+        """A rule given by function(state, counts) returning the new state,
+        see __init__"""
+        return cls(states, count_states=count_states, function=function)
+
+    def compile(self, nhood_arr=None):
+        """Build the lookup table for a neighbourhood.
+
+        Args:
+            nhood_arr (numpy.ndarray): the neighbourhood weights, defaults
+                to the 3x3 Moore neighbourhood
+
+        Returns:
+            numpy.ndarray: (states, (max_count + 1) ** count states) table
+                of new states
+
+        Raises:
+            ValueError: if the weights are not whole numbers or the table
+                would be too large
+        """
+        if nhood_arr is None:
+            nhood_arr = np.ones((3, 3))
+        kernel = np.array(nhood_arr, dtype=np.float64)
+        kernel[kernel.shape[0] // 2, kernel.shape[1] // 2] = 0
+        if not (np.all(kernel == np.round(kernel)) and kernel.min() >= 0):
+            raise ValueError("Rule tables need whole number neighbourhood "
+                             "weights")
+        max_count = int(kernel.sum())
+        radix = max_count + 1
+        size = len(self.states) * radix ** len(self.count_states)
+        if size > MAX_TABLE_SIZE:
+            raise ValueError("Rule table of {n} entries is too large, limit "
+                             "count_states to the states the rule depends "
+                             "on".format(n=size))
+        table = np.empty((len(self.states), radix ** len(self.count_states)),
+                         dtype=np.asarray(self.states).dtype)
+        for i, state in enumerate(self.states):
+            for j, counts in enumerate(itertools.product(
+                    range(radix), repeat=len(self.count_states))):
+                table[i, j] = self.new_state(state, counts)
+        self.table, self.max_count = table, max_count
+        return table
+
+    def new_state(self, state, counts):
+        """The new state of a cell in state with counts neighbours in each
+        of count_states"""
+        if self.function is not None:
+            return self.function(state, counts)
+        default = state if self.default is None else self.default
+        return self.rules.get((state, tuple(counts)), default)
+
+    def apply(self, grid, counts):
+        """Apply the rule to every cell with a lookup in the table.
+
+        Note:
+            The table must be compiled for the neighbourhood the counts
+            were taken with, Grid2D compiles it for the grid's. A table
+            not yet compiled is compiled for the 3x3 Moore neighbourhood.
+
+        Args:
+            grid (numpy.ndarray): the cells' states
+            counts: the counts of each of count_states, each the shape of
+                the grid
+
+        Returns:
+            numpy.ndarray: the new states, cells not in any of the states
+                keep their state
+
+        Raises:
+            ValueError: if a count is more than the table was compiled for
+        """
+        if self.table is None:
+            self.compile()
+        code = state_index(grid, self.states)
+        for count in counts:
+            count = np.asarray(count).astype(np.intp)
+            if count.size and count.max() > self.max_count:
+                raise ValueError("Neighbour count of {c} is more than the "
+                                 "rule table was compiled for ({m}), "
+                                 "compile it for the grid's neighbourhood"
+                                 .format(c=count.max(), m=self.max_count))
+            code = code * (self.max_count + 1) + count
+        unknown = code < 0
+        new = self.table.reshape(-1)[np.where(unknown, 0, code)]
+        if unknown.any():
+            new = np.where(unknown, grid, new)
+        return new
+
+    def __call__(self, grid, neighbourstates, neighbourcounts, layers=None):
+        """Apply the rule as a Grid2D transition function, to the counts
+        of every state"""
+        counts = [neighbourcounts[i] for i in self.count_index]
+        return self.apply(grid, counts)
@@ -0,0 +1,295 @@
+import json
+import lzma
+import zlib
+import numpy as np
+
+# compressors available to DeltaTimeline, name -> (compress, decompress)
+COMPRESSORS = {None: (bytes, bytes),
+               'zlib': (zlib.compress, zlib.decompress),
+               'lzma': (lzma.compress, lzma.decompress)}
+
+
+def timeline_dtype(states):
+    """The smallest dtype that holds every state, eg. uint8 for states
+    0 to 255 and int8 for -1 to 127. Floats if any state is not a whole
+    number or the states are unknown.
+
+    Args:
+        states (tuple): the states of the CA
+
+    Returns:
+        numpy.dtype: the dtype for the timeline
+    """
+    if states is None or len(states) == 0:
+        return np.dtype(np.float64)
+    states = np.asarray(states)
+    if not np.all(states == np.round(states)):
+        return np.dtype(np.float64)
+    low, high = int(states.min()), int(states.max())
+    if low >= 0:
+        candidates = [np.uint8, np.uint16, np.uint32, np.uint64]
+    else:
+        candidates = [np.int8, np.int16, np.int32, np.int64]
+    for dtype in candidates:
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.float64)
+
+
+def new_timeline(num_frames, grid_shape, states, path=None,
+                 keyframe_interval=None, compression=None):
+    """Preallocate a timeline as one contiguous array.
+
+    Indexing the timeline gives the grid at that timestep, as with the
+    object array of grids it replaces.
+
+    Note:
+        Given a path, the timeline is a memory-mapped .npy file instead,
+        so each generation is written out to disk as it is produced and
+        runs larger than memory only keep the pages in use resident.
+        The file is created (or overwritten) at its full size up front,
+        frames not yet written read as zeros.
+
+    Args:
+        num_frames (int): the number of timesteps, including t = 0
+        grid_shape (tuple): the shape of the grid
+        states (tuple): the states of the CA, see timeline_dtype
+        path (str): the .npy file to stream the timeline to, None to
+            keep it in memory
+        keyframe_interval (int): store keyframes every this many frames
+            and only the changes in between, see DeltaTimeline. None for
+            full frames
+        compression (str): compressor of a DeltaTimeline, see COMPRESSORS
+
+    Returns:
+        numpy.ndarray: uninitialised (num_frames, rows, cols) array, a
+            numpy.memmap if path is given, or a DeltaTimeline if
+            keyframe_interval is given
+    """
+    shape = (num_frames,) + tuple(grid_shape)
+    if keyframe_interval is not None:
+        # kept in memory, see DeltaTimeline.save to write it to a file
+        return DeltaTimeline(num_frames, grid_shape, timeline_dtype(states),
+                             keyframe_interval, compression)
+    if path is not None:
+        return np.lib.format.open_memmap(path, mode='w+', shape=shape,
+                                         dtype=timeline_dtype(states))
+    return np.empty(shape, dtype=timeline_dtype(states))
+
+
+def open_timeline(path):
+    """Open a saved timeline without reading it into memory, frames are
+    read from disk (or decoded) on demand as they are indexed
+
+    Args:
+        path (str): a .npy file, eg. written by new_timeline or np.save,
+            or a .npz file written by DeltaTimeline.save
+
+    Returns:
+        numpy.memmap: read-only (num_frames, rows, cols) array, or a
+            DeltaTimeline for a .npz file
+    """
+    saved = np.load(path, mmap_mode='r')
+    if isinstance(saved, np.lib.npyio.NpzFile):
+        with saved:
+            return DeltaTimeline.from_npz(saved)
+    return saved
+
+
+def truncate_timeline(timeline, num_frames):
+    """The first num_frames frames of a timeline, without copying
+
+    Args:
+        timeline: a timeline array or DeltaTimeline
+        num_frames (int): the number of frames to keep
+    """
+    if isinstance(timeline, DeltaTimeline):
+        timeline.truncate(num_frames)
+        return timeline
+    return timeline[:num_frames]
+
+
+class DeltaTimeline(object):
+    """A timeline stored as a keyframe every keyframe_interval frames and
+    the cells that changed since the previous frame in between.
+
+    Frames are appended in order by assigning to the next index, as
+    Grid._runca does, and any frame is rebuilt by decoding its keyframe
+    and applying at most keyframe_interval - 1 deltas. The last frame
+    rebuilt is kept, so stepping through the timeline in order only
+    applies one delta per frame.
+
+    Note:
+        Where only a front of cells changes each generation (eg. a fire)
+        the deltas are a small fraction of a frame, and optionally
+        compressed with zlib or lzma.
+    """
+
+    def __init__(self, num_frames, grid_shape, dtype, keyframe_interval=32,
+                 compression=None):
+        """
+        Args:
+            num_frames (int): the number of timesteps, including t = 0
+            grid_shape (tuple): the shape of the grid
+            dtype (numpy.dtype): the dtype of the frames
+            keyframe_interval (int): the frames between keyframes
+            compression (str): None, 'zlib' or 'lzma'
+
+        Raises:
+            ValueError: if keyframe_interval < 1 or the compression is
+                unknown
+        """
+        if keyframe_interval < 1:
+            raise ValueError("Keyframe interval must be at least 1, "
+                             "got {k}".format(k=keyframe_interval))
+        if compression not in COMPRESSORS:
+            raise ValueError("Unknown compression '{c}', expected one of "
+                             "{cs}".format(c=compression,
+                                           cs=list(COMPRESSORS)))
+        self.num_frames = num_frames
+        self.grid_shape = tuple(grid_shape)
+        self.dtype = np.dtype(dtype)
+        self.keyframe_interval = keyframe_interval
+        self.compression = compression
+        size = int(np.prod(self.grid_shape))
+        self.index_dtype = np.dtype(np.uint32 if size < 2**32 else np.int64)
+        # the encoded keyframe or delta of each frame appended so far
+        self.records = []
+        # the last frame appended, to take the next delta against
+        self._last = None
+        # (index, frame) of the last frame rebuilt
+        self._cached = None
+
+    @property
+    def shape(self):
+        return (self.num_frames,) + self.grid_shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def nbytes(self):
+        """The bytes used by the encoded frames"""
+        return sum(len(record) for record in self.records)
+
+    def __len__(self):
+        return self.num_frames
+
+    def __setitem__(self, i, frame):
+        """Append frame i, frames must be set in order"""
+        i = self._index(i)
+        if i != len(self.records):
+            raise IndexError("Frames must be set in order, expected frame "
+                             "{n} got {i}".format(n=len(self.records), i=i))
+        frame = np.asarray(frame, dtype=self.dtype).reshape(self.grid_shape)
+        compress = COMPRESSORS[self.compression][0]
+        if i % self.keyframe_interval == 0:
+            record = np.ascontiguousarray(frame).tobytes()
+        else:
+            changed = np.flatnonzero(frame != self._last)
+            record = (changed.astype(self.index_dtype).tobytes() +
+                      frame.reshape(-1)[changed].tobytes())
+        self.records.append(compress(record))
+        self._last = frame.copy()
+
+    def __getitem__(self, i):
+        """The frame at timestep i, or a stacked array of frames for a
+        slice"""
+        if isinstance(i, slice):
+            return np.stack([self[j] for j in
+                             range(*i.indices(self.num_frames))])
+        i = self._index(i)
+        if i >= len(self.records):
+            raise IndexError("Frame {i} has not been set".format(i=i))
+        keyframe = i - i % self.keyframe_interval
+        # read once, another thread may rebuild a frame at the same time
+        cached = self._cached
+        if cached is not None and keyframe <= cached[0] <= i:
+            start, frame = cached[0], cached[1].copy()
+        else:
+            start, frame = keyframe, self._decode_keyframe(keyframe)
+        flat = frame.reshape(-1)
+        for j in range(start + 1, i + 1):
+            changed, values = self._decode_delta(j)
+            flat[changed] = values
+        self._cached = (i, frame.copy())
+        return frame
+
+    def __iter__(self):
+        for i in range(len(self.records)):
+            yield self[i]
+
+    def __array__(self, dtype=None, copy=None):
+        frames = np.stack(list(self))
+        return frames if dtype is None else frames.astype(dtype)
+
+    def truncate(self, num_frames):
+        """Drop the frames from num_frames on"""
+        del self.records[num_frames:]
+        self.num_frames = num_frames
+        if self._cached is not None and self._cached[0] >= num_frames:
+            self._cached = None
+
+    def _index(self, i):
+        i = int(i)
+        if i < 0:
+            i += self.num_frames
+        if not 0 <= i < self.num_frames:
+            raise IndexError("Frame {i} out of range for {n} frames".format(
+                i=i, n=self.num_frames))
+        return i
+
+    def _decode(self, i):
+        return COMPRESSORS[self.compression][1](self.records[i])
+
+    def _decode_keyframe(self, i):
+        return np.frombuffer(self._decode(i), dtype=self.dtype).reshape(
+            self.grid_shape).copy()
+
+    def _decode_delta(self, i):
+        record = self._decode(i)
+        count = len(record) // (self.index_dtype.itemsize +
+                                self.dtype.itemsize)
+        changed = np.frombuffer(record, dtype=self.index_dtype, count=count)
+        values = np.frombuffer(record, dtype=self.dtype,
+                               offset=count * self.index_dtype.itemsize)
+        return changed, values
+
+    def save(self, path):
+        """Save the encoded frames to a .npz file, see open_timeline"""
+        meta = {'num_frames': self.num_frames,
+                'grid_shape': self.grid_shape,
+                'dtype': self.dtype.str,
+                'keyframe_interval': self.keyframe_interval,
+                'compression': self.compression}
+        lengths = [len(record) for record in self.records]
+        np.savez(path, meta=np.array(json.dumps(meta)),
+                 lengths=np.array(lengths, dtype=np.int64),
+                 data=np.frombuffer(b''.join(self.records), dtype=np.uint8))
+
+    @classmethod
+    def from_npz(cls, saved):
+        """Rebuild a DeltaTimeline from the arrays written by save"""
+        meta = json.loads(str(saved['meta']))
+        timeline = cls(meta['num_frames'], meta['grid_shape'], meta['dtype'],
+                       meta['keyframe_interval'], meta['compression'])
+        data = saved['data'].tobytes()
+        offsets = np.concatenate(([0], np.cumsum(saved['lengths'])))
+        timeline.records = [data[start:end] for start, end
+                            in zip(offsets[:-1], offsets[1:])]
+        if timeline.records:
+            timeline._last = timeline[len(timeline.records) - 1]
+        return timeline
+
+
+def as_frames(timeline):
+    """Return a timeline as one (num_frames, rows, cols) array, without
+    copying timelines that already are one
+
+    Args:
+        timeline: a timeline array, or a list or object array of grids
+    """
+    if isinstance(timeline, np.ndarray) and timeline.dtype != object:
+        return timeline
+    return np.stack(list(timeline))
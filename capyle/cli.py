@@ -0,0 +1,338 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import numpy as np
+from capyle.utils import gens_to_dims, get_metadata
+from capyle.ca import (CAConfig, COMPRESSORS, PROFILE_MODES, REPORTERS, DeltaTimeline,
+                       as_frames, format_report, profile_path, save_report)
+from capyle.runner import run_file
+from capyle.ensemble import run_ensemble
+from capyle.sweep import (MODEL_OPTIONS, ResultsStore, grid_space, run_sweep,
+                          sample_space, write_table)
+from capyle.benchmark import (BENCHMARKS, compare, format_result, load_results,
+                              run_benchmarks, save_results)
+
+
+def add_model_options(parser):
+    """Add the forest fire model options, shared by the GUI (main.py) and
+    the headless CLI, to an argparse parser"""
+    parser.add_argument("-w", "--wind-direction", dest="wind_dir", action="store", type=str,
+                        required=False, help="Specify direction of prevailing wind from [N, E, S, W] etc.")
+    parser.add_argument("-d", "--drop-water-coords", dest="water_drop", action="store", nargs='+', type=int,
+                        required=False, help="Whitespace separated coords for where water should be dropped e.g. --drop-water-coords 4 6")
+    parser.add_argument("-t", "--drop-water-time", dest="water_time", action="store", type=int,
+                        required=False, help="Time interval for the water to be dropped. Each time drop is 4 hours.")
+    parser.add_argument("-ws", "--wind-speed", dest="wind_speed", action="store", type=int,
+                        required=False, help="Wind speed measurements are km/h.")
+    parser.add_argument("-e", "--forest-extension", dest="f_ext", action="store", type=int,
+                        required=False, help="Choice of pre-chosen forest extensions.")
+    parser.add_argument("-i", "--start-incinerator", dest="incin", action="store_true",
+                        required=False, help="Specify whether fire starts at incinerator.")
+    parser.add_argument("-p", "--start-power-plant", dest="pp", action="store_true",
+                        required=False, help="Specify whether fire starts at power plant.")
+
+
+def parse_args(argv=None):
+    """Parse the arguments of the headless CLI"""
+    parser = argparse.ArgumentParser(prog="capyle", description=(
+        "Run CA descriptions without the GUI."))
+    commands = parser.add_subparsers(dest="command", required=True)
+    runparser = commands.add_parser("run", help="Run a CA description headless.")
+    add_run_options(runparser)
+    runparser.add_argument("-o", "--output", dest="output", type=str,
+                           help="Stream the timeline to this .npy file as it runs.")
+    runparser.add_argument("-k", "--keyframes", dest="keyframes", type=int,
+                           help=("Save the timeline to a .npz file as a keyframe every K "
+                                 "generations and the changed cells in between."))
+    runparser.add_argument("-c", "--compression", dest="compression",
+                           choices=[name for name in COMPRESSORS if name is not None],
+                           help="Compress the keyframes and changes (with -k).")
+    runparser.add_argument("-s", "--summary", dest="summary", type=str,
+                           help="Save summary statistics to this JSON file.")
+    runparser.add_argument("--profile", dest="profile", choices=PROFILE_MODES[1:],
+                           help=("Report the time (and with memory, the allocations) of each phase of "
+                                 "every generation, saved next to the -o output as .profile.json."))
+    ensembleparser = commands.add_parser(
+        "ensemble", help="Run many replicas of a stochastic CA description.")
+    add_run_options(ensembleparser)
+    ensembleparser.add_argument("-n", "--replicas", dest="replicas", type=int, required=True,
+                                help="Number of replicas to run.")
+    ensembleparser.add_argument("--seed", dest="seed", type=int,
+                                help="Seed the replica seeds are made from, for a reproducible ensemble.")
+    ensembleparser.add_argument("-j", "--jobs", dest="jobs", type=int,
+                                help="Number of worker processes (default: number of CPUs).")
+    ensembleparser.add_argument("--ignition-state", dest="ignition_state", type=int, default=6,
+                                help="State of a burning cell (default 6, FIRE in ff_2d).")
+    ensembleparser.add_argument("--target-state", dest="target_state", type=int, default=5,
+                                help="Report when cells starting in this state burn (default 5, TOWN in ff_2d).")
+    ensembleparser.add_argument("-o", "--output", dest="output", type=str,
+                                help="Save the aggregated arrays to this .npz file.")
+    ensembleparser.add_argument("-s", "--summary", dest="summary", type=str,
+                                help="Save summary statistics to this JSON file.")
+    sweepparser = commands.add_parser(
+        "sweep", help="Run a CA description for every combination of model options.")
+    add_run_options(sweepparser)
+    sweepparser.add_argument("--param", dest="params", action="append", type=parse_param,
+                             required=True, metavar="NAME=V1,V2,...",
+                             help=("Values of a model option to sweep, e.g. wind_dir=N,E,S,W "
+                                   "or water_drop=40:22,10:10. Choose from " + ", ".join(MODEL_OPTIONS) + "."))
+    sweepparser.add_argument("--samples", dest="samples", type=int,
+                             help="Run this many randomly sampled configurations instead of every combination.")
+    sweepparser.add_argument("--seed", dest="seed", type=int,
+                             help="Seed for the sampling and for every run of the description.")
+    sweepparser.add_argument("-j", "--jobs", dest="jobs", type=int,
+                             help="Number of worker processes (default: number of CPUs).")
+    sweepparser.add_argument("--store", dest="store", type=str,
+                             help="JSON lines file of finished runs, reused to resume and cache the sweep.")
+    sweepparser.add_argument("--ignition-state", dest="ignition_state", type=int, default=6,
+                             help="State of a burning cell (default 6, FIRE in ff_2d).")
+    sweepparser.add_argument("--target-state", dest="target_state", type=int, default=5,
+                             help="Report when cells starting in this state burn (default 5, TOWN in ff_2d).")
+    sweepparser.add_argument("-o", "--output", dest="output", type=str,
+                             help="Save the table of metrics per configuration to this CSV file.")
+    benchparser = commands.add_parser(
+        "bench", help="Benchmark grid stepping, neighbour counting and the example descriptions.")
+    benchparser.add_argument("--only", dest="benchmarks", action="append", choices=list(BENCHMARKS),
+                             metavar="BENCHMARK",
+                             help="Run just this benchmark, may be repeated. Choose from " + ", ".join(BENCHMARKS) + ".")
+    benchparser.add_argument("--sizes", dest="sizes", type=int, nargs="+", default=[200],
+                             help="Rows and columns of the 2D grids (default 200).")
+    benchparser.add_argument("--states", dest="states", type=int, nargs="+", default=[2],
+                             help="Numbers of states of the 2D grids (default 2).")
+    benchparser.add_argument("-g", "--generations", dest="generations", type=int, nargs="+", default=[20],
+                             help="Generations stepped or run (default 20).")
+    benchparser.add_argument("-r", "--repeat", dest="repeat", type=int, default=3,
+                             help="Times each benchmark is timed, the fastest is kept (default 3).")
+    benchparser.add_argument("--baseline", dest="baseline", type=str,
+                             help="Compare against the results in this JSON file, failing on a regression.")
+    benchparser.add_argument("--tolerance", dest="tolerance", type=float, default=0.25,
+                             help="Fraction a result may be worse than the baseline by (default 0.25).")
+    benchparser.add_argument("-o", "--output", dest="output", type=str,
+                             help="Save the results to this JSON file, to use as a baseline.")
+    return parser.parse_args(argv)
+
+
+def parse_value(value):
+    """Parse a swept value: ints, True/False/None, coords as row:col,
+    otherwise the string"""
+    if value in ("True", "False", "None"):
+        return {"True": True, "False": False, "None": None}[value]
+    if ":" in value:
+        return [int(v) for v in value.split(":")]
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def parse_param(param):
+    """Parse NAME=V1,V2,... into (name, [values])"""
+    name, sep, values = param.partition("=")
+    if not sep or name not in MODEL_OPTIONS:
+        raise argparse.ArgumentTypeError(
+            "expected NAME=V1,V2,... with NAME one of " + ", ".join(MODEL_OPTIONS))
+    return name, [parse_value(v) for v in values.split(",")]
+
+
+def add_run_options(parser):
+    """Add the options shared by the commands that run a description"""
+    parser.add_argument("path", type=str, help="Path to the CA description.")
+    add_model_options(parser)
+    parser.add_argument("-g", "--generations", dest="generations", type=int,
+                        help="Override the number of generations to run.")
+    parser.add_argument("-b", "--backend", dest="backend", type=str,
+                        help="Compute backend used by 2D grids, e.g. numpy, convolve.")
+    parser.add_argument("--stop-when-steady", dest="stop_on_steady", action="store_true",
+                        help="Stop a run once a step changes nothing.")
+    parser.add_argument("--cycle-window", dest="cycle_window", type=int,
+                        help="Stop a run once the grid repeats a state from at most this many generations before.")
+    parser.add_argument("--pad-timeline", dest="pad_timeline", action="store_true",
+                        help="Repeat the final steady state or cycle up to the full generations when stopping early.")
+    parser.add_argument("--progress", dest="progress", default="stderr",
+                        choices=sorted(name for name in REPORTERS if name not in ("window", "queue")),
+                        help="How progress is reported (default stderr).")
+
+
+def summarise(ca_config, timeline):
+    """Summary statistics of a run: the number of cells in each state at
+    every timestep.
+
+    Args:
+        ca_config (CAConfig): the config the CA was run with
+        timeline (numpy.ndarray): the grid state for each timestep
+
+    Returns:
+        dict: JSON serialisable summary
+    """
+    states = np.asarray(ca_config.states).tolist()
+    counts = [[int(np.count_nonzero(frame == state)) for state in states]
+              for frame in timeline]
+    return {"title": ca_config.title,
+            "generations": len(timeline) - 1,
+            "grid_dims": list(np.shape(timeline[0])),
+            "states": states,
+            "state_counts": counts,
+            "final_state_counts": dict(zip(map(str, states), counts[-1]))}
+
+
+def config_overrides(options):
+    """The config attributes set from the command line, these take
+    precedence over the values set by the description"""
+    overrides = {"progress": options.progress}
+    if options.generations is not None:
+        overrides["num_generations"] = options.generations
+        if get_metadata(options.path)[1] == 1:
+            overrides["grid_dims"] = gens_to_dims(options.generations)
+    if options.backend is not None:
+        overrides["backend"] = options.backend
+    if options.stop_on_steady:
+        overrides["stop_on_steady"] = True
+    if options.cycle_window is not None:
+        overrides["cycle_window"] = options.cycle_window
+    if options.pad_timeline:
+        overrides["pad_timeline"] = True
+    return overrides
+
+
+def run_headless(options):
+    """Pre-run and run a CA description without the GUI, saving the
+    timeline and/or summary given in options.
+
+    Note:
+        The timeline is streamed to the output file generation by
+        generation rather than held in memory, unless the description
+        builds its timeline itself. With keyframes the timeline is kept
+        as a DeltaTimeline and saved to a .npz file when the run ends.
+        A profile report is written to stderr, and saved next to the
+        output file
+
+    Returns:
+        int: the exit status, 0 on success
+    """
+    overrides = config_overrides(options)
+    if options.keyframes is not None:
+        overrides["keyframe_interval"] = options.keyframes
+        overrides["timeline_compression"] = options.compression
+    elif options.output is not None:
+        overrides["timeline_file"] = options.output
+    if options.profile is not None:
+        overrides["profile"] = options.profile
+    ca_config, timeline = run_file(options.path, options, overrides)
+    if timeline is None:
+        return 1
+    report = getattr(ca_config, "profile_report", None)
+    if options.profile is not None:
+        if report is None:
+            print("[WARNING] The description did not run a Grid, no profile was recorded")
+        else:
+            sys.stderr.write(format_report(report) + "\n")
+            if options.output is not None:
+                save_report(report, profile_path(options.output))
+    if isinstance(timeline, DeltaTimeline):
+        if options.output is not None:
+            timeline.save(options.output)
+    elif options.output is not None and not isinstance(timeline, np.memmap):
+        np.save(options.output, as_frames(timeline))
+    summary = summarise(ca_config, timeline)
+    if options.summary is not None:
+        with open(options.summary, 'w') as f:
+            json.dump(summary, f)
+    elif options.output is None:
+        print(json.dumps(summary["final_state_counts"]))
+    return 0
+
+
+def run_ensemble_headless(options):
+    """Run an ensemble of a CA description, saving the aggregated arrays
+    and/or summary given in options.
+
+    Returns:
+        int: the exit status, 0 on success
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ca_config = CAConfig(options.path)
+        ca_config.path = os.path.join(tmpdir, 'config.pkl')
+        overrides = config_overrides(options)
+        # progress is reported per replica rather than per generation
+        progress = overrides.pop("progress")
+        result = run_ensemble(ca_config, options.replicas,
+                              options.ignition_state, options.target_state,
+                              options=options, overrides=overrides,
+                              seed=options.seed, jobs=options.jobs,
+                              progress=progress)
+    if result is None:
+        return 1
+    if options.output is not None:
+        result.save(options.output)
+    summary = result.summary()
+    if options.summary is not None:
+        with open(options.summary, 'w') as f:
+            json.dump(summary, f)
+    elif options.output is None:
+        print(json.dumps(summary))
+    return 0
+
+
+def run_sweep_headless(options):
+    """Run a parameter sweep of a CA description, saving the table of
+    metrics given in options.
+
+    Returns:
+        int: the exit status, 0 on success
+    """
+    space = dict(options.params)
+    if options.samples is not None:
+        configurations = sample_space(space, options.samples, options.seed)
+    else:
+        configurations = grid_space(space)
+    overrides = config_overrides(options)
+    progress = overrides.pop("progress")
+    if options.seed is not None:
+        overrides["seed"] = options.seed
+    rows = run_sweep(options.path, configurations, options.ignition_state,
+                     options.target_state, base_options=options,
+                     overrides=overrides, store=ResultsStore(options.store),
+                     jobs=options.jobs, progress=progress)
+    if options.output is not None:
+        write_table(rows, options.output)
+    else:
+        for row in rows:
+            print(json.dumps(row))
+    return 0
+
+
+def run_benchmarks_headless(options):
+    """Run the benchmarks, saving the results and comparing them with the
+    baseline given in options.
+
+    Returns:
+        int: the exit status, 0 on success and 1 if any benchmark regressed
+    """
+    results = run_benchmarks(options.benchmarks or None, options.sizes,
+                             options.states, options.generations,
+                             options.repeat, progress=lambda key, result:
+                             print(format_result(key, result)))
+    if options.output is not None:
+        save_results(results, options.output)
+    if options.baseline is None:
+        return 0
+    regressions = compare(results, load_results(options.baseline),
+                          options.tolerance)
+    for key, metric, before, after in regressions:
+        print("[WARNING] {k} {m} regressed from {b:.6g} to {a:.6g}".format(
+            k=key, m=metric, b=before, a=after))
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    if options.command == "run":
+        sys.exit(run_headless(options))
+    elif options.command == "ensemble":
+        sys.exit(run_ensemble_headless(options))
+    elif options.command == "sweep":
+        sys.exit(run_sweep_headless(options))
+    elif options.command == "bench":
+        sys.exit(run_benchmarks_headless(options))
@@ -4,16 +4,18 @@ import tkinter.font as tkFont
 import numpy as np
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from capyle.utils import (set_icon, get_filename_dialog, get_logo,
-                          prerun_ca, run_ca, extract_states)
-from capyle.ca import CAConfig
+                          prerun_ca, run_ca_async, extract_states)
+from capyle.ca import CAConfig, open_timeline
 from capyle.guicomponents import (_ConfigFrame, _CAGraph, _ScreenshotUI,
-                                  _CreateCA, _AboutWindow)
+                                  _CreateCA, _AboutWindow, _ProgressWindow)
 from capyle import _PlaybackControls
 
 class Display(object):
     WINDOW_TITLE = "CAPyLE"
     ROOT_PATH = sys.path[0]
     CA_PATH = ROOT_PATH + "/ca_descriptions/"
+    # milliseconds between checks on a run in the background
+    POLL_DELAY = 100
 
     def __init__(self, options):
         """
@@ -21,6 +23,10 @@ class Display(object):
         This is the main GUI and can be run simply by invoking this method
         """
         self.ca_graph = None
+        self.run_handle = None
+        self.progress_window = None
+        # the frames of a run still going are shown
+        self.partial = False
         self.ca_filepath = options.path
         self.options = options
         self.root = tk.Tk()
@@ -41,6 +47,8 @@ class Display(object):
                                            master=self.rcframe)
         self.ca_canvas.get_tk_widget().pack()
         self.root.mainloop()
+        if self.run_handle is not None:
+            self.run_handle.close()
 
     def add_menubar(self):
         """Function to add a menubar to the root window"""
@@ -133,7 +141,8 @@ class Display(object):
             if self.ca_graph is not None:
                 self.ca_graph.clear()
             self.ca_config = CAConfig(self.ca_filepath)
-            self.ca_config = prerun_ca(self.ca_config, self.options)
+            self.ca_config = prerun_ca(self.ca_config, self.options,
+                                       worker=self.options.worker)
             if self.ca_config is None:
                 return
             self.root.wm_title(
@@ -145,30 +154,109 @@ class Display(object):
 
     def run_ca(self):
         """
-        Run the loaded CA passing in the config from GUI.
-        Running the CA with run_ca returns the new CAConfig object
-        and the Timeline. Timeline loaded by calling self.load_timeline
+        Start running the loaded CA in the background passing in the config
+        from GUI, leaving the GUI responsive while it runs.
+        The run is polled by poll_run, which shows its progress and loads
+        the frames computed so far, so they can be played while the later
+        ones are still running.
         Note:
-            The config may overwritten in the CA description
+            The config may overwritten in the CA description.
+            The run is on a thread of the GUI process, or in a worker
+            process with the -x option, and can be cancelled from the
+            _ProgressWindow.
         """
+        if self.run_handle is not None and not self.run_handle.done():
+            return
         self.ca_config, valid = self.config_ui.get_config(self.ca_config,
                                                           validate=True)
         if valid:
-            self.ca_config, timeline = run_ca(self.ca_config, self.options)
-            if self.ca_config is None or timeline is None:
+            if self.run_handle is not None:
+                self.run_handle.close()
+            # the frames of this run are loaded as a new timeline
+            self.partial = False
+            self.ca_config.timeline_file = self.options.timeline_file
+            self.run_handle = run_ca_async(self.ca_config, self.options,
+                                           worker=self.options.worker)
+            self.progress_window = _ProgressWindow(
+                self.root, cancel=self.run_handle.cancel)
+            self.btn_run.config(state=tk.DISABLED)
+            self.root.after(self.POLL_DELAY, self.poll_run)
+
+    def poll_run(self):
+        """
+        Check on the run started by run_ca, showing its progress and the
+        frames computed since the last check, until it finishes
+        """
+        handle = self.run_handle
+        event = handle.poll()
+        if event is not None:
+            self.progress_window.update_progress(event)
+        if handle.done():
+            self.finish_run()
+            return
+        frames = handle.frames()
+        if frames is not None and len(frames) > 1:
+            self.show_frames(frames)
+        self.root.after(self.POLL_DELAY, self.poll_run)
+
+    def show_frames(self, frames):
+        """
+        Show the frames computed so far of a run still going, loading them
+        the first time and then extending the playable frames without
+        changing the play state
+        Args:
+            frames (np.ndarray): The grid state for each timestep so far
+        """
+        if not self.partial:
+            self.load_timeline(frames)
+            self.partial = True
+            self.playback_controls.growing = True
+        else:
+            self.ca_graph.set_timeline(frames, extend=True)
+            self.playback_controls.extend(len(frames) - 1)
+
+    def finish_run(self):
+        """
+        Load the results of the run started by run_ca once it has finished.
+        Note:
+            A cancelled run keeps the frames computed before it was
+            cancelled.
+        """
+        handle = self.run_handle
+        self.progress_window.destroy()
+        self.progress_window = None
+        self.btn_run.config(state=tk.NORMAL)
+        self.playback_controls.growing = False
+        partial, self.partial = self.partial, False
+        ca_config, timeline = handle.result()
+        if timeline is None:
+            timeline = handle.frames() if handle.cancelled() else None
+            if timeline is None or len(timeline) < 1:
                 return
-            if self.ca_config.states is None:
-                self.ca_config.states = extract_states(timeline)
+        else:
+            self.ca_config = ca_config
+        if self.ca_config.states is None:
+            self.ca_config.states = extract_states(timeline)
+        if partial:
+            self.ca_graph.set_timeline(timeline)
+            self.playback_controls.extend(len(timeline) - 1)
+        else:
             self.load_timeline(timeline)
-            self.config_ui.update(self.ca_config, self.ca_graph)
+        self.config_ui.update(self.ca_config, self.ca_graph)
 
     def load_timeline(self, timeline):
         """
         Load a timeline into the GUI and display on the graph also enables playback and 
         screenshot UI controls.
+        Note:
+            A timeline given as the path to a .npy file is memory-mapped,
+            frames are only read from disk when they are displayed
         Args:
-            timeline (np.ndarray): The grid state for each timestep
+            timeline (np.ndarray or str): The grid state for each timestep,
+                or the .npy/.npz file it was saved to (see open_timeline)
         """
+        if isinstance(timeline, str):
+            timeline = open_timeline(timeline)
         self.ca_graph = _CAGraph(timeline, self.ca_config.states,
                                  sequence=True)
         if self.ca_canvas is not None:
@@ -0,0 +1,213 @@
+import os
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from capyle.ca import as_frames, get_reporter
+from capyle.runner import prerun, run
+
+# set in each worker process by _init_worker
+_WORKER = {}
+
+
+def replica_seeds(seed, num_replicas):
+    """Independent seeds for each replica, spawned from one seed so that
+    the whole ensemble can be reproduced
+
+    Args:
+        seed (int): the ensemble seed, None for a random ensemble
+        num_replicas (int): the number of seeds to make
+
+    Returns:
+        list: one int seed per replica
+    """
+    children = np.random.SeedSequence(seed).spawn(num_replicas)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def replica_summary(timeline, ignition_state, target_state=None):
+    """Reduce the timeline of one replica to what the ensemble keeps.
+
+    Args:
+        timeline (numpy.ndarray): the grid state for each timestep
+        ignition_state (int): the state of a burning cell
+        target_state (int): cells starting in this state are targets
+            (eg. the town), None to not track targets
+
+    Returns:
+        numpy.ndarray: the first timestep each cell was burning, -1 if
+            it never burnt
+        int: the first timestep any target cell was burning, -1 if no
+            target was hit
+    """
+    burning = as_frames(timeline) == ignition_state
+    ignition_time = np.where(burning.any(axis=0), burning.argmax(axis=0), -1)
+    hit_time = -1
+    if target_state is not None:
+        hits = burning[:, np.asarray(timeline[0]) == target_state].any(axis=1)
+        if hits.any():
+            hit_time = int(hits.argmax())
+    return ignition_time.astype(np.int32), hit_time
+
+
+class EnsembleResult(object):
+    """Statistics aggregated over the replicas of an ensemble, without
+    keeping their timelines"""
+
+    def __init__(self):
+        self.num_replicas = 0
+        self.seeds = []
+        # replicas in which each cell burnt
+        self.burn_counts = None
+        # [t, i, j] replicas in which cell i, j first burnt at timestep t
+        self.ignition_time_counts = None
+        # first timestep a target was hit in each replica, -1 if not hit
+        self.target_hit_times = []
+
+    def add(self, seed, ignition_time, hit_time, num_frames):
+        """Add the summary of one replica (see replica_summary)"""
+        if self.burn_counts is None:
+            self.burn_counts = np.zeros(ignition_time.shape, dtype=np.int64)
+            self.ignition_time_counts = np.zeros(
+                (num_frames,) + ignition_time.shape, dtype=np.int32)
+        elif num_frames > len(self.ignition_time_counts):
+            # replicas that stopped early have shorter timelines
+            extra = num_frames - len(self.ignition_time_counts)
+            self.ignition_time_counts = np.concatenate((
+                self.ignition_time_counts,
+                np.zeros((extra,) + ignition_time.shape, dtype=np.int32)))
+        burnt = ignition_time >= 0
+        rows, cols = np.nonzero(burnt)
+        self.burn_counts += burnt
+        self.ignition_time_counts[ignition_time[burnt], rows, cols] += 1
+        self.num_replicas += 1
+        self.seeds.append(seed)
+        self.target_hit_times.append(hit_time)
+
+    @property
+    def burn_probability(self):
+        """Fraction of replicas in which each cell burnt"""
+        return self.burn_counts / self.num_replicas
+
+    @property
+    def mean_ignition_time(self):
+        """Mean first timestep each cell burnt, over the replicas in which
+        it burnt (NaN if it never burnt)"""
+        timesteps = np.arange(len(self.ignition_time_counts))
+        total = np.tensordot(timesteps, self.ignition_time_counts, axes=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return total / self.burn_counts
+
+    @property
+    def target_hit_probability(self):
+        """Fraction of replicas in which a target cell burnt"""
+        return float(np.mean(np.asarray(self.target_hit_times) >= 0))
+
+    def target_hit_time_counts(self):
+        """Number of replicas in which a target was first hit at each
+        timestep"""
+        times = np.asarray(self.target_hit_times)
+        return np.bincount(times[times >= 0],
+                           minlength=len(self.ignition_time_counts))
+
+    def summary(self):
+        """JSON serialisable summary of the ensemble"""
+        hits = np.asarray(self.target_hit_times)
+        return {"replicas": self.num_replicas,
+                "target_hit_probability": self.target_hit_probability,
+                "mean_target_hit_time": (float(hits[hits >= 0].mean())
+                                         if (hits >= 0).any() else None),
+                "max_burn_probability": float(self.burn_probability.max()),
+                "mean_cells_burnt": float(self.burn_counts.sum() /
+                                          self.num_replicas)}
+
+    def save(self, path):
+        """Save the aggregated arrays to a .npz file"""
+        np.savez_compressed(
+            path, seeds=np.asarray(self.seeds, dtype=np.uint32),
+            burn_counts=self.burn_counts,
+            burn_probability=self.burn_probability,
+            ignition_time_counts=self.ignition_time_counts,
+            mean_ignition_time=self.mean_ignition_time,
+            target_hit_times=np.asarray(self.target_hit_times))
+
+
+def _init_worker(ca_config, options, overrides, ignition_state, target_state):
+    """Keep the ensemble settings in the worker, so that only the seed is
+    sent for each replica"""
+    _WORKER.update(ca_config=ca_config, options=options, overrides=overrides,
+                   ignition_state=ignition_state, target_state=target_state)
+
+
+def _run_replica(seed):
+    """Run one replica with the given seed in this process, returning its
+    summary"""
+    overrides = dict(_WORKER['overrides'], progress='none')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ca_config = _WORKER['ca_config']
+        ca_config.path = os.path.join(tmpdir, 'config.pkl')
+        ca_config.seed = seed
+        ca_config, timeline = run(ca_config, _WORKER['options'], overrides)
+    if timeline is None:
+        raise RuntimeError("Replica with seed {s} failed".format(s=seed))
+    ignition_time, hit_time = replica_summary(
+        timeline, _WORKER['ignition_state'], _WORKER['target_state'])
+    return seed, ignition_time, hit_time, len(timeline)
+
+
+def run_ensemble(ca_config, num_replicas, ignition_state, target_state=None,
+                 options=None, overrides=None, seed=None, jobs=None,
+                 progress='none'):
+    """Run replicas of a stochastic CA description with different seeds
+    across a pool of worker processes.
+
+    Note:
+        Descriptions take their seed from ca_config.seed, which is set to
+        a different seed in each replica.
+
+    Args:
+        ca_config (CAConfig): the config of the description
+        num_replicas (int): the number of replicas to run
+        ignition_state (int): the state of a burning cell
+        target_state (int): track when cells starting in this state burn
+        options (Namespace): command line options for the description
+        overrides (dict): config attributes overriding the description
+        seed (int): seed the replica seeds are made from
+        jobs (int): the number of worker processes, defaults to the
+            number of CPUs. 1 runs every replica in this process
+        progress (str): reporter for the replicas completed
+
+    Returns:
+        EnsembleResult: the aggregated statistics, None if the
+            description failed to pre-run
+    """
+    ca_config = prerun(ca_config, options)
+    if ca_config is None:
+        return None
+    settings = (ca_config, options, overrides or {}, ignition_state,
+                target_state)
+    seeds = replica_seeds(seed, num_replicas)
+    result = EnsembleResult()
+    reporter = get_reporter(progress, num_replicas)
+    if jobs == 1:
+        _init_worker(*settings)
+        summaries = map(_run_replica, seeds)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=jobs, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=settings)
+        workers = jobs or os.cpu_count() or 1
+        # a few chunks per worker balances the load without sending every
+        # seed on its own
+        summaries = executor.map(
+            _run_replica, seeds,
+            chunksize=max(1, num_replicas // (workers * 4)))
+    try:
+        for i, summary in enumerate(summaries):
+            result.add(*summary)
+            reporter.set(i + 1)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return result
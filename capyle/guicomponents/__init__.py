@@ -2,6 +2,7 @@ from separator import _Separator
 import gui_utils
 from configcomponent import _ConfigUIComponent
 from generationsui import _GenerationsUI
+from framecache import _FrameCache
 from cagraph import _CAGraph
 from initialgridwindow import _EditInitialGridWindow
 from initialgridui import _InitialGridUI
@@ -14,3 +15,4 @@ from playbackui import _PlaybackUI
 from screenshotui import _ScreenshotUI
 from newcawindow import _CreateCA
 from aboutwindow import _AboutWindow
+from progresswindow import _ProgressWindow
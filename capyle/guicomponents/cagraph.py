@@ -1,66 +1,319 @@
 import os
 import sys
+import threading
 import matplotlib
 matplotlib.use('TkAgg')
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
-from matplotlib import colors
 from matplotlib import pyplot as plt
 import numpy as np
+from capyle.ca import state_index
+from capyle.guicomponents import _FrameCache
 
 class _CAGraph(object):
     # increase for high res displays
     GRAPH_SIZE = [8, 8]
+    # colour of cells not in any of the states
+    UNKNOWN_COLOR = (0, 0, 0)
+    # memory budget of the rendered frames of a timeline, in MiB
+    FRAME_CACHE_MB = 256
+    # the most frames rendered ahead of playback
+    PREFETCH = 16
 
     def __init__(self, data, states, sequence=False, placeholder=False):
-        """Create a matplotlib graph within a tkinter canvas"""
-        # get grid size from file
+        """Create a matplotlib graph within a tkinter canvas
+
+        Note:
+            Grids are drawn as RGBA images, coloured by looking each cell's
+            state up in a table of the state colours (see set_colormap),
+            and stepping through the timeline redraws only the image
+            (see blit) rather than the whole figure. The frames of a
+            timeline are rendered ready to blit, and cached within the
+            frame_cache budget in MiB of config.txt (see _FrameCache).
+        """
+        # get grid size and frame cache budget from file
+        custom_size = self.GRAPH_SIZE
+        cache_mb = self.FRAME_CACHE_MB
         try:
             with open(sys.path[0] + "/config.txt", "r") as f:
                 for line in f:
                     l = line.split("=")
                     if l[0] == "graph":
                         size = int(l[1].strip())
-                custom_size = size, size
+                        custom_size = size, size
+                    elif l[0] == "frame_cache":
+                        cache_mb = float(l[1].strip())
         except:
-            custom_size = self.GRAPH_SIZE
+            pass
 
         if placeholder:
             self.fig = plt.Figure(frameon=False)
         else:
+            self.states = tuple(states)
+            self.lut_version = 0
+            self.set_lut(self.gray_colors())
+            self.timeline = None
+            # changed whenever the timeline is replaced, see set_timeline
+            self.timeline_version = 0
+            # the cache renders frames on a background thread
+            self.timeline_lock = threading.Lock()
+            self.index = None
+            self.direction = 1
             if sequence:
                 self.timeline = data
                 data = self.timeline[0]
+            self.cache = _FrameCache(self.render_frame,
+                                     int(cache_mb * 2**20))
             self.fig = plt.Figure(frameon=False)
             self.fig.set_size_inches(custom_size)
             ax = self.fig.add_axes([0, 0, 1, 1])
             ax.axis('off')
-            self.mat = ax.matshow(data, cmap='gray', interpolation='none',
-                                  vmin=states[0], vmax=states[-1])
+            self.mat = ax.imshow(self.rgba(data), interpolation='none',
+                                 origin='upper', aspect='equal')
+            self.setdata(data)
+            if sequence:
+                self.index = 0
+            self.sync()
+            # blitting needs the figure to have been drawn in full once
+            self.drawn = False
+            self.pixels = None
+            self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def gray_colors(self):
+        """The colour of each state on a gray scale from black for the first
+        state to white for the last, before set_colormap is called"""
+        values = np.asarray(self.states, dtype=float)
+        span = values[-1] - values[0]
+        if span == 0:
+            levels = np.zeros(len(values))
+        else:
+            levels = np.clip((values - values[0]) / span, 0, 1)
+        return [(l, l, l) for l in levels]
+
+    def set_lut(self, cmap_ls):
+        """Build the table of the opaque 8 bit RGBA colour of each state,
+        with the colour of unknown cells last so a state index of -1 finds
+        it"""
+        lut = np.full((len(self.states) + 1, 4), 255, dtype=np.uint8)
+        lut[:-1, :3] = np.round(np.asarray(cmap_ls, dtype=float)[:, :3] * 255)
+        lut[-1, :3] = self.UNKNOWN_COLOR
+        self.lut = lut
+        # the same colours as one 32 bit word per pixel, to copy 4 bytes
+        # at a time. Frames cached for other colours have another version
+        self.lut_version += 1
+        self.palette = (self.lut_version, lut.view(np.uint32).reshape(-1))
+        # states 0 to n - 1 are their own index into the table
+        self.direct = self.states == tuple(range(len(self.states)))
+
+    def lut_index(self, data):
+        """The index of each cell's colour in the table"""
+        data = np.asarray(data)
+        if self.direct and data.dtype.kind in 'ub':
+            # a state past the last finds the colour of unknown cells
+            return np.minimum(data, len(self.states))
+        return state_index(data, self.states)
+
+    def colours(self, data, lut32=None):
+        """The colour of each cell of a grid of states as a 32 bit RGBA
+        word"""
+        if lut32 is None:
+            lut32 = self.palette[1]
+        return lut32.take(self.lut_index(data))
+
+    def rgba(self, data):
+        """Colour a grid of states, returning a (rows, cols, 4) uint8
+        image"""
+        colours = self.colours(data)
+        return colours.view(np.uint8).reshape(colours.shape + (4,))
+
+    def on_draw(self, event):
+        # the figure may have been resized, find the grid's pixels again
+        self.drawn = True
+        self.pixels = None
+        if self.stale and hasattr(event.canvas, 'buffer_rgba'):
+            # drawn other than by refresh (eg. resizing the window) with
+            # the image of an earlier frame, draw the current frame over it
+            self.write_frame(event.canvas)
 
     def clear(self):
         """Clear the graph"""
         self.fig.clf()
 
     def update(self, i):
-        """Set the graph data to be the timepoint specified"""
-        self.mat.set_data(self.timeline[i])
+        """Set the graph data to be the timepoint specified
+
+        Note:
+            The image is only updated when the whole figure is drawn, blit
+            draws the frame from the cache
+        """
+        i = int(i)
+        backward = self.index is not None and i < self.index
+        self.direction = -1 if backward else 1
+        self.index = i
+        self.stale = True
 
     def setdata(self, data):
         """Set the data displayed on the graph"""
-        self.mat.set_data(data)
+        self.index = None
+        self.data = data
+        self.stale = True
+
+    def set_timeline(self, timeline, extend=False):
+        """Replace the timeline displayed
+
+        Args:
+            timeline (numpy.ndarray): the grid state for each timestep
+            extend (bool): the new timeline only adds frames to the end of
+                the old one (eg. a run still going), so the frames cached
+                for the old one are kept
+        """
+        with self.timeline_lock:
+            self.timeline = timeline
+        if not extend:
+            # frames cached or being rendered for the old timeline have
+            # another version
+            self.timeline_version += 1
+            self.cache.clear()
+        self.stale = True
+
+    def frame(self, i):
+        """Frame i of the timeline"""
+        with self.timeline_lock:
+            return self.timeline[i]
+
+    def current(self):
+        """The grid displayed"""
+        if self.index is not None:
+            return self.frame(self.index)
+        return self.data
+
+    def sync(self):
+        """Set the image to the grid displayed, before drawing the figure"""
+        if self.stale:
+            self.mat.set_data(self.rgba(self.current()))
+            self.stale = False
 
     def refresh(self):
         """Redraw the graph"""
+        self.sync()
         self.fig.canvas.draw()
 
+    def find_pixels(self, buffer):
+        """Work out where the grid is drawn on the canvas after a full draw.
+
+        Returns:
+            (tuple, slice, slice, numpy.ndarray, numpy.ndarray): the
+                geometry of the grid on the canvas (the shape of the grid
+                and the bounds of its pixels), the rows and columns of the
+                canvas the grid covers, and the grid row and column of the
+                cell drawn at each of them
+        """
+        height, width = buffer.shape[:2]
+        rows, cols = self.mat.get_array().shape[:2]
+        extent = self.mat.get_window_extent()
+        # display coordinates count up from the bottom of the canvas
+        top, bottom = height - extent.y1, height - extent.y0
+        y0 = max(0, int(round(top)))
+        y1 = min(height, int(round(bottom)))
+        x0 = max(0, int(round(extent.x0)))
+        x1 = min(width, int(round(extent.x1)))
+        # the cell under the center of each pixel
+        cell_rows = ((np.arange(y0, y1) + 0.5 - top) / extent.height *
+                     rows).astype(np.intp)
+        cell_cols = ((np.arange(x0, x1) + 0.5 - extent.x0) / extent.width *
+                     cols).astype(np.intp)
+        return ((rows, cols, y0, y1, x0, x1), slice(y0, y1), slice(x0, x1),
+                np.clip(cell_rows, 0, rows - 1)[:, None],
+                np.clip(cell_cols, 0, cols - 1)[None, :])
+
+    def render(self, data, lut32, pixels):
+        """The pixels of a grid on the canvas, ready to blit"""
+        geometry, ys, xs, cell_rows, cell_cols = pixels
+        return self.colours(data, lut32)[cell_rows, cell_cols]
+
+    def frame_key(self, i):
+        """The key of frame i of the current timeline rendered with the
+        current colours and geometry in the cache"""
+        return (i, self.timeline_version, self.palette[0], self.pixels[0])
+
+    def render_frame(self, key):
+        """Render a frame of the timeline for the cache, None if the
+        timeline, colours or geometry have changed since it was asked for"""
+        i, timeline_version, version, geometry = key
+        palette, pixels = self.palette, self.pixels
+        if (timeline_version != self.timeline_version or
+                palette[0] != version or pixels is None or
+                pixels[0] != geometry):
+            return None
+        return self.render(self.frame(i), palette[1], pixels)
+
+    def write_frame(self, canvas):
+        """Write the pixels of the grid displayed into the canvas buffer,
+        returning False if the grid has changed shape since the figure was
+        drawn"""
+        buffer = np.asarray(canvas.buffer_rgba())
+        if self.pixels is None:
+            self.pixels = self.find_pixels(buffer)
+        geometry, ys, xs = self.pixels[:3]
+        frame = None
+        if self.index is not None:
+            frame = self.cache.get(self.frame_key(self.index))
+        else:
+            data = self.current()
+            if np.shape(data)[:2] == geometry[:2]:
+                frame = self.render(data, self.palette[1], self.pixels)
+        if frame is None or frame.shape != (ys.stop - ys.start,
+                                            xs.stop - xs.start):
+            return False
+        buffer.view(np.uint32)[ys, xs, 0] = frame
+        return True
+
+    def prefetch(self):
+        """Render the next frames in the direction of playback in the
+        background, as many as fit in half the cache"""
+        if self.index is None or self.pixels is None:
+            return
+        frame_bytes = 4 * (self.pixels[0][3] - self.pixels[0][2]) * (
+            self.pixels[0][5] - self.pixels[0][4])
+        count = min(self.PREFETCH,
+                    self.cache.max_bytes // max(1, 2 * frame_bytes))
+        ahead = [self.index + self.direction * j
+                 for j in range(1, count + 1)]
+        self.cache.prefetch([self.frame_key(i) for i in ahead
+                             if 0 <= i < len(self.timeline)])
+
+    def blit(self):
+        """Redraw just the image of the grid, a much faster refresh for
+        when only the data has changed
+
+        Note:
+            The colours of the cells are written straight into the pixels
+            of the canvas that the last full draw drew the grid on, each
+            pixel taking the colour of the cell under its center, and only
+            that region is copied to the screen. Timeline frames come from
+            the cache, and the frames ahead are prefetched. The whole
+            figure is drawn instead until it has been drawn once, or if
+            the canvas has no pixel buffer.
+        """
+        canvas = self.fig.canvas
+        if not (self.drawn and canvas.supports_blit and
+                hasattr(canvas, 'buffer_rgba')):
+            self.refresh()
+            return
+        if not self.write_frame(canvas):
+            self.refresh()
+            return
+        canvas.blit(self.mat.get_window_extent())
+        self.prefetch()
+
     def set_colormap(self, cmap_ls):
-        """Set the colormap of the matplotlib graph"""
-        cm = colors.LinearSegmentedColormap.from_list(
-            'Custom', cmap_ls, N=len(cmap_ls))
-        self.mat.set_cmap(cm)
+        """Set the colour of each state, in the order of the states"""
+        if cmap_ls is not None:
+            self.set_lut(cmap_ls)
+            self.stale = True
         self.refresh()
 
     def screenshot(self, filepath):
         """Save an image of the current graph display"""
+        self.sync()
         self.fig.savefig(filepath, bbox_inches='tight')
@@ -0,0 +1,112 @@
+import threading
+from collections import OrderedDict
+
+
+class _FrameCache(object):
+    """Least recently used cache of rendered frames, within a memory budget.
+
+    Frames are cached by key, eg. (frame index, colours, display geometry),
+    so a frame rendered for other colours or another size is never
+    returned. Once the frames cached take more than max_bytes the least
+    recently used are evicted.
+
+    Frames can be rendered ahead of time on a background thread with
+    prefetch. The thread exits once it has nothing left to render.
+    """
+
+    def __init__(self, render, max_bytes=256 * 2**20):
+        """
+        Args:
+            render (function): render(key) returning the frame for a key as
+                a numpy array, or None if it can no longer be rendered (eg.
+                the colours have changed since it was asked for)
+            max_bytes (int): the most bytes of frames to keep
+        """
+        self.render = render
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        self._wanted = []
+        self._thread = None
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, key):
+        return key in self._frames
+
+    def get(self, key):
+        """The frame for key, rendered and cached if it is not cached"""
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return frame
+            self.misses += 1
+        frame = self.render(key)
+        if frame is not None:
+            self.put(key, frame)
+        return frame
+
+    def put(self, key, frame):
+        """Cache a frame, evicting the least recently used frames to keep
+        within the budget"""
+        with self._lock:
+            self._put(key, frame)
+
+    def _put(self, key, frame):
+        if key in self._frames:
+            self.nbytes -= self._frames.pop(key).nbytes
+        if frame.nbytes > self.max_bytes:
+            return
+        self._frames[key] = frame
+        self.nbytes += frame.nbytes
+        while self.nbytes > self.max_bytes:
+            evicted = self._frames.popitem(last=False)[1]
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        """Drop every cached frame and any prefetch not yet done"""
+        with self._lock:
+            self._frames.clear()
+            self._wanted = []
+            self.nbytes = 0
+
+    def prefetch(self, keys):
+        """Render the frames for keys on a background thread, in order,
+        replacing any earlier prefetch not yet done"""
+        with self._lock:
+            self._wanted = [key for key in keys if key not in self._frames]
+            if self._wanted and self._thread is None:
+                self._thread = threading.Thread(target=self._prefetch_loop)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def wait(self, timeout=None):
+        """Wait for the background thread to finish prefetching"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _prefetch_loop(self):
+        while True:
+            with self._lock:
+                if not self._wanted:
+                    self._thread = None
+                    return
+                key = self._wanted.pop(0)
+                if key in self._frames:
+                    continue
+            try:
+                frame = self.render(key)
+            except Exception:
+                # left for get to render and report
+                continue
+            if frame is not None:
+                with self._lock:
+                    if key not in self._frames:
+                        self._put(key, frame)
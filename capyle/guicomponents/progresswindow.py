@@ -0,0 +1,56 @@
+import tkinter as tk
+
+
+class _ProgressWindow(tk.Toplevel):
+    """Progress of a CA run in the background, drawn by the GUI from the
+    ProgressEvents the run sends (see runner.RunHandle), so the run never
+    waits for the window to be redrawn"""
+    WINDOW_TITLE = 'Running...'
+    MAX_WIDTH = 200
+    HEIGHT = 20
+
+    def __init__(self, parent, cancel=None):
+        """
+        Args:
+            parent (tk.Widget): the window the progress window belongs to
+            cancel (function): called to cancel the run by the Cancel
+                button or closing the window, None for no Cancel button
+        """
+        tk.Toplevel.__init__(self, parent)
+        self.wm_title(self.WINDOW_TITLE)
+        self.transient(parent)
+        self.cancel = cancel
+        # closing the window cancels the run, if it can be cancelled
+        self.protocol('WM_DELETE_WINDOW', self.on_cancel)
+        self.canvas = tk.Canvas(self, height=self.HEIGHT,
+                                width=self.MAX_WIDTH)
+        self.bar = self.canvas.create_rectangle(0, 0, 0, self.HEIGHT,
+                                                fill="blue")
+        self.canvas.pack(padx=5, pady=5)
+        self.label = tk.Label(self, text="Starting...")
+        self.label.pack(padx=5, pady=(0, 5))
+        self.btn_cancel = None
+        if cancel is not None:
+            self.btn_cancel = tk.Button(self, text="Cancel",
+                                        command=self.on_cancel)
+            self.btn_cancel.pack(pady=(0, 5))
+
+    def on_cancel(self):
+        """Cancel the run, the window stays until the run has stopped"""
+        if self.cancel is None:
+            return
+        self.cancel()
+        self.label.config(text="Cancelling...")
+        self.btn_cancel.config(state=tk.DISABLED)
+
+    def update_progress(self, event):
+        """Show a ProgressEvent, resizing the one bar"""
+        w = int(event.generation / max(1, event.total) * self.MAX_WIDTH)
+        self.canvas.coords(self.bar, 0, 0, w, self.HEIGHT)
+        text = "Generation {g}/{t}".format(g=event.generation, t=event.total)
+        if event.cells_per_second is not None:
+            text += ", {c:.3g} cells/s".format(c=event.cells_per_second)
+        if event.eta is not None:
+            text += ", {e:.1f}s left".format(e=event.eta)
+        self.label.config(text=text)
+        self.update_idletasks()
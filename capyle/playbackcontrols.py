@@ -20,6 +20,8 @@ class _PlaybackControls():
         self.current_frame = 0
         self.maxframe = 0
         self.loop = False
+        # more frames are still to come, from a run in progress
+        self.growing = False
         # Create playback UI
         self.ui = _PlaybackUI(self.display.rtopframe, self)
 
@@ -71,6 +73,9 @@ class _PlaybackControls():
             if self.current_frame < self.maxframe:
                 # if frame has next
                 self.current_frame += 1
+            elif self.growing:
+                # wait at the last frame for the run to catch up
+                pass
             elif self.current_frame == self.maxframe and self.loop:
                 self.current_frame = 0
             else:
@@ -97,9 +102,9 @@ class _PlaybackControls():
         else:
             self.ui.enable_widget(self.ui.btns[2])
             self.ui.enable_widget(self.ui.btns[0])
-        # set the frame in the graph
+        # set the frame in the graph, redrawing only the grid image
         self.display.ca_graph.update(int(x))
-        self.display.ca_graph.refresh()
+        self.display.ca_graph.blit()
 
     def set_fps(self, fps):
         """Set the fps of the playback
@@ -137,3 +142,16 @@ class _PlaybackControls():
         self.ui.scrubbing_slider.config(to=maxframe,
                                         command=lambda x: self.scrub(x))
         self.scrub(self.current_frame)
+
+    def extend(self, maxframe):
+        """Make more frames of the timeline playable without changing the
+        play state, as the frames of a run still going arrive
+
+        Args:
+            maxframe (int): The new maximum frame in the timeline
+        """
+        self.maxframe = maxframe
+        self.ui.scrubbing_slider.config(to=maxframe,
+                                        command=lambda x: self.scrub(x))
+        if self.current_frame < maxframe:
+            self.ui.enable_widget(self.ui.btns[2])
@@ -0,0 +1,475 @@
+import os
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import traceback
+import importlib.util
+import multiprocessing
+import numpy as np
+from capyle.utils import load
+from capyle.ca import (CAConfig, Grid1D, Grid2D, DeltaTimeline,
+                       ElementaryTimeline, RunCancelled, as_frames,
+                       drain_progress, open_timeline, set_progress_queue)
+
+# the mode argument passed to a description's setup function
+PRERUN = '0'
+RUN = '1'
+
+# seconds between checks for progress events while waiting for a worker
+PROGRESS_POLL_INTERVAL = 0.05
+
+# description file path -> (mtime, module, module globals after import)
+_DESCRIPTIONS = {}
+
+
+def load_description(filepath):
+    """Import a CA description file, reusing the module imported by
+    earlier calls unless the file has changed since.
+
+    Note:
+        The module globals are reset to the values they had after importing,
+        and the globals first created by setup are removed, so that the
+        globals set by setup in one run do not leak into the next
+
+    Args:
+        filepath (str): path to the CA description py file
+
+    Returns:
+        module: the imported description
+    """
+    path = os.path.abspath(filepath)
+    mtime = os.path.getmtime(path)
+    cached = _DESCRIPTIONS.get(path)
+    if cached is None or cached[0] != mtime:
+        name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        cached = (mtime, module, dict(module.__dict__))
+        _DESCRIPTIONS[path] = cached
+    mtime, module, initial_globals = cached
+    module.__dict__.clear()
+    module.__dict__.update(initial_globals)
+    return module
+
+
+def description_args(ca_config, mode, options=None):
+    """Build the arguments passed to the setup function of a description,
+    the same as the command line arguments descriptions are run with.
+
+    Args:
+        ca_config (CAConfig): the config, saved to ca_config.path
+        mode (str): PRERUN or RUN
+        options (Namespace): command line options forwarded to the
+            description. If None only the config path, and the mode when
+            pre-running, are passed
+
+    Returns:
+        list: the arguments as strings
+    """
+    if options is None:
+        return [ca_config.path, mode] if mode == PRERUN else [ca_config.path]
+    return [ca_config.path, mode, str(options.incin), str(options.pp),
+            str(options.water_drop), str(options.wind_dir),
+            str(options.water_time), str(options.wind_speed),
+            str(options.f_ext)]
+
+
+def run_description(module, ca_config):
+    """Run a description that has been set up, returning the timeline.
+
+    Descriptions may define run(config) returning the timeline, otherwise
+    a Grid1D or Grid2D is created with the description's transition
+    function and run, stopping early when the description's optional
+    stop_condition(grid, generation) returns True.
+    """
+    if hasattr(module, 'run'):
+        return module.run(ca_config)
+    transition_func = getattr(module, 'transition_func', None)
+    if transition_func is None:
+        transition_func = module.transition_function
+    if ca_config.dimensions == 1:
+        grid = Grid1D(ca_config, transition_func)
+    else:
+        grid = Grid2D(ca_config, transition_func)
+    return grid.run(getattr(module, 'stop_condition', None))
+
+
+def prerun(ca_config, options=None):
+    """Run the setup function of a CA description in this process.
+
+    Args:
+        ca_config (CAConfig): the config object passed to the description
+        options (Namespace): command line options for the description
+
+    Returns:
+        CAConfig: the updated config, None if the description failed
+    """
+    ca_config.save()
+    try:
+        module = load_description(ca_config.filepath)
+        try:
+            ca_config = module.setup(
+                description_args(ca_config, PRERUN, options))
+        except SystemExit as e:
+            # setup saves the config and exits when pre-running
+            if e.code not in (None, 0):
+                raise
+            ca_config = load(ca_config.path)
+    except (Exception, SystemExit):
+        print('[ERROR] Error in CA description while prerunning')
+        traceback.print_exc()
+        return None
+    ca_config.fill_in_defaults()
+    return ca_config
+
+
+def run(ca_config, options=None, overrides=None):
+    """Set up and run a CA description in this process.
+
+    Args:
+        ca_config (CAConfig): the config object passed to the description
+        options (Namespace): command line options for the description
+        overrides (dict): config attributes to set before the description's
+            setup function, so that it can read them (eg. the seed), and
+            again after it, taking precedence over the description
+
+    Returns:
+        CAConfig: the config after being updated by the description
+        numpy.ndarray: the grid state for each timestep
+        Both are None if the description failed
+    """
+    overrides = overrides or {}
+    for name, value in overrides.items():
+        setattr(ca_config, name, value)
+    ca_config.save()
+    try:
+        module = load_description(ca_config.filepath)
+        ca_config = module.setup(description_args(ca_config, RUN, options))
+        for name, value in overrides.items():
+            setattr(ca_config, name, value)
+        timeline = run_description(module, ca_config)
+    except RunCancelled:
+        return None, None
+    except (Exception, SystemExit):
+        print('[ERROR] Error in CA description while attempting to run CA')
+        traceback.print_exc()
+        return None, None
+    return ca_config, timeline
+
+
+def run_file(filepath, options=None, overrides=None):
+    """Pre-run and run the CA description at filepath in this process.
+
+    Note:
+        The config is passed to the description through a temporary
+        directory rather than temp/, so runs can be started from anywhere
+        and several can run at once.
+
+    Args:
+        filepath (str): path to the CA description py file
+        options (Namespace): command line options for the description
+        overrides (dict): config attributes overriding the description,
+            see run
+
+    Returns:
+        CAConfig: the config after being updated by the description
+        numpy.ndarray: the grid state for each timestep
+        Both are None if the description failed
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ca_config = CAConfig(filepath)
+        ca_config.path = os.path.join(tmpdir, 'config.pkl')
+        ca_config.timeline_path = os.path.join(tmpdir, 'timeline.pkl')
+        ca_config = prerun(ca_config, options)
+        if ca_config is None:
+            return None, None
+        return run(ca_config, options, overrides)
+
+
+def _worker_main(conn, ca_config, mode, options, progress_queue=None):
+    """Entry point of the worker process, sends the config then the raw
+    bytes of each frame of the timeline down conn. A timeline streamed to
+    ca_config.timeline_file is not sent, the header is its path instead,
+    and compact timelines (DeltaTimeline, ElementaryTimeline) are sent
+    whole. Given a progress_queue, progress is put on it as ProgressEvents
+    rather than drawn by this process"""
+    try:
+        if mode == PRERUN:
+            conn.send((prerun(ca_config, options), None))
+            return
+        overrides = None
+        if progress_queue is not None:
+            set_progress_queue(progress_queue)
+            overrides = {'progress': 'queue'}
+        ca_config, timeline = run(ca_config, options, overrides)
+        if timeline is None:
+            conn.send((None, None))
+            return
+        if isinstance(timeline, np.memmap):
+            timeline.flush()
+            conn.send((ca_config, timeline.filename))
+            return
+        if isinstance(timeline, (DeltaTimeline, ElementaryTimeline)):
+            conn.send((ca_config, timeline))
+            return
+        frames = np.ascontiguousarray(as_frames(timeline))
+        header = (len(frames), frames.shape[1:], frames.dtype.str)
+        conn.send((ca_config, header))
+        for frame in frames:
+            conn.send_bytes(frame.reshape(-1))
+    finally:
+        conn.close()
+
+
+def run_in_worker(ca_config, mode, options=None, progress=None):
+    """Pre-run or run a CA description in a separate worker process,
+    isolating the GUI from the description.
+
+    The results are streamed back over a pipe, the frames as raw array
+    bytes received straight into the timeline.
+
+    Note:
+        Given a progress callback, the worker puts ProgressEvents on a
+        queue instead of drawing a progress window itself, and the
+        callback is called with each event while waiting for the results.
+        The worker never waits for the callback.
+
+    Args:
+        ca_config (CAConfig): the config object passed to the description
+        mode (str): PRERUN or RUN
+        options (Namespace): command line options for the description
+        progress (function): called with each ProgressEvent of a run
+
+    Returns:
+        CAConfig: when pre-running, as prerun
+        (CAConfig, numpy.ndarray): when running, as run
+    """
+    worker, receiver, progress_queue = _start_worker(
+        ca_config, mode, options, progress is not None and mode == RUN)
+    return _receive(worker, receiver, mode, progress_queue, progress)
+
+
+def _start_worker(ca_config, mode, options=None, report_progress=False):
+    """Start a worker process running _worker_main, returning the process,
+    the end of the pipe the results are received from and the queue of
+    its ProgressEvents (None unless report_progress)"""
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    progress_queue = context.Queue() if report_progress else None
+    worker = context.Process(target=_worker_main,
+                             args=(sender, ca_config, mode, options,
+                                   progress_queue))
+    worker.start()
+    sender.close()
+    return worker, receiver, progress_queue
+
+
+def _receive(worker, receiver, mode, progress_queue=None, progress=None,
+             cancelled=None):
+    """Wait for the results of a worker started by _start_worker, passing
+    its ProgressEvents to progress meanwhile, see run_in_worker. A worker
+    terminated once the cancelled event is set exits quietly"""
+    try:
+        try:
+            # wait for the results, or the worker to exit without them
+            while not receiver.poll(PROGRESS_POLL_INTERVAL):
+                if progress_queue is not None:
+                    drain_progress(progress_queue, progress)
+                if not worker.is_alive() and not receiver.poll():
+                    raise EOFError
+            ca_config, header = receiver.recv()
+        except EOFError:
+            if cancelled is None or not cancelled.is_set():
+                print('[ERROR] CA worker process exited unexpectedly')
+            ca_config, header = None, None
+        if mode == PRERUN:
+            return ca_config
+        if header is None:
+            return None, None
+        if isinstance(header, str):
+            return ca_config, open_timeline(header)
+        if isinstance(header, (DeltaTimeline, ElementaryTimeline)):
+            return ca_config, header
+        numframes, shape, dtype = header
+        timeline = np.empty((numframes,) + tuple(shape), dtype=dtype)
+        for i in range(numframes):
+            # receive into a flat view, the pipe sizes buffers by their
+            # first dimension
+            receiver.recv_bytes_into(timeline[i].reshape(-1))
+        return ca_config, timeline
+    finally:
+        receiver.close()
+        if progress_queue is None:
+            worker.join()
+        else:
+            # the worker exits once its last events are read off the queue
+            while worker.is_alive():
+                drain_progress(progress_queue, progress)
+                worker.join(PROGRESS_POLL_INTERVAL)
+            drain_progress(progress_queue, progress)
+            progress_queue.close()
+
+
+class RunHandle(object):
+    """Future-style handle of a CA run on a background thread, so the
+    caller (eg. the GUI event loop) is never blocked by it. Created by
+    start_run.
+
+    The run is in this process, or in a worker process as run_in_worker.
+    Its ProgressEvents are collected by poll and the frames computed so
+    far can be read with frames while it runs.
+
+    Note:
+        Unless ca_config.timeline_file is set, the timeline is streamed to
+        a temporary .npy file, removed by close, which the frames are read
+        from. Runs that do not stream their timeline to the file
+        (descriptions with their own run function, or keyframed
+        timelines) only have frames once finished.
+
+        Cancelling a run in a worker process terminates the worker. A run
+        in this process stops at its next progress report, raising
+        RunCancelled from the 'queue' reporter.
+    """
+
+    def __init__(self, ca_config, options=None, worker=False):
+        """
+        Args:
+            ca_config (CAConfig): the config object passed to the
+                description
+            options (Namespace): command line options for the description
+            worker (bool): run the description in a worker process
+        """
+        self._tmpdir = None
+        if ca_config.timeline_file is None:
+            self._tmpdir = tempfile.mkdtemp()
+            ca_config.timeline_file = os.path.join(self._tmpdir,
+                                                   'timeline.npy')
+        self.timeline_file = ca_config.timeline_file
+        self.events = queue.Queue()
+        self.last_event = None
+        self._started = time.time()
+        self._cancel = threading.Event()
+        self._worker = None
+        self._partial = None
+        self._result = (None, None)
+        target = self._run_worker if worker else self._run_here
+        self._thread = threading.Thread(target=target,
+                                        args=(ca_config, options))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run_here(self, ca_config, options):
+        set_progress_queue(self.events, self._cancel)
+        try:
+            self._result = run(ca_config, options, {'progress': 'queue'})
+        finally:
+            set_progress_queue(None)
+
+    def _run_worker(self, ca_config, options):
+        worker, receiver, progress_queue = _start_worker(
+            ca_config, RUN, options, report_progress=True)
+        self._worker = worker
+        if self._cancel.is_set():
+            worker.terminate()
+        result = _receive(worker, receiver, RUN, progress_queue,
+                          self.events.put, self._cancel)
+        if not self._cancel.is_set():
+            self._result = result
+
+    def poll(self):
+        """Collect the ProgressEvents sent since the last poll, without
+        waiting
+
+        Returns:
+            ProgressEvent: the latest event, None if there were none since
+                the last poll
+        """
+        event = drain_progress(self.events, lambda e: None)
+        if event is not None:
+            self.last_event = event
+        return event
+
+    def frames(self):
+        """The frames computed so far, up to the latest event collected by
+        poll, or the whole timeline once the run is done
+
+        Returns:
+            numpy.ndarray: read-only (frames, rows, cols) array, None if
+                no frames are available
+        """
+        if self.done() and self._result[1] is not None:
+            return self._result[1]
+        if self.last_event is None:
+            return None
+        if self._partial is None:
+            # the file may be left from an earlier run until it is created
+            if not (os.path.exists(self.timeline_file) and
+                    os.path.getmtime(self.timeline_file) >= self._started):
+                return None
+            self._partial = open_timeline(self.timeline_file)
+            if not isinstance(self._partial, np.memmap):
+                self._partial = None
+                return None
+        return self._partial[:self.last_event.generation + 1]
+
+    def done(self):
+        """Whether the run has finished, failed or been cancelled"""
+        return not self._thread.is_alive()
+
+    def cancel(self):
+        """Stop the run, the frames computed so far are kept"""
+        self._cancel.set()
+        if self._worker is not None:
+            self._worker.terminate()
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the run to finish.
+
+        Args:
+            timeout (float): the most seconds to wait, None to wait until
+                the run finishes
+
+        Returns:
+            (CAConfig, numpy.ndarray): as run, both None if the run failed
+                or was cancelled
+
+        Raises:
+            TimeoutError: if the run has not finished within the timeout
+        """
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError("CA run still running after {t}s".format(
+                t=timeout))
+        return self._result
+
+    def close(self):
+        """Cancel the run if it is still going and remove its temporary
+        timeline file"""
+        if not self.done():
+            self.cancel()
+            self._thread.join()
+        self._partial = None
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+
+def start_run(ca_config, options=None, worker=False):
+    """Start running a CA description in the background, see RunHandle.
+
+    Args:
+        ca_config (CAConfig): the config object passed to the description
+        options (Namespace): command line options for the description
+        worker (bool): run the description in a worker process instead of
+            a thread of this process
+
+    Returns:
+        RunHandle: the handle of the run
+    """
+    return RunHandle(ca_config, options, worker)
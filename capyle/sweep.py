@@ -0,0 +1,250 @@
+import os
+import csv
+import json
+import hashlib
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from capyle.ca import get_reporter
+from capyle.runner import run_file
+from capyle.ensemble import replica_summary
+
+# the model options of main.py that can be swept, see cli.add_model_options
+MODEL_OPTIONS = ['wind_dir', 'wind_speed', 'water_drop', 'water_time',
+                 'f_ext', 'incin', 'pp']
+
+# the columns of the metrics in the table
+METRICS = ['generations', 'cells_burnt', 'final_burning', 'target_hit_time']
+
+
+def grid_space(space):
+    """Every combination of the parameter values.
+
+    Args:
+        space (dict): parameter name -> list of values
+
+    Returns:
+        list: one dict of parameter name -> value per configuration
+    """
+    names = list(space)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(space[n] for n in names))]
+
+
+def sample_space(space, num_samples, seed=None):
+    """Configurations with each parameter value drawn uniformly at random.
+
+    Args:
+        space (dict): parameter name -> list of values
+        num_samples (int): the number of configurations to draw
+        seed (int): seed for reproducible samples
+
+    Returns:
+        list: one dict of parameter name -> value per configuration
+    """
+    rng = np.random.default_rng(seed)
+    return [{name: values[rng.integers(len(values))]
+             for name, values in space.items()}
+            for i in range(num_samples)]
+
+
+def run_metrics(timeline, ignition_state, target_state=None):
+    """The metrics recorded in the sweep table for one run.
+
+    Returns:
+        dict: the number of generations, cells that burnt at any point,
+            cells burning at the end and the first timestep a target cell
+            burnt (None if never)
+    """
+    ignition_time, hit_time = replica_summary(timeline, ignition_state,
+                                              target_state)
+    return {'generations': len(timeline) - 1,
+            'cells_burnt': int(np.count_nonzero(ignition_time >= 0)),
+            'final_burning': int(np.count_nonzero(
+                np.asarray(timeline[-1]) == ignition_state)),
+            'target_hit_time': hit_time if hit_time >= 0 else None}
+
+
+class ResultsStore(object):
+    """Append-only JSON lines file of the metrics of finished
+    configurations, keyed by configuration_key.
+
+    Every finished configuration is written and flushed straight away, so
+    an interrupted sweep resumes from the configurations already in the
+    store and repeated configurations are never run twice.
+    """
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str): the store file, None to only keep results in memory
+        """
+        self.path = path
+        self.results = {}
+        # a line cut short by an interruption has no newline, the next
+        # record must start on a line of its own
+        self.partial_line = False
+        if path is not None and os.path.isfile(path):
+            with open(path) as f:
+                for line in f:
+                    self.partial_line = not line.endswith('\n')
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.results[record['key']] = record['metrics']
+
+    def __contains__(self, key):
+        return key in self.results
+
+    def get(self, key):
+        return self.results[key]
+
+    def add(self, key, params, metrics):
+        self.results[key] = metrics
+        if self.path is not None:
+            with open(self.path, 'a') as f:
+                if self.partial_line:
+                    f.write('\n')
+                    self.partial_line = False
+                f.write(json.dumps({'key': key, 'params': params,
+                                    'metrics': metrics}) + '\n')
+                f.flush()
+
+
+def configuration_key(filepath, options, overrides, ignition_state=None,
+                      target_state=None):
+    """Identify a run by the description's contents, the model options,
+    the config overrides and the states its metrics are taken for, so
+    cached results are only reused for an identical run and metrics"""
+    with open(filepath, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    run = {'description': digest,
+           'options': {name: getattr(options, name, None)
+                       for name in MODEL_OPTIONS},
+           'overrides': overrides,
+           'ignition_state': ignition_state,
+           'target_state': target_state}
+    return hashlib.sha1(json.dumps(run, sort_keys=True, default=str)
+                        .encode('utf-8')).hexdigest()
+
+
+def configuration_options(params, base_options=None):
+    """The options for a configuration: the base options with the swept
+    parameters replaced"""
+    options = {name: None for name in MODEL_OPTIONS}
+    options.update(incin=False, pp=False)
+    if base_options is not None:
+        options.update((name, getattr(base_options, name, None))
+                       for name in MODEL_OPTIONS)
+    options.update(params)
+    return argparse.Namespace(**options)
+
+
+def _run_configuration(filepath, options, overrides, ignition_state,
+                       target_state):
+    """Run one configuration in this process, returning its metrics or
+    None if the description failed"""
+    ca_config, timeline = run_file(filepath, options,
+                                   dict(overrides, progress='none'))
+    if timeline is None:
+        return None
+    return run_metrics(timeline, ignition_state, target_state)
+
+
+def run_sweep(filepath, configurations, ignition_state, target_state=None,
+              base_options=None, overrides=None, store=None, jobs=None,
+              progress='none'):
+    """Run a CA description for each configuration of parameters across
+    a pool of worker processes, skipping the ones already in the store.
+
+    Note:
+        At most two runs per worker are queued at once, so memory stays
+        bounded however many configurations there are.
+
+    Args:
+        filepath (str): path to the CA description py file
+        configurations (list): dicts of model option name -> value, see
+            grid_space and sample_space
+        ignition_state (int): the state of a burning cell
+        target_state (int): report when cells starting in this state burn
+        base_options (Namespace): model options that are not swept
+        overrides (dict): config attributes overriding the description,
+            eg. the seed or number of generations
+        store (ResultsStore): finished configurations, in memory if None
+        jobs (int): the number of worker processes, defaults to the
+            number of CPUs. 1 runs every configuration in this process
+        progress (str): reporter for the configurations completed
+
+    Returns:
+        list: one row dict of parameters and metrics per configuration,
+            in the order given. The metrics of failed runs are None
+    """
+    overrides = overrides or {}
+    store = store if store is not None else ResultsStore()
+    keys = []
+    todo = {}
+    for params in configurations:
+        options = configuration_options(params, base_options)
+        key = configuration_key(filepath, options, overrides,
+                                ignition_state, target_state)
+        keys.append(key)
+        if key not in store and key not in todo:
+            todo[key] = (params, options)
+    reporter = get_reporter(progress, max(1, len(todo)))
+    finished = []
+
+    def record(key, metrics):
+        if metrics is None:
+            print("[WARNING] Run failed for {p}".format(p=todo[key][0]))
+        else:
+            store.add(key, todo[key][0], metrics)
+        finished.append(key)
+        reporter.set(len(finished))
+
+    if jobs == 1:
+        for key, (params, options) in todo.items():
+            record(key, _run_configuration(filepath, options, overrides,
+                                           ignition_state, target_state))
+    elif todo:
+        workers = jobs or os.cpu_count() or 1
+        queue = iter(todo.items())
+        with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')) as executor:
+            pending = {}
+
+            def submit(count):
+                for key, (params, options) in itertools.islice(queue, count):
+                    future = executor.submit(
+                        _run_configuration, filepath, options, overrides,
+                        ignition_state, target_state)
+                    pending[future] = key
+
+            submit(workers * 2)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(pending.pop(future), future.result())
+                submit(len(done))
+    rows = []
+    for params, key in zip(configurations, keys):
+        metrics = store.get(key) if key in store else dict.fromkeys(METRICS)
+        rows.append(dict(params, **metrics))
+    return rows
+
+
+def write_table(rows, path):
+    """Write the rows of a sweep as a CSV table, a column per parameter
+    then a column per metric"""
+    columns = []
+    for row in rows:
+        columns.extend(name for name in row if name not in columns)
+    params = [name for name in columns if name not in METRICS]
+    columns = params + [name for name in columns if name in METRICS]
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
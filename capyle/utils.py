@@ -1,78 +1,71 @@
 import sys
 import pickle
-import subprocess
 import time
 import platform
 import os.path
 import numpy as np
 
-def prerun_ca(ca_config, options):
+def prerun_ca(ca_config, options=None, worker=False):
     """
     Run the setup function of a ca description and load the CAConfig.
     Args:
         ca_config (CAConfig): The config object to be saved
             and passed to the CA file.
+        options (Namespace): Command line arguments passed on to the
+            CA file.
+        worker (bool): Run the CA file in a separate worker process
+            instead of this process.
     Returns:
         CAConfig: The updated config after values have been updated
             while pre-running the ca description
     """
-    ca_config.save()
+    from capyle.runner import prerun, run_in_worker, PRERUN
+    if worker:
+        return run_in_worker(ca_config, PRERUN, options)
+    return prerun(ca_config, options)
 
-    args = [sys.executable, ca_config.filepath, ca_config.path, '0', str(options.incin), str(options.pp), str(options.water_drop), str(options.wind_dir), str(options.water_time), str(options.wind_speed), str(options.f_ext)] #Note: subprocess.Popen only allows strings so will need to handle these accordinly in the sim.]
-
-    ca = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    out_bytes, errors_bytes = ca.communicate()
-    errors_str = errors_bytes.decode("utf-8")
-    out_str = out_bytes.decode("utf-8")
-    if errors_str != "":
-        print('[ERROR] Error in CA description while prerunning')
-        print(out_str)
-        print(errors_str)
-    else:
-        if not out_str == '':
-            print(out_str)
-        ca_config = load(ca_config.path)
-        ca_config.fill_in_defaults()
-        return ca_config
-
-def run_ca(ca_config, options):
+def run_ca(ca_config, options=None, worker=False, progress=None):
     """
-    Run the ca in a subprocess, saving the timestep to a timeline. The timeline is then saved to 
-    disk and loaded back in this process
+    Run the ca, saving the timestep to a timeline. The CA file is imported
+    once and run in this process, or in a worker process which streams the
+    timeline back over a pipe.
     Paramters
     ---------
     `ca_config` : CAConfig object
         The config object to be saved and passed to the CA file.
     `options` : Namespace object
         Command line arguments.
+    `worker` : bool
+        Run the CA file in a separate worker process.
+    `progress` : function
+        Called with each ProgressEvent of a run in a worker process, in
+        place of the worker drawing ca_config.progress itself.
     Returns:
         CAConfig: The updated config after values have been updated
-            while pre-running the ca description
+            while running the ca description
         numpy.ndarray: Array containing the grid state for each time step
     """
-    ca_config.save()
+    from capyle.runner import run, run_in_worker, RUN
+    if worker:
+        return run_in_worker(ca_config, RUN, options, progress)
+    return run(ca_config, options)
 
-    args = [sys.executable, ca_config.filepath, ca_config.path, '1', str(options.incin), str(options.pp), str(options.water_drop), str(options.wind_dir), str(options.water_time), str(options.wind_speed), str(options.f_ext)]
-
-    ca = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    outbytes, errors_bytes = ca.communicate()
-    errors_str = errors_bytes.decode("utf-8")
-    try:
-        out_str = out_bytes.decode("utf-8")
-    except:
-        out_str = ""
-    if errors_str != "":
-        print('[ERROR] Error in CA description while attempting to run CA')
-        if not out_str == '':
-            print(out_str)
-        print(errors_str)
-        return None, None
-    else:
-        if not out_str == '':
-            print(out_str)
-        ca_config = load(ca_config.path)
-        timeline = load(ca_config.timeline_path)
-        return ca_config, timeline
+def run_ca_async(ca_config, options=None, worker=False):
+    """
+    Start running the ca in the background without waiting for it, on a
+    thread of this process or in a worker process.
+    Args:
+        ca_config (CAConfig): The config object to be saved
+            and passed to the CA file.
+        options (Namespace): Command line arguments passed on to the
+            CA file.
+        worker (bool): Run the CA file in a separate worker process.
+    Returns:
+        RunHandle: Handle to poll the progress and frames of the run,
+            cancel it and get its results, see runner.RunHandle
+    """
+    from capyle.runner import start_run
+    return start_run(ca_config, options, worker)
 
 def verify_gens(num_gens):
     """Asssert that the number of generations is above 0"""
@@ -277,6 +270,7 @@ def screenshot(cagraph, catitle, path=None):
     return filename
 
 def get_logo():
+    import tkinter as tk
     os = platform.system()
     fn = ""
     if os == "Windows":
@@ -290,5 +284,14 @@ def get_logo():
     logo = tk.PhotoImage(file=fp)
     return logo
 
-# The above functions are required before importing the remainder
-from capyle.guicomponents.gui_utils import *
\ No newline at end of file
+def __getattr__(name):
+    """Look up the GUI helpers in gui_utils on first use, so that the
+    rest of utils can be imported without importing tkinter"""
+    if name.startswith('__'):
+        raise AttributeError(name)
+    from capyle.guicomponents import gui_utils
+    try:
+        return getattr(gui_utils, name)
+    except AttributeError:
+        raise AttributeError(
+            "module 'capyle.utils' has no attribute '{}'".format(name))
\ No newline at end of file
@@ -10,6 +10,7 @@ sys.path.append(main_dir_loc + 'capyle/ca')
 sys.path.append(main_dir_loc + 'capyle/guicomponents')
 
 from capyle import Display
+from capyle.cli import add_model_options
 
 def parse_options():
     """Parse command line options."""
@@ -18,20 +19,11 @@ def parse_options():
                                      epilog="Ethan Jones, 2022-11-11")
     parser.add_argument("-f", "--model-path", dest="path", action="store", type=str,
                         required=True, help="Specify the *FULL* file path to CA model.")
-    parser.add_argument("-w", "--wind-direction", dest="wind_dir", action="store", type=str,
-                        required=False, help="Specify direction of prevailing wind from [N, E, S, W] etc.")
-    parser.add_argument("-d", "--drop-water-coords", dest="water_drop", action="store", nargs='+', type=int,
-                        required=False, help="Whitespace separated coords for where water should be dropped e.g. --drop-water-coords 4 6")
-    parser.add_argument("-t", "--drop-water-time", dest="water_time", action="store", type=int,
-                        required=False, help="Time interval for the water to be dropped. Each time drop is 4 hours.")
-    parser.add_argument("-ws", "--wind-speed", dest="wind_speed", action="store", type=int,
-                        required=False, help="Wind speed measurements are km/h.")
-    parser.add_argument("-e", "--forest-extension", dest="f_ext", action="store", type=int,
-                        required=False, help="Choice of pre-chosen forest extensions.")
-    parser.add_argument("-i", "--start-incinerator", dest="incin", action="store_true",
-                        required=False, help="Specify whether fire starts at incinerator.")
-    parser.add_argument("-p", "--start-power-plant", dest="pp", action="store_true",
-                        required=False, help="Specify whether fire starts at power plant.")
+    add_model_options(parser)
+    parser.add_argument("-x", "--worker-process", dest="worker", action="store_true",
+                        required=False, help="Run the CA model in a separate worker process instead of the GUI process.")
+    parser.add_argument("-o", "--timeline-file", dest="timeline_file", action="store", type=str,
+                        required=False, help="Stream the timeline to this .npy file instead of keeping it in memory.")
     options = parser.parse_args()
     return options
 
@@ -0,0 +1,263 @@
+import sys, inspect, unittest, subprocess, importlib.util
+import numpy as np
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from capyle.ca import Grid2D, CAConfig, get_backend
+from capyle.ca import backends
+from capyle.ca.backends import (BACKENDS, ThreadedBackend, convolution_counts,
+                                numba_available)
+
+TESTDESCRIPTIONS_PATH = 'test/testdescriptions/'
+DESCRIPTIONS_2D = ['2dbasic.py', '2dinvalid.py', '2dminimalcoms.py',
+                   '2dminimalvars.py', '2dnone.py']
+
+def load_description(filename):
+    """Import a CA description file as a module"""
+    spec = importlib.util.spec_from_file_location(
+        filename[:-3], TESTDESCRIPTIONS_PATH + filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+#----------------------------------------------------------------------
+
+class TestRegistry(unittest.TestCase):
+    def test_registered(self):
+        for name in ['numpy', 'numba', 'threaded', 'convolve']:
+            self.assertIn(name, BACKENDS)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, get_backend, 'notabackend')
+
+    def test_config_default(self):
+        config = CAConfig(TESTDESCRIPTIONS_PATH + '2dbasic.py')
+        self.assertEqual(config.backend, 'numpy')
+
+    def test_bands_cover_rows(self):
+        backend = ThreadedBackend(max_workers=4)
+        backend.MIN_BAND_ROWS = 1
+        for rows in [3, 7, 64, 201]:
+            bands = backend._bands(rows)
+            self.assertEqual(bands[0][0], 0)
+            self.assertEqual(bands[-1][1], rows)
+            for a, b in zip(bands[:-1], bands[1:]):
+                self.assertEqual(a[1], b[0])
+
+    def test_shared_pool(self):
+        # grids with the threaded backend do not each start a thread pool
+        a, b = ThreadedBackend(max_workers=4), ThreadedBackend(max_workers=4)
+        self.assertIs(a.pool, b.pool)
+        self.assertIsNot(a.pool, ThreadedBackend(max_workers=2).pool)
+
+    def test_numba_imported_lazily(self):
+        code = ("import sys; sys.path.append({d!r}); import capyle.ca; "
+                "print('numba' in sys.modules)").format(d=main_dir_loc)
+        out = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(out.split()[-1], b'False')
+
+#----------------------------------------------------------------------
+
+class TestConvolveCounts(unittest.TestCase):
+    def setUp(self):
+        self.config = CAConfig(TESTDESCRIPTIONS_PATH + '2dbasic.py')
+        self.config.states = 0, 1, 2
+        self.config.grid_dims = (20, 30)
+        self.config.initial_grid = np.random.randint(0, 3, (20, 30))
+        self.config.nhood_arr = np.ones((3, 3))
+        self.config.backend = 'convolve'
+
+    def test_count_tensor(self):
+        g = Grid2D(self.config, None)
+        counts = g.count_neighbours(g.get_neighbour_states())
+        self.assertEqual(counts.shape, (3, 20, 30))
+        self.assertEqual(counts.dtype, np.float64)
+        # every cell has 8 neighbours in some state
+        self.assertTrue(np.all(counts.sum(axis=0) == 8))
+
+    def test_count_arithmetic(self):
+        # differences of counts are negative rather than wrapping around,
+        # the same on every backend
+        for nhood in [np.ones((3, 3)), np.ones((5, 5)),
+                      np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]])]:
+            self.config.nhood_arr = nhood
+            differences = []
+            for backend in ['numpy', 'convolve']:
+                self.config.backend = backend
+                g = Grid2D(self.config, None)
+                counts = g.count_neighbours(g.get_neighbour_states())
+                differences.append(counts[1] - counts[0])
+            self.assertLess(differences[1].min(), 0)
+            self.assertTrue(np.array_equal(*differences))
+
+    def test_unlisted_states_not_counted(self):
+        # cells in a state that is not listed are not counted
+        self.config.initial_grid[5, 5] = 7
+        g = Grid2D(self.config, None)
+        counts = g.count_neighbours(g.get_neighbour_states())
+        self.assertEqual(counts[:, 4, 4].sum(), 7)
+
+    def test_weighted_counts(self):
+        # weighted neighbourhoods give the sum of the weights
+        self.config.nhood_arr = np.array([[2, 1, 2], [1, 1, 1], [2, 1, 2]])
+        self.config.wrap = True
+        g = Grid2D(self.config, None)
+        counts = g.count_neighbours(g.get_neighbour_states())
+        expected = brute_force_counts(g.grid, (0, 1, 2), self.config.nhood_arr)
+        self.assertTrue(np.array_equal(counts, expected))
+        self.assertTrue(np.all(counts.sum(axis=0) == 12))
+        # the same sums from every backend
+        for backend in ['numpy', 'threaded', 'numba']:
+            if backend == 'numba' and not numba_available():
+                continue
+            self.config.backend = backend
+            g = Grid2D(self.config, None)
+            other = g.count_neighbours(g.get_neighbour_states())
+            self.assertTrue(np.array_equal(np.stack(other), expected))
+
+#----------------------------------------------------------------------
+
+def brute_force_counts(grid, states, nhood_arr):
+    """Weighted neighbour counts of a wrapped grid, one roll per neighbour"""
+    nhood_arr = np.asarray(nhood_arr)
+    r = nhood_arr.shape[0] // 2
+    counts = np.zeros((len(states),) + grid.shape)
+    for i in range(-r, r+1):
+        for j in range(-r, r+1):
+            if (i, j) == (0, 0):
+                continue
+            neighbour = np.roll(grid, (-i, -j), axis=(0, 1))
+            for k, state in enumerate(states):
+                counts[k] += nhood_arr[i+r, j+r] * (neighbour == state)
+    return counts
+
+class TestLargeNeighbourhoods(unittest.TestCase):
+    def setUp(self):
+        self.config = CAConfig(TESTDESCRIPTIONS_PATH + '2dbasic.py')
+        self.config.states = 0, 1, 2
+        self.config.grid_dims = (24, 31)
+        self.config.initial_grid = np.random.randint(0, 3, (24, 31))
+        self.config.wrap = True
+
+    def test_radius_wrap(self):
+        self.config.nhood_arr = np.ones((5, 5))
+        g = Grid2D(self.config, None)
+        self.assertEqual(g.neighbourhood.radius, 2)
+        self.assertEqual(g.wrapping_grid.shape, (28, 35))
+        self.assertTrue(np.array_equal(g.wrapping_grid[:2, 2:-2],
+                                       g.grid[-2:]))
+        self.assertEqual(g.get_neighbour_states().shape, (24, 24, 31))
+
+    def test_grid_smaller_than_radius(self):
+        self.config.nhood_arr = np.ones((9, 9))
+        self.config.grid_dims = (3, 31)
+        self.assertRaises(ValueError, Grid2D, self.config, None)
+
+    def test_backends_match_brute_force(self):
+        nhood = np.random.randint(0, 3, (7, 7))
+        self.config.nhood_arr = nhood
+        expected = brute_force_counts(self.config.initial_grid,
+                                      self.config.states, nhood)
+        for name in ['numpy', 'threaded', 'numba', 'convolve']:
+            self.config.backend = name
+            g = Grid2D(self.config, None)
+            counts = g.count_neighbours(g.get_neighbour_states())
+            self.assertTrue(np.array_equal(np.array(list(counts)), expected))
+
+    def test_fft_matches_direct(self):
+        nhood = np.random.randint(0, 3, (11, 11))
+        self.config.nhood_arr = nhood
+        g = Grid2D(self.config, None)
+        states = self.config.states
+        fft = convolution_counts(g.wrapping_grid, states, nhood)
+        old = backends.FFT_MIN_NEIGHBOURS
+        backends.FFT_MIN_NEIGHBOURS = nhood.size
+        try:
+            direct = convolution_counts(g.wrapping_grid, states, nhood)
+        finally:
+            backends.FFT_MIN_NEIGHBOURS = old
+        self.assertEqual(fft.dtype, direct.dtype)
+        self.assertTrue(np.array_equal(fft, direct))
+
+    def test_fractional_weights(self):
+        nhood = np.full((5, 5), 0.5)
+        self.config.nhood_arr = nhood
+        g = Grid2D(self.config, None)
+        counts = g.count_neighbours(g.get_neighbour_states())
+        expected = brute_force_counts(g.grid, self.config.states, nhood)
+        self.assertTrue(np.allclose(counts, expected))
+
+#----------------------------------------------------------------------
+
+class TestBackendEquivalenceMeta(type):
+    def __new__(mcs, name, bases, dict):
+
+        def gen_test_equivalent(filename, backend_name, nhood, wrap):
+            def test(self):
+                if backend_name == 'numba' and not numba_available():
+                    self.skipTest("Numba is not installed")
+                description = load_description(filename)
+                # pick up the states the description sets
+                config = CAConfig(TESTDESCRIPTIONS_PATH + filename)
+                config.save()
+                config = description.setup([config.path])
+                config.fill_in_defaults()
+                if config.states is None:
+                    config.states = (0, 1)
+                config.grid_dims = (150, 90)
+                config.nhood_arr = nhood
+                config.wrap = wrap
+                config.initial_grid = np.random.randint(0, 2,
+                                                        config.grid_dims)
+
+                def transfunc(grid, ns, nc):
+                    # the descriptions are Life rules on the dead and
+                    # live counts
+                    return description.transition_func(grid, nc[:2])
+
+                grids = []
+                for b in ['numpy', backend_name]:
+                    config.backend = b
+                    g = Grid2D(config, transfunc)
+                    if b == 'threaded':
+                        # force several bands on any machine
+                        g.backend = ThreadedBackend(max_workers=4)
+                        g.backend.MIN_BAND_ROWS = 8
+                    grids.append(g)
+                reference, other = grids
+                for i in range(10):
+                    ns = [g.get_neighbour_states() for g in grids]
+                    self.assertTrue(np.array_equal(ns[0], ns[1]))
+                    nc = [g.count_neighbours(n) for g, n in zip(grids, ns)]
+                    self.assertEqual(len(nc[0]), len(nc[1]))
+                    for a, b in zip(*nc):
+                        self.assertTrue(np.array_equal(a, b))
+                    reference.step()
+                    other.step()
+                    self.assertTrue(np.array_equal(reference.grid, other.grid))
+            return test
+
+        nhoods = {'moore': np.ones((3, 3)),
+                  'vonneumann': np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]]),
+                  'weighted': np.array([[2, 1, 2], [1, 1, 1], [2, 1, 2]])}
+        for filename in DESCRIPTIONS_2D:
+            for backend_name in ['numba', 'threaded', 'convolve']:
+                for nhood_name, nhood in nhoods.items():
+                    for wrap in [True, False]:
+                        testname = "test_{f}_{b}_{n}_{w}".format(
+                            f=filename[:-3], b=backend_name, n=nhood_name,
+                            w="wrap" if wrap else "nowrap")
+                        dict[testname] = gen_test_equivalent(
+                            filename, backend_name, nhood, wrap)
+        return type.__new__(mcs, name, bases, dict)
+
+class TestBackendEquivalence(unittest.TestCase,
+                             metaclass=TestBackendEquivalenceMeta):
+    pass
+
+if __name__ == '__main__':
+    unittest.main()
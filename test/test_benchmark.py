@@ -0,0 +1,78 @@
+import sys, os, inspect, unittest, tempfile, shutil
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from capyle.benchmark import (BENCHMARKS, benchmark_key, compare, load_results,
+                              run_benchmarks, save_results)
+from capyle.cli import parse_args, run_benchmarks_headless
+
+class TestBenchmarks(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # small enough to run quickly, the timings are not checked
+        cls.results = run_benchmarks(sizes=[20, 30], states=[2, 3],
+                                     generations=[3], repeat=1)
+
+    def test_keys(self):
+        self.assertIn('grid2d_step[size=30,states=3,generations=3]',
+                      self.results)
+        self.assertIn('refresh_wrap[size=20]', self.results)
+        self.assertIn('ff_2d[generations=3]', self.results)
+        # each combination of the parameters a benchmark depends on
+        names = [result['name'] for result in self.results.values()]
+        self.assertEqual(names.count('grid2d_step'), 4)
+        self.assertEqual(names.count('refresh_wrap'), 2)
+        self.assertEqual(names.count('wolframs_1d'), 1)
+        self.assertEqual(set(names), set(BENCHMARKS))
+
+    def test_results(self):
+        for key, result in self.results.items():
+            self.assertGreater(result['seconds'], 0, key)
+            self.assertGreater(result['cells_per_second'], 0, key)
+            self.assertGreaterEqual(result['peak_memory'], 0, key)
+
+    def test_compare(self):
+        key = benchmark_key('grid2d_step',
+                            {'size': 20, 'states': 2, 'generations': 3})
+        baseline = {k: dict(result) for k, result in self.results.items()}
+        self.assertEqual(compare(self.results, baseline), [])
+        baseline[key]['cells_per_second'] *= 1.5
+        baseline[key]['peak_memory'] /= 1.5
+        regressions = compare(self.results, baseline)
+        self.assertEqual([(k, m) for k, m, b, a in regressions],
+                         [(key, 'cells_per_second'), (key, 'peak_memory')])
+        # within the tolerance
+        self.assertEqual(compare(self.results, baseline, tolerance=0.6), [])
+        # benchmarks missing from the baseline are skipped
+        self.assertEqual(compare(self.results, {}), [])
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, run_benchmarks, ['notabenchmark'])
+
+class TestBenchmarkCommand(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'baseline.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def bench(self, *args):
+        options = parse_args(['bench', '--only', 'refresh_wrap', '--sizes',
+                              '20', '-r', '1'] + list(args))
+        return run_benchmarks_headless(options)
+
+    def test_baseline(self):
+        self.assertEqual(self.bench('-o', self.path), 0)
+        baseline = load_results(self.path)
+        self.assertEqual(list(baseline), ['refresh_wrap[size=20]'])
+        baseline['refresh_wrap[size=20]']['cells_per_second'] *= 100
+        save_results(baseline, self.path)
+        self.assertEqual(self.bench('--baseline', self.path), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+import sys, inspect, unittest
+import numpy as np
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from capyle.ca import DeltaTimeline
+from capyle.guicomponents import _CAGraph, _FrameCache
+
+COLORS = [(1, 0, 0), (0, 1, 0), (0, 0, 1)]
+RED, GREEN, BLUE, BLACK = ([255, 0, 0, 255], [0, 255, 0, 255],
+                           [0, 0, 255, 255], [0, 0, 0, 255])
+
+class TestFrameCache(unittest.TestCase):
+    def setUp(self):
+        self.rendered = []
+        self.cache = _FrameCache(self.render, max_bytes=3 * 800)
+
+    def render(self, key):
+        self.rendered.append(key)
+        return np.full(100, key, dtype=np.int64)
+
+    def test_get(self):
+        self.assertEqual(self.cache.get(1)[0], 1)
+        self.assertEqual(self.cache.get(1)[0], 1)
+        self.assertEqual(self.rendered, [1])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_lru(self):
+        for key in [1, 2, 3]:
+            self.cache.get(key)
+        self.cache.get(1)
+        # over budget, 2 is the least recently used
+        self.cache.get(4)
+        self.assertEqual(len(self.cache), 3)
+        self.assertEqual(self.cache.nbytes, 3 * 800)
+        self.assertNotIn(2, self.cache)
+        for key in [1, 3, 4]:
+            self.assertIn(key, self.cache)
+
+    def test_too_large(self):
+        cache = _FrameCache(self.render, max_bytes=100)
+        self.assertEqual(cache.get(1)[0], 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_prefetch(self):
+        self.cache.get(1)
+        self.cache.prefetch([1, 2, 3])
+        self.cache.wait(10)
+        self.assertEqual(sorted(self.rendered), [1, 2, 3])
+        self.cache.get(3)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_stale(self):
+        cache = _FrameCache(lambda key: None)
+        cache.prefetch([1])
+        cache.wait(10)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(len(cache), 0)
+
+class TestCAGraph(unittest.TestCase):
+    def test_rgba(self):
+        graph = _CAGraph(np.zeros((4, 5)), (0, 1, 2))
+        graph.set_colormap(COLORS)
+        grid = np.array([[0, 1, 2, 7]], dtype=np.uint8)
+        self.assertTrue(np.array_equal(graph.rgba(grid),
+                                       [[RED, GREEN, BLUE, BLACK]]))
+        # other dtypes and unknown states are looked up by state index
+        grid = np.array([[2.0, 0.0, 0.5]])
+        self.assertTrue(np.array_equal(graph.rgba(grid),
+                                       [[BLUE, RED, BLACK]]))
+
+    def test_states(self):
+        graph = _CAGraph(np.zeros((3, 3)), (-1, 3, 8))
+        self.assertFalse(graph.direct)
+        # gray scale until the colours are set
+        grid = np.array([[-1, 8]])
+        self.assertTrue(np.array_equal(graph.rgba(grid),
+                                       [[BLACK, [255, 255, 255, 255]]]))
+        graph.set_colormap(COLORS)
+        grid = np.array([[8, 3, -1]])
+        self.assertTrue(np.array_equal(graph.rgba(grid), [[BLUE, GREEN, RED]]))
+
+    def check_blit(self, shape):
+        timeline = np.random.default_rng(0).integers(
+            0, 3, (4,) + shape).astype(np.uint8)
+        graph = _CAGraph(timeline, (0, 1, 2), sequence=True)
+        canvas = FigureCanvasAgg(graph.fig)
+        graph.set_colormap(COLORS)
+        self.assertTrue(graph.drawn)
+        for i in range(len(timeline)):
+            graph.update(i)
+            graph.blit()
+            blitted = np.asarray(canvas.buffer_rgba()).copy()
+            # the same pixels as drawing the whole figure
+            graph.refresh()
+            self.assertTrue(np.array_equal(
+                blitted, np.asarray(canvas.buffer_rgba())))
+
+    def test_blit(self):
+        self.check_blit((10, 10))
+
+    def test_blit_uneven(self):
+        self.check_blit((37, 91))
+        self.check_blit((300, 200))
+
+    def test_cache(self):
+        timeline = np.random.default_rng(0).integers(
+            0, 3, (20, 30, 30)).astype(np.uint8)
+        graph = _CAGraph(timeline, (0, 1, 2), sequence=True)
+        canvas = FigureCanvasAgg(graph.fig)
+        graph.set_colormap(COLORS)
+        for i in range(10):
+            graph.update(i)
+            graph.blit()
+        graph.cache.wait(10)
+        # frames ahead were prefetched
+        self.assertIn(graph.frame_key(19), graph.cache)
+        # scrubbing back over the frames shown draws them from the cache
+        misses = graph.cache.misses
+        for i in range(19, -1, -1):
+            graph.update(i)
+            graph.blit()
+        self.assertEqual(graph.cache.misses, misses)
+        # new colours are never drawn from frames cached for the old ones
+        graph.set_colormap(COLORS[::-1])
+        graph.update(5)
+        graph.blit()
+        blitted = np.asarray(canvas.buffer_rgba()).copy()
+        graph.refresh()
+        self.assertTrue(np.array_equal(blitted,
+                                       np.asarray(canvas.buffer_rgba())))
+
+    def check_frames(self, graph, canvas, indices):
+        for i in indices:
+            graph.update(i)
+            graph.blit()
+            blitted = np.asarray(canvas.buffer_rgba()).copy()
+            graph.refresh()
+            self.assertTrue(np.array_equal(
+                blitted, np.asarray(canvas.buffer_rgba())))
+
+    def test_set_timeline(self):
+        rng = np.random.default_rng(0)
+        timeline = rng.integers(0, 3, (6, 20, 20)).astype(np.uint8)
+        graph = _CAGraph(timeline[:3], (0, 1, 2), sequence=True)
+        canvas = FigureCanvasAgg(graph.fig)
+        graph.set_colormap(COLORS)
+        self.check_frames(graph, canvas, range(3))
+        # more frames of the same run keep the frames cached
+        graph.set_timeline(timeline, extend=True)
+        misses = graph.cache.misses
+        self.check_frames(graph, canvas, range(3))
+        self.assertEqual(graph.cache.misses, misses)
+        self.check_frames(graph, canvas, range(3, 6))
+        # another timeline is never drawn from the frames of the old one
+        graph.set_timeline(rng.integers(0, 3, (6, 20, 20)).astype(np.uint8))
+        self.check_frames(graph, canvas, range(6))
+
+    def test_prefetch_delta_timeline(self):
+        frames = np.random.default_rng(0).integers(
+            0, 3, (40, 30, 30)).astype(np.uint8)
+        timeline = DeltaTimeline(len(frames), frames.shape[1:], np.uint8,
+                                 keyframe_interval=8)
+        for i, frame in enumerate(frames):
+            timeline[i] = frame
+        graph = _CAGraph(timeline, (0, 1, 2), sequence=True)
+        canvas = FigureCanvasAgg(graph.fig)
+        graph.set_colormap(COLORS)
+        # frames rebuilt on the prefetch thread while playback rebuilds
+        # others, each frame drawn as the frame it is
+        for i in list(range(len(frames))) + list(range(len(frames)))[::-3]:
+            graph.update(i)
+            graph.blit()
+            self.assertTrue(np.array_equal(graph.current(), frames[i]))
+        graph.cache.wait(10)
+        for i in range(len(frames)):
+            self.assertTrue(np.array_equal(
+                graph.cache.get(graph.frame_key(i)),
+                graph.render(frames[i], graph.palette[1], graph.pixels)))
+
+    def test_external_draw(self):
+        timeline = np.random.default_rng(0).integers(
+            0, 3, (5, 20, 20)).astype(np.uint8)
+        graph = _CAGraph(timeline, (0, 1, 2), sequence=True)
+        canvas = FigureCanvasAgg(graph.fig)
+        graph.set_colormap(COLORS)
+        graph.update(3)
+        graph.blit()
+        # eg. the window being resized, the frame shown is drawn
+        canvas.draw()
+        drawn = np.asarray(canvas.buffer_rgba()).copy()
+        graph.refresh()
+        self.assertTrue(np.array_equal(drawn,
+                                       np.asarray(canvas.buffer_rgba())))
+
+if __name__ == '__main__':
+    unittest.main()
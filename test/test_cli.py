@@ -0,0 +1,103 @@
+import sys, os, io, inspect, unittest, tempfile, shutil, json, subprocess
+import queue
+import numpy as np
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from capyle.ca import (REPORTERS, get_reporter, set_progress_queue,
+                       drain_progress)
+from capyle.cli import parse_args, run_headless
+
+FF_2D = main_dir_loc + 'ca_descriptions/ff_2d.py'
+
+class TestReporters(unittest.TestCase):
+    def test_registered(self):
+        for name in ['none', 'stderr', 'log', 'window']:
+            self.assertIn(name, REPORTERS)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, get_reporter, 'notareporter', 10)
+
+    def test_stderr(self):
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            progress = get_reporter('stderr', 10)
+            progress.set(5)
+            progress.set(10)
+            out = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertIn('5/10', out)
+        self.assertTrue(out.endswith('10/10\n'))
+
+    def test_queue(self):
+        events = queue.Queue()
+        set_progress_queue(events)
+        try:
+            progress = get_reporter('queue', 100, 50)
+            for i in range(1, 101):
+                progress.set(i)
+        finally:
+            set_progress_queue(None)
+        received = []
+        last = drain_progress(events, received.append)
+        # updates are throttled, but the final event is always sent
+        self.assertLess(len(received), 100)
+        self.assertIs(last, received[-1])
+        self.assertEqual((last.generation, last.total), (100, 100))
+        self.assertIsNone(drain_progress(events, received.append))
+
+    def test_event(self):
+        progress = get_reporter('none', 10, 100)
+        progress.start -= 1.0
+        event = progress.event(5)
+        self.assertEqual(event.generation, 5)
+        self.assertGreater(event.cells_per_second, 0)
+        self.assertAlmostEqual(event.eta, event.elapsed, places=2)
+
+class TestHeadlessRun(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_timeline_and_summary(self):
+        output = os.path.join(self.dir, 'timeline.npy')
+        summary = os.path.join(self.dir, 'summary.json')
+        options = parse_args(['run', FF_2D, '-i', '-e', '1', '-g', '5',
+                              '--progress', 'none', '-o', output,
+                              '-s', summary])
+        self.assertEqual(run_headless(options), 0)
+        timeline = np.load(output)
+        self.assertEqual(timeline.shape, (6, 102, 102))
+        with open(summary) as f:
+            stats = json.load(f)
+        self.assertEqual(stats['generations'], 5)
+        self.assertEqual(len(stats['state_counts']), 6)
+        self.assertEqual(sum(stats['final_state_counts'].values()),
+                         102 * 102)
+
+    def test_no_tkinter(self):
+        # run as a separate interpreter, the test runner may have
+        # imported tkinter already
+        code = ("import sys\n"
+                "from capyle.cli import main\n"
+                "try:\n"
+                "    main(['run', {path!r}, '-i', '-e', '1', '-g', '2',\n"
+                "          '--progress', 'none', '-s', {out!r}])\n"
+                "except SystemExit as e:\n"
+                "    assert e.code == 0\n"
+                "assert 'tkinter' not in sys.modules\n").format(
+                    path=FF_2D, out=os.path.join(self.dir, 'summary.json'))
+        result = subprocess.run([sys.executable, '-c', code], cwd=main_dir_loc,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.assertEqual(result.returncode, 0, result.stderr.decode())
+
+if __name__ == '__main__':
+    unittest.main()
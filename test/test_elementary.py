@@ -0,0 +1,103 @@
+import sys, inspect, unittest
+import numpy as np
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from capyle.ca import (Grid1D, Elementary1D, CAConfig, as_frames, pack_row,
+                       unpack_rows)
+from capyle.runner import load_description
+from capyle.utils import gens_to_dims, int_to_binary
+
+WOLFRAMS_1D = main_dir_loc + 'ca_descriptions/wolframs_1d.py'
+
+class TestPacking(unittest.TestCase):
+    def test_roundtrip(self):
+        for width in [1, 63, 64, 65, 200]:
+            row = np.random.randint(0, 2, width)
+            words = pack_row(row)
+            self.assertEqual(len(words), -(-width // 64))
+            self.assertTrue(np.array_equal(unpack_rows(words, width)[0], row))
+
+    def test_bit_order(self):
+        row = np.zeros(70)
+        row[[0, 65]] = 1
+        self.assertEqual(list(pack_row(row)), [1, 2])
+
+#----------------------------------------------------------------------
+
+class TestElementaryMeta(type):
+    def __new__(mcs, name, bases, dict):
+        def gen_test(rule, wrap, generations, nhood):
+            def test(self):
+                config = self.config(rule, wrap, generations, nhood)
+                rulebool = int_to_binary(rule) * True
+                expected = Grid1D(config, (self.transition_function,
+                                           rulebool)).run()
+                timeline = Elementary1D(config).run()
+                self.assertEqual(timeline.shape, expected.shape)
+                self.assertTrue(np.array_equal(as_frames(timeline), expected))
+            return test
+
+        for rule in [30, 90, 110, 184]:
+            for wrap in [True, False]:
+                for generations in [31, 32, 40]:
+                    testname = "test_rule_{r}_{w}_{g}".format(
+                        r=rule, w=wrap, g=generations)
+                    dict[testname] = gen_test(rule, wrap, generations,
+                                              [1, 1, 1])
+        dict['test_no_left'] = gen_test(30, True, 20, [0, 1, 1])
+        dict['test_no_right'] = gen_test(110, True, 20, [1, 1, 0])
+        return type.__new__(mcs, name, bases, dict)
+
+class TestElementary(unittest.TestCase, metaclass=TestElementaryMeta):
+    transition_function = staticmethod(
+        load_description(WOLFRAMS_1D).transition_function)
+
+    def config(self, rule, wrap, generations, nhood):
+        config = CAConfig(WOLFRAMS_1D)
+        config.states = (0, 1)
+        config.rule_num = rule
+        config.wrap = wrap
+        config.num_generations = generations
+        config.grid_dims = gens_to_dims(generations)
+        config.nhood_arr = np.array(nhood)
+        config.progress = 'none'
+        initial_grid = np.zeros(config.grid_dims)
+        initial_grid[0] = np.random.randint(0, 2, config.grid_dims[1])
+        config.initial_grid = initial_grid
+        return config
+
+    def test_supports(self):
+        config = self.config(30, True, 10, [1, 1, 1])
+        self.assertTrue(Elementary1D.supports(config))
+        config.states = (0, 1, 2)
+        self.assertFalse(Elementary1D.supports(config))
+        self.assertRaises(ValueError, Elementary1D, config)
+
+    def test_wide(self):
+        config = self.config(30, True, 50, [1, 1, 1])
+        config.grid_dims = (51, 100000)
+        config.initial_grid = None
+        timeline = Elementary1D(config).run()
+        self.assertEqual(timeline.shape, (51, 51, 100000))
+        self.assertEqual(timeline.nbytes, 51 * (100000 // 64 + 1) * 8)
+        self.assertEqual(timeline.rows().shape, (51, 100000))
+
+    def test_early_stop(self):
+        # rule 4 keeps only isolated cells, a full row dies out at once
+        config = self.config(4, True, 30, [1, 1, 1])
+        config.initial_grid[0, :] = 1
+        config.stop_on_steady = True
+        engine = Elementary1D(config)
+        timeline = engine.run()
+        self.assertEqual(engine.stopped_at, 2)
+        self.assertEqual(len(timeline), 3)
+        self.assertEqual(timeline.rows()[1:].sum(), 0)
+        self.assertEqual(timeline[0].shape, (31, 61))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import sys, os, inspect, unittest, tempfile, shutil
+import numpy as np
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from capyle.ca import CAConfig
+from capyle.ensemble import (replica_seeds, replica_summary, run_ensemble,
+                             EnsembleResult)
+
+# fire (1) spreads to each unburnt neighbour with probability 0.5, the
+# target (2) is in the corner
+DESCRIPTION = '''# Name: Ensemble test
+# Dimensions: 2
+import sys
+import numpy as np
+from capyle.ca import Grid2D
+import capyle.utils as utils
+
+RNG = np.random.default_rng()
+
+def transition_func(grid, neighbourstates, neighbourcounts):
+    spread = ((neighbourcounts[1] > 0) & (grid != 1) &
+              (RNG.random(grid.shape) < 0.5))
+    grid[spread] = 1
+    return grid
+
+def setup(args):
+    global RNG
+    config = utils.load(args[0])
+    RNG = np.random.default_rng(config.seed)
+    config.states = (0, 1, 2)
+    config.num_generations = 6
+    config.grid_dims = (9, 9)
+    config.wrap = 0
+    config.nhood_arr = np.ones((3, 3))
+    config.initial_grid = np.zeros((9, 9))
+    config.initial_grid[4, 4] = 1
+    config.initial_grid[0, 0] = 2
+    if len(args) == 2:
+        config.save()
+        sys.exit()
+    return config
+'''
+
+class TestReplicaSummary(unittest.TestCase):
+    def test_summary(self):
+        timeline = np.zeros((4, 2, 3), dtype=int)
+        timeline[0, 0, 2] = 5
+        timeline[1:, 0, 0] = 6
+        timeline[3, 0, 2] = 6
+        ignition_time, hit_time = replica_summary(timeline, 6, 5)
+        self.assertTrue(np.array_equal(ignition_time,
+                                       [[1, -1, 3], [-1, -1, -1]]))
+        self.assertEqual(hit_time, 3)
+        _, hit_time = replica_summary(timeline[:3], 6, 5)
+        self.assertEqual(hit_time, -1)
+
+    def test_result(self):
+        result = EnsembleResult()
+        result.add(1, np.array([[0, 2], [-1, -1]]), 2, 3)
+        result.add(2, np.array([[0, -1], [-1, 1]]), -1, 3)
+        self.assertTrue(np.array_equal(result.burn_probability,
+                                       [[1, 0.5], [0, 0.5]]))
+        self.assertTrue(np.array_equal(result.mean_ignition_time,
+                                       [[0, 2], [np.nan, 1]],
+                                       equal_nan=True))
+        self.assertEqual(result.target_hit_probability, 0.5)
+        self.assertEqual(list(result.target_hit_time_counts()), [0, 0, 1])
+
+    def test_seeds(self):
+        self.assertEqual(replica_seeds(7, 5), replica_seeds(7, 5))
+        self.assertEqual(len(set(replica_seeds(7, 100))), 100)
+
+class TestEnsemble(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.dir, 'spread.py')
+        with open(self.filepath, 'w') as f:
+            f.write(DESCRIPTION)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def ensemble(self, **kwargs):
+        config = CAConfig(self.filepath)
+        config.path = os.path.join(self.dir, 'config.pkl')
+        return run_ensemble(config, 12, 1, target_state=2, **kwargs)
+
+    def test_reproducible(self):
+        a = self.ensemble(seed=3, jobs=1)
+        b = self.ensemble(seed=3, jobs=2)
+        self.assertEqual(a.num_replicas, 12)
+        self.assertEqual(a.seeds, b.seeds)
+        self.assertTrue(np.array_equal(a.ignition_time_counts,
+                                       b.ignition_time_counts))
+        self.assertEqual(a.target_hit_times, b.target_hit_times)
+        # the replicas differ from each other
+        self.assertTrue(np.any((a.burn_probability > 0) &
+                               (a.burn_probability < 1)))
+        # the fire starts in the center
+        self.assertEqual(a.burn_probability[4, 4], 1)
+
+    def test_save(self):
+        result = self.ensemble(seed=1, jobs=1)
+        path = os.path.join(self.dir, 'ensemble.npz')
+        result.save(path)
+        saved = np.load(path)
+        self.assertTrue(np.array_equal(saved['burn_counts'],
+                                       result.burn_counts))
+        self.assertEqual(saved['ignition_time_counts'].shape, (7, 9, 9))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import sys, inspect, unittest
+import numpy as np
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from capyle.runner import load_description, run_file
+from capyle.sweep import configuration_options
+
+FF_2D = main_dir_loc + 'ca_descriptions/ff_2d.py'
+CHAPARRAL, LAKE, FOREST, SCRUBLAND, BURNT, TOWN, FIRE = range(7)
+THRESHOLDS = {CHAPARRAL: 2, FOREST: 3, SCRUBLAND: 1, TOWN: 1}
+
+def baseline_step(grid):
+    """The deterministic phase of the original ff_2d transition function,
+    scanning the cells one at a time"""
+    cells_to_burn = []
+    for x in range(1, grid.shape[0] - 1):
+        for y in range(1, grid.shape[1] - 1):
+            state = grid[x][y]
+            if state in THRESHOLDS:
+                fire_neighbours = np.count_nonzero(
+                    grid[x-1:x+2, y-1:y+2] == FIRE)
+                if fire_neighbours >= THRESHOLDS[state]:
+                    cells_to_burn.append((x, y))
+    grid = grid.copy()
+    for x, y in cells_to_burn:
+        grid[x][y] = FIRE
+    return grid
+
+class TestIgnition(unittest.TestCase):
+    def test_matches_baseline(self):
+        for params in [{'incin': True, 'f_ext': 1},
+                       {'incin': True, 'pp': True}]:
+            options = configuration_options(params)
+            config, timeline = run_file(
+                FF_2D, options, {'num_generations': 20, 'progress': 'none'})
+            self.assertEqual(len(timeline), 21)
+            # without wind each generation is deterministic
+            for i in range(20):
+                self.assertTrue(np.array_equal(baseline_step(timeline[i]),
+                                               timeline[i + 1]))
+            self.assertGreater(np.count_nonzero(timeline[-1] == FIRE),
+                               np.count_nonzero(timeline[0] == FIRE))
+
+class TestWindKernel(unittest.TestCase):
+    def setUp(self):
+        self.ff = load_description(FF_2D)
+        self.ff.GRID_SIZE = 102
+        self.ff.WIND_DIR = 'S'
+        self.ff.WIND_SPEED = 2
+        self.ff.WIND_KERNEL = self.ff.wind_kernel()
+        self.ff.WIND_REACH = self.ff.wind_reach()
+        self.in_bounds = self.ff.in_bounds_layer()
+        self.grid = np.full((102, 102), CHAPARRAL)
+
+    def apply(self, cells, seed=0):
+        self.ff.RNG = np.random.default_rng(seed)
+        return self.ff.apply_wind_kernel(self.grid, np.array(cells),
+                                         self.in_bounds)
+
+    def test_reach(self):
+        # chaparral (3) plus the south wind (2) carries fire 4 cells south
+        # of the cell and not in the other directions
+        cells = self.apply([[50, 50]])
+        self.assertGreater(len(cells), 0)
+        rows, cols = cells[:, 0] - 50, cells[:, 1] - 50
+        self.assertTrue(np.all((rows >= 1) & (rows <= 4)))
+        self.assertTrue(np.all(np.abs(cols) <= rows))
+        self.assertTrue(np.array_equal(self.apply([[50, 50]]), cells))
+        # forest (1) plus the wind is too little to carry fire
+        self.grid[51, 50] = FOREST
+        self.assertEqual(len(self.apply([[50, 50]])), 0)
+
+    def test_unburnable_targets(self):
+        self.grid[52:55, 45:56] = LAKE
+        self.grid[53, 50] = BURNT
+        for seed in range(10):
+            for x, y in self.apply([[50, 50]], seed):
+                self.assertEqual(self.grid[x, y], CHAPARRAL)
+
+    def test_bounds(self):
+        # cells near the edge never carry fire past it
+        edge = [[3, 50], [98, 50], [50, 2], [50, 99], [100, 100]]
+        self.assertEqual(len(self.apply(edge)), 0)
+        cells = self.apply(edge + [[95, 50]])
+        self.assertGreater(len(cells), 0)
+        self.assertTrue(np.all(cells < 102))
+        # with no cells ignited the grid is not read
+        self.assertEqual(len(self.ff.apply_wind_kernel(
+            None, np.empty((0, 2), dtype=int), self.in_bounds)), 0)
+
+if __name__ == '__main__':
+    unittest.main()
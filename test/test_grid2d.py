@@ -1,4 +1,4 @@
-import sys, inspect, unittest
+import sys, copy, inspect, unittest
 import numpy as np
 this_file_loc = (inspect.stack()[0][1])
 main_dir_loc = this_file_loc[:this_file_loc.index('test')]
@@ -7,7 +7,7 @@ sys.path.append(main_dir_loc + 'capyle')
 sys.path.append(main_dir_loc + 'capyle/ca')
 sys.path.append(main_dir_loc + 'capyle/guicomponents')
 
-from capyle.ca import Grid2D, Neighbourhood, CAConfig
+from capyle.ca import Grid2D, Neighbourhood, CAConfig, NeighbourViews
 
 #----------------------------------------------------------------------
 
@@ -155,5 +155,223 @@ class TestInitialGridSetMeta(type):
 class TestInitialGridSet(unittest.TestCase, metaclass=TestInitialGridSetMeta):
     pass
 
+#----------------------------------------------------------------------
+
+class TestNeighbourViews(unittest.TestCase):
+    def setUp(self):
+        self.config = CAConfig('test/testdescriptions/2dbasic.py')
+        self.config.states = 0,1,2
+        self.config.grid_dims = (12, 17)
+        self.config.initial_grid = np.random.randint(0, 3, (12, 17))
+
+    def transfunc(self, grid, neighbourcounts):
+        return grid
+
+    def case(self, nhood):
+        self.config.nhood_arr = nhood
+        g = Grid2D(self.config, self.transfunc)
+        copies = g.get_neighbour_states(views=False)
+        views = g.get_neighbour_states(views=True)
+        self.assertIsInstance(views, NeighbourViews)
+        self.assertEqual(len(views), 8)
+        self.assertEqual(views.shape, copies.shape)
+        self.assertTrue(np.array_equal(np.asarray(views), copies))
+        # unpacking in the order NW N NE, W E, SW S SE
+        nw, n, ne, w, e, sw, s, se = views
+        self.assertTrue(np.array_equal(se, copies[7]))
+        counts_views = g.count_neighbours(views)
+        counts_copies = g.count_neighbours(copies)
+        for a, b in zip(counts_views, counts_copies):
+            self.assertTrue(np.array_equal(a, b))
+
+    def test_moore(self):
+        self.case(np.ones((3, 3)))
+
+    def test_vonneumann(self):
+        self.case(np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]]))
+
+    def test_weighted(self):
+        self.case(np.array([[2, 1, 0], [1, 1, 1], [0, 1, 2]]))
+
+    def test_readonly_views(self):
+        self.config.nhood_arr = np.ones((3, 3))
+        g = Grid2D(self.config, self.transfunc)
+        views = g.get_neighbour_states(views=True)
+        self.assertTrue(np.shares_memory(views[0], g.wrapping_grid))
+        self.assertFalse(views[0].flags.writeable)
+
+    def test_config_option(self):
+        self.config.nhood_arr = np.ones((3, 3))
+        self.config.neighbour_views = True
+        g = Grid2D(self.config, self.transfunc)
+        self.assertIsInstance(g.get_neighbour_states(), NeighbourViews)
+
+#----------------------------------------------------------------------
+
+class TestSparse(unittest.TestCase):
+    def setUp(self):
+        self.config = CAConfig('test/testdescriptions/2dbasic.py')
+        self.config.states = 0, 1
+        self.config.grid_dims = (30, 40)
+        initial_grid = np.zeros((30, 40))
+        # a glider and a blinker across the wrap
+        initial_grid[1:4, 1:4] = [[0, 1, 0], [0, 0, 1], [1, 1, 1]]
+        initial_grid[29, 20] = initial_grid[0, 20] = initial_grid[1, 20] = 1
+        self.config.initial_grid = initial_grid
+
+    @staticmethod
+    def transfunc(grid, neighbourstates, neighbourcounts):
+        live = neighbourcounts[1]
+        born = (live == 3) & (grid == 0)
+        survive = ((live == 2) | (live == 3)) & (grid == 1)
+        grid[:, :] = 0
+        grid[born | survive] = 1
+        return grid
+
+    def case(self, nhood, wrap):
+        self.config.nhood_arr = nhood
+        self.config.wrap = wrap
+        dense = Grid2D(self.config, self.transfunc)
+        # the grids read the config each step, each needs its own
+        self.config = copy.deepcopy(self.config)
+        self.config.sparse = True
+        sparse = Grid2D(self.config, self.transfunc)
+        for i in range(40):
+            dense.step()
+            sparse.step()
+            self.assertTrue(np.array_equal(dense.grid, sparse.grid), i)
+        self.assertEqual(sparse.iterations, 40)
+        return sparse
+
+    def test_moore(self):
+        for wrap in [True, False, 0]:
+            self.case(np.ones((3, 3)), wrap)
+
+    def test_vonneumann(self):
+        self.case(np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]]), True)
+
+    def test_large_neighbourhood(self):
+        self.case(np.ones((5, 5)), True)
+
+    def test_weighted(self):
+        # neighbours are counted by their weight, as step does
+        for wrap in [True, False]:
+            self.case(np.array([[2, 1, 2], [1, 1, 1], [2, 1, 2]]), wrap)
+
+    def test_active_cells(self):
+        sparse = self.case(np.ones((3, 3)), True)
+        # only cells around the glider and blinker are updated
+        self.assertLess(len(sparse.active), 50)
+        sparse.set_grid(np.zeros((30, 40)))
+        self.assertIsNone(sparse.active)
+        sparse.step()
+        self.assertEqual(len(sparse.active), 0)
+
+#----------------------------------------------------------------------
+
+class TestStaticLayers(unittest.TestCase):
+    def setUp(self):
+        TestSparse.setUp(self)
+        self.config.nhood_arr = np.ones((3, 3))
+        self.seen = []
+
+    def transfunc(self, grid, neighbourstates, neighbourcounts, layers=None):
+        self.seen.append(layers)
+        # only cells in the left half come alive
+        grid = TestSparse.transfunc(grid, neighbourstates, neighbourcounts)
+        grid[~layers['left']] = 0
+        return grid
+
+    def test_layers(self):
+        self.config.static_layers = {'left': lambda grid: np.arange(
+            grid.shape[1]) < 20}
+        g = Grid2D(self.config, self.transfunc)
+        left = g.static_layers['left']
+        self.assertEqual(left.shape, (30, 40))
+        self.assertFalse(left.flags.writeable)
+        g.step()
+        g.step()
+        self.assertIs(self.seen[0]['left'], left)
+        self.assertEqual(g.grid[:, 20:].sum(), 0)
+        self.assertGreater(g.grid[:, :20].sum(), 0)
+
+    def test_sparse_layers(self):
+        left = np.zeros((30, 40), dtype=bool)
+        left[:, :20] = True
+        self.config.static_layers = {'left': left}
+        dense = Grid2D(self.config, self.transfunc)
+        # the grids read the config each step, each needs its own
+        self.config = copy.deepcopy(self.config)
+        self.config.sparse = True
+        sparse = Grid2D(self.config, self.transfunc)
+        for i in range(20):
+            dense.step()
+            sparse.step()
+            self.assertTrue(np.array_equal(dense.grid, sparse.grid), i)
+        self.assertEqual(self.seen[-1]['left'].shape[0], 1)
+
+    def test_no_layers(self):
+        g = Grid2D(self.config, TestSparse.transfunc)
+        g.step()
+        self.assertEqual(g.static_layers, {})
+
+#----------------------------------------------------------------------
+
+class TestLayers(unittest.TestCase):
+    def setUp(self):
+        TestSparse.setUp(self)
+        self.config.nhood_arr = np.ones((3, 3))
+
+    @staticmethod
+    def transfunc(grid, neighbourstates, neighbourcounts, layers):
+        grid = TestSparse.transfunc(grid, neighbourstates, neighbourcounts)
+        # the generations each cell has been alive for
+        age = layers['age']
+        age[grid == 1] += 1
+        age[grid == 0] = 0
+        return grid
+
+    def test_layers(self):
+        self.config.layers = {'age': {'dtype': np.uint16}}
+        g = Grid2D(self.config, self.transfunc)
+        age = g.layers['age']
+        self.assertEqual(age.dtype, np.uint16)
+        self.assertEqual(age.shape, (30, 40))
+        for i in range(4):
+            g.step()
+        self.assertIs(g.layers['age'], age)
+        # the blinker's center cell stays alive throughout
+        self.assertEqual(age[0, 20], 4)
+        self.assertTrue(np.all(age[g.grid == 0] == 0))
+
+    def test_layer_wrap(self):
+        g = Grid2D(self.config, self.transfunc)
+        g.add_layer('age', dtype=int, initial=lambda grid: grid * 5)
+        g.add_layer('padded', initial=2, wrap=-1)
+        left = g.layer_neighbours('age')[3]
+        self.assertTrue(np.array_equal(left[:, 1:], g.layers['age'][:, :-1]))
+        # wraps around like the grid
+        self.assertTrue(np.array_equal(left[:, 0], g.layers['age'][:, -1]))
+        self.assertTrue(np.all(g.layer_neighbours('padded')[3][:, 0] == -1))
+        self.assertRaises(ValueError, g.add_layer, 'age')
+
+    def test_sparse(self):
+        self.config.layers = {'age': {'dtype': int}}
+        dense = Grid2D(self.config, self.transfunc)
+        # the grids read the config each step, each needs its own
+        self.config = copy.deepcopy(self.config)
+        self.config.sparse = True
+        sparse = Grid2D(self.config, self.transfunc)
+        # a block is steady but keeps ageing
+        sparse.grid[20:22, 20:22] = dense.grid[20:22, 20:22] = 1
+        sparse.refresh_wrap()
+        dense.refresh_wrap()
+        for i in range(10):
+            dense.step()
+            sparse.step()
+            self.assertTrue(np.array_equal(dense.layers['age'],
+                                           sparse.layers['age']), i)
+        self.assertEqual(sparse.layers['age'][20, 20], 10)
+
 if __name__ == '__main__':
     unittest.main()
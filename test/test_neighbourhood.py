@@ -78,8 +78,9 @@ class TestNeighbourhood2DShapesMeta(type):
                         #if even dims and hence no center cell
                         dict[testname] = gen_test_valerr(arr)
                     else:
-                        #odd dimensions
-                        dict[testname] = gen_test_success(arr, (3,3))
+                        #odd dimensions, padded to a square of at least 3x3
+                        size = max(3, *shape)
+                        dict[testname] = gen_test_success(arr, (size,size))
             else:
                 #if supplied array is 1d
                 if shape == (0,):
@@ -91,7 +92,8 @@ class TestNeighbourhood2DShapesMeta(type):
                         dict[testname] = gen_test_valerr(arr)
                     else:
                         #else valid array shape
-                        dict[testname] = gen_test_success(arr, (3,3))
+                        size = max(3, shape[0])
+                        dict[testname] = gen_test_success(arr, (size,size))
         return type.__new__(mcs, name, bases, dict) 
 
 class TestNeighbourhood2DShapes(unittest.TestCase, metaclass=TestNeighbourhood2DShapesMeta):
@@ -0,0 +1,136 @@
+import sys, os, inspect, unittest, tempfile, shutil, json, io
+import numpy as np
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from capyle.ca import (Grid1D, Grid2D, Elementary1D, CAConfig, PHASES,
+                       Profiler, profile_path)
+from capyle.cli import parse_args, run_headless
+
+TESTDESCRIPTIONS_PATH = 'test/testdescriptions/'
+FF_2D = main_dir_loc + 'ca_descriptions/ff_2d.py'
+
+def life(grid, ns, nc):
+    live = nc[1]
+    born = (live == 3) & (grid == 0)
+    survive = ((live == 2) | (live == 3)) & (grid == 1)
+    grid[:, :] = 0
+    grid[born | survive] = 1
+    return grid
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.config = CAConfig(TESTDESCRIPTIONS_PATH + '2dbasic.py')
+        self.config.states = (0, 1)
+        self.config.grid_dims = (30, 40)
+        self.config.num_generations = 12
+        self.config.nhood_arr = np.ones((3, 3))
+        self.config.initial_grid = np.random.randint(0, 2, (30, 40))
+        self.config.progress = 'none'
+
+    def test_disabled(self):
+        grid = Grid2D(self.config, life)
+        grid.run()
+        self.assertIsNone(grid.profiler)
+        self.assertIsNone(self.config.profile_report)
+        self.assertNotIn('get_neighbour_states', vars(grid))
+
+    def test_time(self):
+        expected = Grid2D(self.config, life).run()
+        self.config.profile = 'time'
+        grid = Grid2D(self.config, life)
+        timeline = grid.run()
+        self.assertTrue(np.array_equal(timeline, expected))
+        report = self.config.profile_report
+        self.assertEqual(report['generations'], 12)
+        self.assertEqual(report['cells'], 30 * 40)
+        self.assertEqual(sorted(report['phases']), sorted(PHASES))
+        fractions = sum(p['fraction'] for p in report['phases'].values())
+        self.assertAlmostEqual(fractions, 1)
+        for phase in ['neighbour_states', 'count_neighbours', 'transition',
+                      'refresh_wrap', 'timeline']:
+            self.assertGreater(report['phases'][phase]['seconds'], 0, phase)
+            self.assertEqual(
+                len(report['per_generation']['phases'][phase]), 12)
+        self.assertNotIn('peak_allocated_bytes',
+                         report['phases']['transition'])
+        # the wrappers are removed after the run
+        self.assertNotIn('get_neighbour_states', vars(grid))
+        self.assertIs(grid.transition_func, life)
+        json.dumps(report)
+
+    def test_memory(self):
+        self.config.profile = 'memory'
+        Grid2D(self.config, life).run()
+        phases = self.config.profile_report['phases']
+        self.assertGreater(phases['neighbour_states']['peak_allocated_bytes'],
+                           0)
+
+    def test_early_stop(self):
+        self.config.initial_grid = np.zeros((30, 40))
+        self.config.stop_on_steady = True
+        self.config.profile = 'time'
+        grid = Grid2D(self.config, life)
+        grid.run()
+        self.assertEqual(self.config.profile_report['generations'],
+                         grid.stopped_at)
+
+    def test_1d(self):
+        config = CAConfig(TESTDESCRIPTIONS_PATH + '1dbasic.py')
+        config.states = (0, 1)
+        config.num_generations = 10
+        config.nhood_arr = np.array([1, 1, 1])
+        config.progress = 'none'
+        config.profile = 'time'
+        initial_grid = np.zeros((1, 21))
+        initial_grid[0, 10] = 1
+        config.initial_grid = initial_grid
+
+        def transition(grid, neighbourstates, neighbourcounts):
+            return neighbourcounts[1] == 1
+
+        Grid1D(config, transition).run()
+        phases = config.profile_report['phases']
+        self.assertGreater(phases['neighbour_states']['seconds'], 0)
+        self.assertGreater(phases['transition']['seconds'], 0)
+        config.rule_num = 90
+        Elementary1D(config).run()
+        phases = config.profile_report['phases']
+        self.assertEqual(config.profile_report['generations'], 10)
+        self.assertGreater(phases['transition']['seconds'], 0)
+
+    def test_invalid_mode(self):
+        self.assertRaises(ValueError, Profiler, 10, 100, 'cpu')
+
+class TestProfileCommand(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_report_saved(self):
+        output = os.path.join(self.dir, 'timeline.npy')
+        options = parse_args(['run', FF_2D, '-i', '-g', '5', '--progress',
+                              'none', '-o', output, '--profile', 'time'])
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            self.assertEqual(run_headless(options), 0)
+            out = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertIn('count_neighbours', out)
+        self.assertEqual(profile_path(output),
+                         os.path.join(self.dir, 'timeline.profile.json'))
+        with open(profile_path(output)) as f:
+            report = json.load(f)
+        self.assertEqual(report['generations'], 5)
+        self.assertEqual(report['cells'], 102 * 102)
+
+if __name__ == '__main__':
+    unittest.main()
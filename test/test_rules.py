@@ -0,0 +1,108 @@
+import sys, copy, inspect, unittest
+import numpy as np
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from capyle.ca import Grid2D, CAConfig, RuleTable
+
+def life(grid, neighbourstates, neighbourcounts):
+    live = neighbourcounts[1]
+    born = (live == 3) & (grid == 0)
+    survive = ((live == 2) | (live == 3)) & (grid == 1)
+    grid[:, :] = 0
+    grid[born | survive] = 1
+    return grid
+
+class TestRuleTable(unittest.TestCase):
+    def test_from_string(self):
+        rule = RuleTable.from_string("B3/S23")
+        table = rule.compile()
+        self.assertEqual(table.shape, (2, 9))
+        self.assertEqual(list(table[0]), [0, 0, 0, 1, 0, 0, 0, 0, 0])
+        self.assertEqual(list(table[1]), [0, 0, 1, 1, 0, 0, 0, 0, 0])
+        # highlife without the slash, in lower case
+        table = RuleTable.from_string("b36s23").compile()
+        self.assertEqual(list(np.nonzero(table[0])[0]), [3, 6])
+
+    def test_invalid_string(self):
+        for rule in ["B3/X23", "life", "S23/B3"]:
+            self.assertRaises(ValueError, RuleTable.from_string, rule)
+
+    def test_table(self):
+        rule = RuleTable((0, 1), {(0, (3,)): 1, (1, (2,)): 1, (1, (3,)): 1},
+                         count_states=(1,), default=0)
+        self.assertTrue(np.array_equal(
+            rule.compile(), RuleTable.from_string("B3/S23").compile()))
+        self.assertRaises(ValueError, RuleTable, (0, 1), {(0, (3, 1)): 1},
+                          count_states=(1,))
+        self.assertRaises(ValueError, RuleTable, (0, 1), count_states=(2,))
+
+    def test_apply(self):
+        # two counts, 0 becomes 2 with one neighbour in each of 1 and 2
+        rule = RuleTable((0, 1, 2), {(0, (1, 1)): 2}, count_states=(1, 2))
+        rule.compile(np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]]))
+        self.assertEqual(rule.max_count, 4)
+        grid = np.array([0, 0, 1, -100])
+        counts = [np.array([1, 0, 1, 1]), np.array([1, 1, 1, 1])]
+        self.assertEqual(list(rule.apply(grid, counts)), [2, 0, 1, -100])
+        # as a transition function, taking the counts of every state
+        new = rule(grid, None, [None] + counts)
+        self.assertEqual(list(new), [2, 0, 1, -100])
+        # counts from a larger neighbourhood than the table was compiled for
+        counts[0][0] = 5
+        self.assertRaises(ValueError, rule.apply, grid, counts)
+        self.assertRaises(ValueError, rule, grid, None, [None] + counts)
+
+    def test_compile_errors(self):
+        rule = RuleTable.from_string("B3/S23")
+        self.assertRaises(ValueError, rule.compile, np.full((3, 3), 0.5))
+        rule = RuleTable(tuple(range(10)))
+        self.assertRaises(ValueError, rule.compile, np.ones((5, 5)))
+
+class TestGridRule(unittest.TestCase):
+    def setUp(self):
+        self.config = CAConfig('test/testdescriptions/2dbasic.py')
+        self.config.states = 0, 1
+        self.config.grid_dims = (30, 40)
+        self.config.initial_grid = np.random.randint(0, 2, (30, 40))
+
+    def case(self, nhood, wrap, sparse=False):
+        self.config.nhood_arr = nhood
+        self.config.wrap = wrap
+        self.config.sparse = sparse
+        expected = Grid2D(self.config, life)
+        g = Grid2D(self.config, RuleTable.from_string("B3/S23"))
+        for i in range(20):
+            expected.step()
+            g.step()
+            self.assertTrue(np.array_equal(g.grid, expected.grid), i)
+        self.assertEqual(g.iterations, 20)
+
+    def test_life(self):
+        for wrap in [True, False]:
+            self.case(np.ones((3, 3)), wrap)
+
+    def test_sparse(self):
+        self.case(np.ones((3, 3)), True, sparse=True)
+
+    def test_large_neighbourhood(self):
+        # larger than life counts the weighted neighbours
+        self.config.nhood_arr = np.ones((5, 5))
+        rule = RuleTable.from_string("B34/S345")
+        g = Grid2D(self.config, rule)
+        self.assertEqual(rule.max_count, 24)
+        # the grids read the config each step, each needs its own
+        self.config = copy.deepcopy(self.config)
+        self.config.sparse = True
+        sparse = Grid2D(self.config, rule)
+        for i in range(10):
+            g.step()
+            sparse.step()
+            self.assertTrue(np.array_equal(g.grid, sparse.grid), i)
+
+if __name__ == '__main__':
+    unittest.main()
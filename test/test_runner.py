@@ -0,0 +1,191 @@
+import sys, os, time, inspect, unittest, tempfile, shutil
+import numpy as np
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from capyle.ca import CAConfig
+from capyle.utils import prerun_ca, run_ca
+from capyle.runner import (load_description, description_args, start_run,
+                           PRERUN, RUN)
+
+TESTDESCRIPTIONS_PATH = 'test/testdescriptions/'
+
+# a glider on a wrapped grid, run through the description's run hook
+DESCRIPTION = '''# Name: Runner test
+# Dimensions: 2
+import sys
+import numpy as np
+from capyle.ca import Grid2D
+import capyle.utils as utils
+
+SETUP_CALLS = 0
+
+def transition_func(grid, neighbourstates, neighbourcounts):
+    live = neighbourcounts[1]
+    birth = (live == 3) & (grid == 0)
+    survive = ((live == 2) | (live == 3)) & (grid == 1)
+    grid[:, :] = 0
+    grid[birth | survive] = 1
+    return grid
+
+def setup(args):
+    global SETUP_CALLS, CREATED_BY_SETUP
+    SETUP_CALLS += 1
+    CREATED_BY_SETUP = True
+    config = utils.load(args[0])
+    config.states = (0, 1)
+    config.num_generations = 8
+    config.grid_dims = (12, 12)
+    config.nhood_arr = np.ones((3, 3))
+    config.initial_grid = np.zeros((12, 12))
+    config.initial_grid[0, 1] = config.initial_grid[1, 2] = 1
+    config.initial_grid[2, 0:3] = 1
+    if len(args) == 2:
+        config.save()
+        sys.exit()
+    return config
+
+def run(config):
+    grid = Grid2D(config, transition_func)
+    timeline = [np.copy(grid.grid)]
+    for i in range(config.num_generations):
+        grid.step()
+        timeline.append(np.copy(grid.grid))
+    return timeline
+'''
+
+class TestRunner(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.dir, 'glider.py')
+        with open(self.filepath, 'w') as f:
+            f.write(DESCRIPTION)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_description_args(self):
+        config = CAConfig(self.filepath)
+        self.assertEqual(description_args(config, PRERUN),
+                         [config.path, PRERUN])
+        self.assertEqual(description_args(config, RUN), [config.path])
+
+    def test_prerun(self):
+        config = prerun_ca(CAConfig(TESTDESCRIPTIONS_PATH + '2dbasic.py'))
+        self.assertEqual(config.states, (0, 1, 2))
+        self.assertEqual(config.grid_dims, (200, 200))
+
+    def test_description_cached(self):
+        module = load_description(self.filepath)
+        for i in range(2):
+            prerun_ca(CAConfig(self.filepath))
+        self.assertIs(load_description(self.filepath), module)
+        # globals set by setup are reset before each run
+        self.assertEqual(module.SETUP_CALLS, 0)
+        self.assertFalse(hasattr(module, 'CREATED_BY_SETUP'))
+
+    def test_run(self):
+        config, timeline = run_ca(CAConfig(self.filepath))
+        self.assertEqual(config.num_generations, 8)
+        self.assertEqual(len(timeline), 9)
+        # after 4 generations the glider has moved one cell diagonally
+        self.assertTrue(np.array_equal(np.roll(timeline[0], (1, 1), (0, 1)),
+                                       timeline[4]))
+
+    def test_run_error(self):
+        with open(self.filepath, 'a') as f:
+            f.write('\ndef run(config):\n    raise RuntimeError()\n')
+        config, timeline = run_ca(CAConfig(self.filepath))
+        self.assertIsNone(config)
+        self.assertIsNone(timeline)
+
+    def test_worker_matches_in_process(self):
+        config, timeline = run_ca(CAConfig(self.filepath))
+        wconfig, wtimeline = run_ca(CAConfig(self.filepath), worker=True)
+        self.assertEqual(wconfig.states, config.states)
+        self.assertEqual(len(wtimeline), len(timeline))
+        for a, b in zip(timeline, wtimeline):
+            self.assertTrue(np.array_equal(a, b))
+
+    def test_worker_progress(self):
+        self.use_grid_run()
+        events = []
+        config, timeline = run_ca(CAConfig(self.filepath), worker=True,
+                                  progress=events.append)
+        self.assertEqual(len(timeline), 9)
+        self.assertTrue(events)
+        self.assertEqual((events[-1].generation, events[-1].total), (8, 8))
+
+    def use_grid_run(self, num_generations=None):
+        with open(self.filepath, 'a') as f:
+            f.write('\ndef run(config):\n')
+            if num_generations is not None:
+                f.write('    config.num_generations = {n}\n'.format(
+                    n=num_generations))
+            f.write('    return Grid2D(config, transition_func).run()\n')
+
+    def check_async(self, worker):
+        self.use_grid_run()
+        config = CAConfig(self.filepath)
+        config.progress = 'none'
+        config, timeline = run_ca(config)
+        handle = start_run(CAConfig(self.filepath), worker=worker)
+        try:
+            aconfig, atimeline = handle.result(timeout=60)
+            self.assertTrue(handle.done())
+            self.assertFalse(handle.cancelled())
+            self.assertEqual(len(atimeline), len(timeline))
+            self.assertTrue(np.array_equal(atimeline, timeline))
+            self.assertIs(handle.frames(), atimeline)
+            handle.poll()
+            self.assertEqual(handle.last_event.generation, 8)
+        finally:
+            handle.close()
+        self.assertFalse(os.path.exists(handle.timeline_file))
+
+    def test_async(self):
+        self.check_async(False)
+
+    def test_async_worker(self):
+        self.check_async(True)
+
+    def check_cancel(self, worker):
+        self.use_grid_run(10**6)
+        handle = start_run(CAConfig(self.filepath), worker=worker)
+        try:
+            # wait for some frames to be computed
+            deadline = time.time() + 60
+            while handle.poll() is None and time.time() < deadline:
+                time.sleep(0.05)
+            frames = handle.frames()
+            self.assertIsNotNone(frames)
+            self.assertEqual(len(frames), handle.last_event.generation + 1)
+            initial = np.zeros((12, 12))
+            initial[0, 1] = initial[1, 2] = 1
+            initial[2, 0:3] = 1
+            self.assertTrue(np.array_equal(frames[0], initial))
+            handle.cancel()
+            self.assertEqual(handle.result(timeout=60), (None, None))
+            self.assertTrue(handle.cancelled())
+            # the frames computed before cancelling are kept
+            handle.poll()
+            self.assertGreaterEqual(len(handle.frames()), len(frames))
+        finally:
+            handle.close()
+
+    def test_cancel(self):
+        self.check_cancel(False)
+
+    def test_cancel_worker(self):
+        self.check_cancel(True)
+
+    def test_worker_prerun(self):
+        config = prerun_ca(CAConfig(self.filepath), worker=True)
+        self.assertEqual(config.states, (0, 1))
+
+if __name__ == '__main__':
+    unittest.main()
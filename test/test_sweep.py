@@ -0,0 +1,130 @@
+import sys, os, csv, inspect, unittest, tempfile, shutil
+import numpy as np
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from capyle.sweep import (grid_space, sample_space, run_sweep, run_metrics,
+                          write_table, ResultsStore, METRICS)
+
+FF_2D = main_dir_loc + 'ca_descriptions/ff_2d.py'
+FIRE, TOWN = 6, 5
+
+class TestSpace(unittest.TestCase):
+    def test_grid(self):
+        configurations = grid_space({'wind_dir': ['N', 'S'],
+                                     'f_ext': [1, 2, 3]})
+        self.assertEqual(len(configurations), 6)
+        self.assertIn({'wind_dir': 'S', 'f_ext': 3}, configurations)
+
+    def test_sample(self):
+        space = {'wind_speed': list(range(30)), 'f_ext': [1, 2, 3, 4, 5]}
+        samples = sample_space(space, 20, seed=4)
+        self.assertEqual(samples, sample_space(space, 20, seed=4))
+        for sample in samples:
+            self.assertIn(sample['f_ext'], space['f_ext'])
+
+    def test_metrics(self):
+        timeline = np.zeros((3, 2, 2), dtype=int)
+        timeline[:, 1, 1] = TOWN
+        timeline[1:, 0, 0] = FIRE
+        metrics = run_metrics(timeline, FIRE, TOWN)
+        self.assertEqual(metrics, {'generations': 2, 'cells_burnt': 1,
+                                   'final_burning': 1,
+                                   'target_hit_time': None})
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.dir, 'store.jsonl')
+        self.configurations = grid_space({'wind_dir': ['N', 'S'],
+                                          'wind_speed': [20],
+                                          'incin': [True], 'f_ext': [1]})
+        self.overrides = {'num_generations': 4, 'seed': 2}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def sweep(self, configurations, jobs=1):
+        return run_sweep(FF_2D, configurations, FIRE, TOWN,
+                         overrides=self.overrides,
+                         store=ResultsStore(self.store_path), jobs=jobs)
+
+    def stored_lines(self):
+        with open(self.store_path) as f:
+            return f.readlines()
+
+    def test_rows(self):
+        rows = self.sweep(self.configurations)
+        self.assertEqual(len(rows), 2)
+        for row, params in zip(rows, self.configurations):
+            for name, value in params.items():
+                self.assertEqual(row[name], value)
+            self.assertEqual(row['generations'], 4)
+            self.assertGreater(row['cells_burnt'], 0)
+
+    def test_resume_from_store(self):
+        rows = self.sweep(self.configurations)
+        self.assertEqual(len(self.stored_lines()), 2)
+        # an interrupted write leaves a partial line
+        with open(self.store_path, 'a') as f:
+            f.write('{"key": "abc", "metr')
+        # repeated configurations are run once, finished ones not again
+        more = self.configurations + [dict(self.configurations[0], f_ext=2)]
+        resumed = self.sweep(more + more)
+        self.assertEqual(len(self.stored_lines()), 4)
+        self.assertEqual(resumed[:2], rows)
+        self.assertEqual(resumed[:3], resumed[3:])
+
+    def test_metrics_states_in_key(self):
+        store = ResultsStore(self.store_path)
+        rows = run_sweep(FF_2D, self.configurations, FIRE, TOWN,
+                         overrides=self.overrides, store=store, jobs=1)
+        self.assertEqual(len(self.stored_lines()), 2)
+        # other metric states are run again rather than read from the store
+        other = run_sweep(FF_2D, self.configurations, FIRE, None,
+                          overrides=self.overrides, store=store, jobs=1)
+        self.assertEqual(len(self.stored_lines()), 4)
+        for row in other:
+            self.assertIsNone(row['target_hit_time'])
+        self.assertEqual(run_sweep(FF_2D, self.configurations, FIRE, TOWN,
+                                   overrides=self.overrides, store=store,
+                                   jobs=1), rows)
+
+    def test_pool_matches_in_process(self):
+        rows = self.sweep(self.configurations)
+        os.remove(self.store_path)
+        self.assertEqual(self.sweep(self.configurations, jobs=2), rows)
+
+    def test_setup_globals_reset(self):
+        windless = {'wind_dir': 'S', 'incin': True, 'f_ext': 1}
+        windy = dict(windless, wind_speed=20)
+        no_wind = dict(windless, wind_dir=None)
+        metrics = {}
+        # in one process, the wind set up by the windy run does not carry
+        # over into the windless run after it
+        for params in [windy, windless, no_wind]:
+            row = run_sweep(FF_2D, [params], FIRE, TOWN,
+                            overrides={'num_generations': 30, 'seed': 2},
+                            jobs=1)[0]
+            metrics[params['wind_dir'], params.get('wind_speed')] = [
+                row[name] for name in METRICS]
+        self.assertIsNotNone(metrics['S', None][0])
+        self.assertEqual(metrics['S', None], metrics[None, None])
+        self.assertGreater(metrics['S', 20][1], metrics['S', None][1])
+
+    def test_table(self):
+        rows = self.sweep(self.configurations)
+        path = os.path.join(self.dir, 'table.csv')
+        write_table(rows, path)
+        with open(path) as f:
+            table = list(csv.DictReader(f))
+        self.assertEqual(len(table), 2)
+        self.assertEqual(list(table[0])[-len(METRICS):], METRICS)
+        self.assertEqual(table[1]['wind_dir'], 'S')
+
+if __name__ == '__main__':
+    unittest.main()
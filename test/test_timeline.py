@@ -0,0 +1,247 @@
+import sys, os, inspect, unittest, tempfile, shutil
+import numpy as np
+this_file_loc = (inspect.stack()[0][1])
+main_dir_loc = this_file_loc[:this_file_loc.index('test')]
+sys.path.append(main_dir_loc)
+sys.path.append(main_dir_loc + 'capyle')
+sys.path.append(main_dir_loc + 'capyle/ca')
+sys.path.append(main_dir_loc + 'capyle/guicomponents')
+
+from capyle.ca import (Grid1D, Grid2D, CAConfig, DeltaTimeline,
+                       timeline_dtype, new_timeline, open_timeline, as_frames)
+
+TESTDESCRIPTIONS_PATH = 'test/testdescriptions/'
+
+class TestTimelineDtype(unittest.TestCase):
+    def test_dtypes(self):
+        cases = [((0, 1), np.uint8), ((0, 1, 2, 3, 4, 5, 6), np.uint8),
+                 ((0, 255), np.uint8), ((0, 256), np.uint16),
+                 ((-1, 0, 1), np.int8), ((-1, 200), np.int16),
+                 ((0, 1.5), np.float64), (None, np.float64)]
+        for states, dtype in cases:
+            self.assertEqual(timeline_dtype(states), dtype, states)
+
+    def test_new_timeline(self):
+        timeline = new_timeline(11, (20, 30), (0, 1, 2))
+        self.assertEqual(timeline.shape, (11, 20, 30))
+        self.assertEqual(timeline.dtype, np.uint8)
+        self.assertTrue(timeline.flags['C_CONTIGUOUS'])
+
+    def test_as_frames(self):
+        timeline = new_timeline(3, (2, 2), (0, 1))
+        self.assertIs(as_frames(timeline), timeline)
+        grids = [np.full((2, 2), i) for i in range(3)]
+        self.assertEqual(as_frames(grids).shape, (3, 2, 2))
+
+def life(grid, ns, nc):
+    live = nc[1]
+    born = (live == 3) & (grid == 0)
+    survive = ((live == 2) | (live == 3)) & (grid == 1)
+    grid[:, :] = 0
+    grid[born | survive] = 1
+    return grid
+
+class TestGridRun(unittest.TestCase):
+    def setUp(self):
+        self.config = CAConfig(TESTDESCRIPTIONS_PATH + '2dbasic.py')
+        self.config.states = (0, 1)
+        self.config.grid_dims = (30, 40)
+        self.config.num_generations = 12
+        self.config.nhood_arr = np.ones((3, 3))
+        self.config.initial_grid = np.random.randint(0, 2, (30, 40))
+        self.config.progress = 'none'
+
+    def test_run(self):
+        timeline = Grid2D(self.config, life).run()
+        self.assertEqual(timeline.shape, (13, 30, 40))
+        self.assertEqual(timeline.dtype, np.uint8)
+        # each frame matches stepping a grid by hand
+        g = Grid2D(self.config, life)
+        for frame in timeline:
+            self.assertTrue(np.array_equal(frame, g.grid))
+            g.step()
+
+class TestStreamedTimeline(unittest.TestCase):
+    def setUp(self):
+        TestGridRun.setUp(self)
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'timeline.npy')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_streamed_run(self):
+        expected = Grid2D(self.config, life).run()
+        self.config.timeline_file = self.path
+        timeline = Grid2D(self.config, life).run()
+        self.assertIsInstance(timeline, np.memmap)
+        del timeline
+        saved = open_timeline(self.path)
+        self.assertIsInstance(saved, np.memmap)
+        self.assertEqual(saved.dtype, np.uint8)
+        self.assertTrue(np.array_equal(saved, expected))
+        self.assertFalse(saved.flags['WRITEABLE'])
+
+    def test_new_timeline_file(self):
+        timeline = new_timeline(4, (3, 5), (-1, 0, 1), path=self.path)
+        timeline[2] = -1
+        timeline.flush()
+        saved = open_timeline(self.path)
+        self.assertEqual(saved.shape, (4, 3, 5))
+        self.assertEqual(saved.dtype, np.int8)
+        self.assertTrue(np.all(saved[2] == -1))
+
+class TestDeltaTimeline(unittest.TestCase):
+    def setUp(self):
+        # a front of changed cells each frame
+        rng = np.random.default_rng(3)
+        self.frames = np.zeros((40, 25, 30), dtype=np.uint8)
+        for i in range(1, 40):
+            self.frames[i] = self.frames[i-1]
+            self.frames[i, rng.integers(25, size=8),
+                        rng.integers(30, size=8)] = rng.integers(1, 7)
+
+    def delta_timeline(self, compression=None):
+        timeline = new_timeline(40, (25, 30), range(7), keyframe_interval=8,
+                                compression=compression)
+        for i, frame in enumerate(self.frames):
+            timeline[i] = frame
+        return timeline
+
+    def test_random_access(self):
+        for compression in [None, 'zlib', 'lzma']:
+            timeline = self.delta_timeline(compression)
+            self.assertIsInstance(timeline, DeltaTimeline)
+            self.assertLess(timeline.nbytes, self.frames.nbytes // 4)
+            for i in [39, 0, 17, 16, 18, 5, -1]:
+                self.assertTrue(np.array_equal(timeline[i], self.frames[i]))
+            self.assertTrue(np.array_equal(as_frames(timeline), self.frames))
+            self.assertTrue(np.array_equal(timeline[3:12], self.frames[3:12]))
+
+    def test_frames_are_copies(self):
+        timeline = self.delta_timeline()
+        timeline[10][:, :] = 9
+        self.assertTrue(np.array_equal(timeline[11], self.frames[11]))
+
+    def test_set_in_order(self):
+        timeline = DeltaTimeline(5, (2, 2), np.uint8)
+        timeline[0] = np.zeros((2, 2))
+        with self.assertRaises(IndexError):
+            timeline[2] = np.zeros((2, 2))
+        with self.assertRaises(IndexError):
+            timeline[1]
+        with self.assertRaises(ValueError):
+            DeltaTimeline(5, (2, 2), np.uint8, compression='zip')
+
+    def test_save(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'timeline.npz')
+            self.delta_timeline('zlib').save(path)
+            saved = open_timeline(path)
+            self.assertIsInstance(saved, DeltaTimeline)
+            self.assertEqual(saved.shape, self.frames.shape)
+            self.assertTrue(np.array_equal(saved[23], self.frames[23]))
+            self.assertTrue(np.array_equal(as_frames(saved), self.frames))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_grid_run(self):
+        TestGridRun.setUp(self)
+        expected = Grid2D(self.config, life).run()
+        self.config.keyframe_interval = 5
+        self.config.timeline_compression = 'zlib'
+        timeline = Grid2D(self.config, life).run()
+        self.assertIsInstance(timeline, DeltaTimeline)
+        self.assertTrue(np.array_equal(as_frames(timeline), expected))
+
+class TestEarlyStop(unittest.TestCase):
+    def setUp(self):
+        TestGridRun.setUp(self)
+        self.config.num_generations = 30
+        # a blinker, a cycle of period 2
+        self.config.initial_grid = np.zeros((30, 40))
+        self.config.initial_grid[10, 10:13] = 1
+        self.full = Grid2D(self.config, life).run()
+
+    def run_grid(self, stop_condition=None, **attrs):
+        for name, value in attrs.items():
+            setattr(self.config, name, value)
+        grid = Grid2D(self.config, life)
+        return grid, grid.run(stop_condition)
+
+    def test_runs_full_without_policies(self):
+        grid, timeline = self.run_grid()
+        self.assertIsNone(grid.stopped_at)
+        self.assertEqual(len(timeline), 31)
+
+    def test_steady(self):
+        self.config.initial_grid[10, 10:13] = 0
+        self.config.initial_grid[5:7, 5:7] = 1
+        grid, timeline = self.run_grid(stop_on_steady=True)
+        self.assertEqual((grid.stopped_at, grid.period), (1, 1))
+        self.assertEqual(len(timeline), 2)
+        # a cycle is not a steady state
+        self.config.initial_grid = self.full[0]
+        grid, timeline = self.run_grid(stop_on_steady=True)
+        self.assertIsNone(grid.stopped_at)
+
+    def test_cycle(self):
+        grid, timeline = self.run_grid(cycle_window=4)
+        self.assertEqual((grid.stopped_at, grid.period), (2, 2))
+        self.assertTrue(np.array_equal(timeline, self.full[:3]))
+
+    def test_padded(self):
+        for keyframe_interval in [None, 4]:
+            grid, timeline = self.run_grid(cycle_window=4, pad_timeline=True,
+                                           keyframe_interval=keyframe_interval)
+            self.assertEqual(grid.stopped_at, 2)
+            self.assertTrue(np.array_equal(as_frames(timeline), self.full))
+
+    def test_padded_period_3(self):
+        def rotate(grid, neighbourstates, neighbourcounts):
+            return (grid + 1) % 3
+
+        self.config.states = (0, 1, 2)
+        self.config.num_generations = 31
+        self.config.initial_grid = np.random.randint(0, 3, (30, 40))
+        full = Grid2D(self.config, rotate).run()
+        self.config.cycle_window = 4
+        self.config.pad_timeline = True
+        for keyframe_interval in [None, 4]:
+            self.config.keyframe_interval = keyframe_interval
+            grid = Grid2D(self.config, rotate)
+            timeline = grid.run()
+            self.assertEqual((grid.stopped_at, grid.period), (3, 3))
+            self.assertTrue(np.array_equal(as_frames(timeline), full))
+            # the grid is left in the state of the last generation
+            self.assertTrue(np.array_equal(grid.grid, full[-1]))
+
+    def test_stop_condition(self):
+        grid, timeline = self.run_grid(lambda g, generation: generation == 7)
+        self.assertEqual(grid.stopped_at, 7)
+        self.assertTrue(np.array_equal(timeline, self.full[:8]))
+
+    def test_1d_cycle(self):
+        config = CAConfig(TESTDESCRIPTIONS_PATH + '1dbasic.py')
+        config.states = (0, 1)
+        config.num_generations = 20
+        config.progress = 'none'
+        initial_grid = np.zeros((1, 41))
+        initial_grid[0, 20] = 1
+        config.initial_grid = initial_grid
+
+        def invert(grid, neighbourstates, neighbourcounts):
+            return 1 - neighbourstates[1]
+
+        full = Grid1D(config, invert).run()
+        config.cycle_window = 3
+        grid = Grid1D(config, invert)
+        timeline = grid.run()
+        self.assertEqual((grid.stopped_at, grid.period), (2, 2))
+        self.assertEqual(len(timeline), 3)
+        config.pad_timeline = True
+        self.assertTrue(np.array_equal(Grid1D(config, invert).run(), full))
+
+if __name__ == '__main__':
+    unittest.main()